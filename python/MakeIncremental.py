@@ -3,11 +3,9 @@ import math
 from pprint import pprint
 
 def MakeIncremental(directory,json_infile1,json_outfile,plot_outtitle): 
-     
-    json_input1=open(directory+json_infile1+".json")
-
-    data1 = json.load(json_input1)
-    json_obj1 = json.dumps(data1, sort_keys=True, indent=4)
+    from src.trendStore import readTrend, writeTrend
+    # taken from the columnar store of the directory when it has the trend
+    data1 = {json_infile1: readTrend(directory, json_infile1)}
     counter1 = 0 
     for item1 in data1[json_infile1]:
 #         print "Run1 = ", item1[u'run']
@@ -32,12 +30,7 @@ def MakeIncremental(directory,json_infile1,json_outfile,plot_outtitle):
         d['hTitle']=plot_outtitle
         lst.append(d)
 	   	
-    obj ={}		
-    obj[json_outfile]=lst		
-#    print  json.dumps(obj,indent=2)		
-
-    outfile=open(directory+json_outfile+".json", 'w')
-    json.dump(obj, outfile,indent=4)
+    writeTrend(directory, json_outfile, lst)
 
 def main(argv=None):
     import sys
@@ -3,20 +3,16 @@ import math
 from pprint import pprint
 
 def MakeRatio(json_infile1,json_infile2,json_outfile,plot_outtitle): 
-     
-    json_input1=open("./JSON/"+json_infile1+".json")
-    json_input2=open("./JSON/"+json_infile2+".json")
-
-    data1 = json.load(json_input1)
-    json_obj1 = json.dumps(data1, sort_keys=True, indent=4)
+    from src.trendStore import readTrend, writeTrend
+    # taken from the columnar store of ./JSON when it has the trends
+    data1 = {json_infile1: readTrend("./JSON", json_infile1)}
     counter1 = 0 
     for item1 in data1[json_infile1]:
 #         print "Run1 = ", item1[u'run']
          counter1+=1  
 
 # ---------------------------------------------------------------------
-    data2 = json.load(json_input2)
-    json_obj2 = json.dumps(data2, sort_keys=True, indent=4)
+    data2 = {json_infile2: readTrend("./JSON", json_infile2)}
     counter2 = 0 
     for item2 in data2[json_infile2]:
          counter2+=1      
@@ -49,12 +45,7 @@ def MakeRatio(json_infile1,json_infile2,json_outfile,plot_outtitle):
                 d['yTitle']=plot_outtitle
                 lst.append(d)
 	   	
-    obj ={}		
-    obj[json_outfile]=lst		
-#    print  json.dumps(obj,indent=2)		
-
-    outfile=open("./JSON/"+json_outfile+".json", 'w')
-    json.dump(obj, outfile,indent=4)
+    writeTrend("./JSON", json_outfile, lst)
 
 def main(argv=None):
     import sys
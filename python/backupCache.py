@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# incremental backups of the metric caches (.DQMCache*), text or sqlite, also while jobs are using them
+#   backupCache.py snapshot [-d CacheBackup] cache [cache ...]
+#   backupCache.py restore [-d CacheBackup] [-t "YYYY-mm-dd HH:MM"] -o restoredCache cache
+#   backupCache.py list [-d CacheBackup] cache
+from optparse import OptionParser
+
+def main(argv=None):
+    import os
+    import sys
+    import time
+    from src.cacheBackup import takeSnapshot, restoreSnapshot, listSnapshots, backupName, parseTime
+    if argv == None:
+        argv = sys.argv[1:]
+    parser = OptionParser(usage="%prog snapshot|restore|list [options] cache [cache ...]")
+    parser.add_option("-d", "--dir", dest="backupDir", default="CacheBackup",
+                      help="directory of the backups (default is %default)")
+    parser.add_option("-F", "--full-every", dest="fullEvery", type="int", default=30,
+                      help="write a full snapshot after this many deltas (default is %default)")
+    parser.add_option("-t", "--time", dest="time", default=None,
+                      help="restore the state as of this time, 'YYYY-mm-dd HH:MM' (default is the last snapshot)")
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="cache file to restore into, must not exist")
+    parser.add_option("-b", "--backend", dest="backend", default="text",
+                      help="backend of the restored cache, text or sqlite (default is %default)")
+    (opts, args) = parser.parse_args(argv)
+    if len(args) < 2 or args[0] not in ("snapshot", "restore", "list"):
+        parser.error("give a command (snapshot, restore or list) and a cache")
+    command, caches = args[0], args[1:]
+    if command == "snapshot":
+        for cachePath in caches:
+            if not os.path.exists(cachePath):
+                print("{0} does not exist, skipped".format(cachePath))
+                continue
+            (fileName, changed, deleted) = takeSnapshot(cachePath, opts.backupDir, opts.fullEvery)
+            if fileName == None:
+                print("{0} unchanged since the last snapshot".format(cachePath))
+            else:
+                print("{0}: {1} changed and {2} deleted entries in {3}".format(cachePath, changed, deleted, fileName))
+    elif command == "list":
+        for cachePath in caches:
+            for (when, isFull, fileName) in listSnapshots(opts.backupDir, backupName(cachePath)):
+                print("{0} {1:5} {2:>10} bytes  {3}".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when)),
+                                                         "full" if isFull else "delta", os.path.getsize(fileName), fileName))
+    else:
+        if len(caches) != 1 or opts.output == None:
+            parser.error("restore needs a single cache and --output")
+        if os.path.exists(opts.output):
+            parser.error("{0} exists, restore into a new file".format(opts.output))
+        until = parseTime(opts.time) if opts.time != None else None
+        if not [s for s in listSnapshots(opts.backupDir, backupName(caches[0])) if s[1] and (until == None or s[0] <= until)]:
+            parser.error("no snapshot of {0} in {1} before that time".format(caches[0], opts.backupDir))
+        print("Restoring {0} into {1}".format(caches[0], opts.output))
+        print(".....done! {0} entries".format(restoreSnapshot(opts.backupDir, backupName(caches[0]), opts.output, until, opts.backend)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# removes the metric cache entries no plot uses any more: metrics whose parameters were changed and
+# plots that were dropped. Entries keyed on the metric string of older caches are moved to the key
+# of the metric parameters. Do not run it on a text cache a job is using, sqlite caches are fine.
+from optparse import OptionParser
+
+def loadMetric(metric):
+    "the metric object of a cfg metric string, built as TrendPlot does"
+    metricString = "metrics."+metric
+    metrics = __import__(".".join(metricString.split("(")[0].split(".")[:-1]))
+    return eval(metricString)
+
+def readPlots(cfgPaths):
+    """{(relativePath, metricString): metricKey} of the plots defined in the cfg files, and the
+    relativePaths of the plots whose metric could not be built"""
+    try:
+        from ConfigParser import RawConfigParser
+    except ImportError:
+        from configparser import RawConfigParser
+    plots = {}
+    unknown = set()
+    for cfgPath in cfgPaths:
+        # one parser per file, plot sections of the same name differ between the files
+        config = RawConfigParser()
+        config.optionxform = str
+        config.read(cfgPath)
+        for section in config.sections():
+            if not section.startswith("plot:") or not config.has_option(section, "metric"):
+                continue
+            path = config.get(section, "relativePath")
+            metric = config.get(section, "metric")
+            try:
+                plots[(path, metric)] = loadMetric(metric).getKey() or metric
+            except Exception as msg:
+                print("WARNING: can not build {0} of {1} in {2}, keeping all entries of {1}: {3}".format(metric, path, cfgPath, msg))
+                unknown.add(path)
+    return plots, unknown
+
+def main(argv=None):
+    import sys
+    from glob import glob
+    from src.metricCache import openMetricCache, isSQLiteCache
+    if argv == None:
+        argv = sys.argv[1:]
+    parser = OptionParser(usage="%prog [options] cache [cache ...]")
+    parser.add_option("-C", "--config", dest="config", default=[], action="append",
+                      help="cfg files with the plots in use (default is every cfg/*.ini)")
+    parser.add_option("-n", "--dry-run", dest="dryRun", default=False, action="store_true",
+                      help="only count what would be removed")
+    (opts, args) = parser.parse_args(argv)
+    if not args:
+        parser.error("no cache given")
+    plots, unknown = readPlots(opts.config or sorted(glob("cfg/*.ini")))
+    live = set((path, key) for (path, metric), key in plots.items())
+    renames = dict((entry, key) for entry, key in plots.items() if entry[1] != key)
+    for cachePath in args:
+        cache = openMetricCache(cachePath, "sqlite" if isSQLiteCache(cachePath) else "text")
+        orphans = [entry for entry in cache.getMetrics()
+                   if entry not in live and entry not in renames and entry[0] not in unknown]
+        print("{0}: {1} metrics of {2} plots are no longer used".format(cachePath, len(orphans), len(set(entry[0] for entry in orphans))))
+        if not opts.dryRun:
+            moved = cache.renameMetrics(renames)
+            removed = cache.removeMetrics(orphans)
+            print(".....done! {0} entries removed, {1} moved to the metric parameters".format(removed, moved))
+            cache.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+// Quantiles of a 1D histogram with their statistical error, used by basic.Quantile.
+#ifndef Quantile_h
+#define Quantile_h
+
+#include <TH1.h>
+#include <TMath.h>
+#include <utility>
+
+class Quantile {
+public:
+  Quantile(const TH1 *histo) : histo_(histo) {}
+
+  // (x, error) with the fraction frac of the bin contents in range left of x, linear within the bin.
+  // The error is sqrt(frac*(1-frac)/N)/f(x), f the density of the bin. (0, 0) if there is no quantile.
+  std::pair<double, double> fromHead(double frac) const {
+    const int nbins = histo_->GetNbinsX();
+    double total = 0.;
+    for (int bin = 1; bin <= nbins; ++bin)
+      total += histo_->GetBinContent(bin);
+    if (total <= 0. || frac <= 0. || frac >= 1.)
+      return std::make_pair(0., 0.);
+    const double target = frac * total;
+    double sum = 0.;
+    for (int bin = 1; bin <= nbins; ++bin) {
+      const double content = histo_->GetBinContent(bin);
+      if (content > 0. && sum + content >= target) {
+        const double width = histo_->GetBinWidth(bin);
+        const double x = histo_->GetBinLowEdge(bin) + width * (target - sum) / content;
+        const double density = content / (total * width);
+        return std::make_pair(x, TMath::Sqrt(frac * (1. - frac) / total) / density);
+      }
+      sum += content;
+    }
+    return std::make_pair(0., 0.);
+  }
+
+  // the same with frac counted from the right
+  std::pair<double, double> fromTail(double frac) const { return fromHead(1. - frac); }
+
+private:
+  const TH1 *histo_;
+};
+
+#endif
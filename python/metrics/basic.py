@@ -1,5 +1,38 @@
+def _bins2D(histo):
+    """bin contents as [biny, binx], under- and overflow included, copied in one go instead of a
+    GetBinContent call per bin. A 1D histogram reads the same for every biny, as in ROOT."""
+    import numpy
+    from metrics.histo import binContents
+    contents = binContents(histo)
+    if contents.ndim == 1:
+        contents = numpy.broadcast_to(contents, (3, contents.size))
+    return contents
+
+def _clipBins(first, last, size):
+    "bin numbers first <= bin < last, out of range ones read the under- or overflow bin like GetBinContent"
+    import numpy
+    return numpy.clip(numpy.arange(first, last), 0, size-1)
+
+def _profileMean(values):
+    "mean of the bin values and rms/sqrt(count)"
+    from math import sqrt
+    count = values.size
+    if count==0:
+        return (0,0)
+    summy = float(values.sum())
+    sumSquare = float((values*values).sum())
+    rms= sqrt( max(sumSquare/count-(summy*summy/(count*count)), 0.) )
+    return (summy/count, rms/sqrt(count))
+
 class BaseMetric:
     "baseclass for all metrics. should not be used on its own"
+    # file version and hash of the input, stored with the result
+    _version = None
+    _contentHash = None
+    _dataset = None
+    __fitStore = None
+    __fitKey = None
+
     def __init__(self):
         self._reference = None
         self._histo1 = None
@@ -9,6 +42,11 @@ class BaseMetric:
 
     def setCache(self, cache):
         self.__cache = cache
+    def setFitStore(self, fitStore, key):
+        """fits (useFitWorkers) then look up their result by key, the run and the hash of the input
+        histograms (setSource) before they calculate, identical input is fitted once"""
+        self.__fitStore = fitStore
+        self.__fitKey = key
     def setReference(self, histo): 
         self._reference = histo
     def setOptionalHisto1(self, histo): 
@@ -21,22 +59,115 @@ class BaseMetric:
          self.__cacheLocation = (serverUrl, runNr, dataset, histoPath)
     def setRun(self, runNr):
         self._run = runNr
+    def setDataset(self, dataset):
+        self._dataset = dataset
+    def setSource(self, version, contentHash):
+        self._version = version
+        self._contentHash = contentHash
+    def needsROOT(self):
+        "metrics that need the ROOT object (fits, ROOT statistical tests) get a NumpyHisto converted back"
+        return False
+    def useFitWorkers(self):
+        "metrics slow enough to go to the fit workers of a MetricGroup, the ROOT fits by default"
+        return self.needsROOT()
+
+    def getKey(self):
+        """module, class and constructor parameters with the defaults filled in, e.g.
+        'basic.BinCount(name=1, noError=False)'. The cache is keyed on it rather than on the cfg string,
+        so a respelled metric keeps its entries and a changed default gets new ones. Call it before
+        the first calculate. None if a parameter has no stable repr."""
+        parameters = []
+        for name, value in sorted(vars(self).items()):
+            if name.startswith(("_BaseMetric__", "_BaseFit__")) or name in ("_reference", "_histo1", "_histo2", "_run", "_dataset", "_threshold", "_version", "_contentHash"):
+                continue
+            if name.startswith("_") and "__" in name:
+                # private attribute, _Class__name
+                name = name.split("__", 1)[1]
+            text = repr(value)
+            if " at 0x" in text:
+                return None
+            parameters.append("%s=%s" % (name, text))
+        return "%s.%s(%s)" % (self.__class__.__module__.split(".")[-1], self.__class__.__name__, ", ".join(parameters))
 
     def __call__(self, histo, cacheLocation=None):
         if not cacheLocation == None and not self.__cache == None and cacheLocation in self.__cache:
-            result, entries = self.__cache[cacheLocation]
+            result, entries = self.__cache[cacheLocation][:2]
         else:
-            assert (not histo==None), "reading from cache failed but no histo givento compute metric!"
-            result = (0,0)
-            try:
-                result = self.calculate(histo)
-            except StandardError as msg :
-                print("Warning: fit failed, returning 0")
-                print(msg)
-
-            entries = histo.GetEntries()
+            result, entries = self.evaluate(histo)
             if not self.__cache == None:
-                self.__cache[cacheLocation] = (result, entries)
+                self.__cache[cacheLocation] = self.getCacheValue(result, entries)
+        return self.check(result, entries)
+
+    def evaluate(self, histo):
+        "(result, entries) of the histogram, the cache is neither read nor written"
+        assert (not histo==None), "reading from cache failed but no histo givento compute metric!"
+        result = (0,0)
+        fitKey = self.getFitKey()
+        stored = self.getStoredFit(fitKey)
+        if stored != None:
+            return stored
+        if self.needsROOT() and hasattr(histo, "toROOT"):
+            histo = histo.toROOT()
+        try:
+            result = self.calculate(histo)
+        except StandardError as msg :
+            print("Warning: fit failed, returning 0")
+            print(msg)
+        self.storeFit(fitKey, (result, histo.GetEntries()))
+        return (result, histo.GetEntries())
+
+    def getFitKey(self):
+        """(key, run, input hash) of the result in the fit store, None if it is not stored. With the run
+        as some fits depend on it (LandauTest)."""
+        if self.__fitStore == None or self._contentHash == None or not self.useFitWorkers():
+            return None
+        return (self.__fitKey, self._run, self._contentHash)
+
+    def getStoredFit(self, fitKey):
+        "(result, entries) from the fit store or None"
+        if fitKey == None:
+            return None
+        return self.__fitStore.get(*fitKey)
+
+    def storeFit(self, fitKey, value):
+        if fitKey != None:
+            self.__fitStore.put(fitKey[0], fitKey[1], fitKey[2], value)
+
+    def getSource(self):
+        "(version, contentHash) set by setSource"
+        return (self._version, self._contentHash)
+
+    def getCacheValue(self, result, entries):
+        return (result, entries)+self.getSource()
+
+    def __getstate__(self):
+        "metrics are sent to the fit workers without the cache and the fit store"
+        state = dict(self.__dict__)
+        state.pop("_BaseMetric__cache", None)
+        state.pop("_BaseMetric__fitStore", None)
+        return state
+
+    def getWorkerState(self):
+        "what a metric evaluated on a fit worker hands back to the one in the main process"
+        return None
+
+    def setWorkerState(self, state):
+        pass
+
+    def usesEarlierRuns(self):
+        """True if the result depends on the evaluations of the earlier runs (warm-started fits), a
+        MetricGroup then collects those before it sends the next run to a fit worker"""
+        return False
+
+    def getStartParameters(self):
+        "what an evaluation on a fit worker starts from, taken when it is submitted"
+        return None
+
+    def setStartParameters(self, parameters):
+        pass
+
+    def check(self, result, entries):
+        "applies the threshold and returns (value, (errLow, errHigh))"
         if entries < self._threshold:
             raise StandardError(" Number of entries (%s) is below threshold (%s) using '%s'"%(entries, self._threshold, self.__class__.__name__)) #, histo.GetName())
             #print(" Number of entries (%s) is below threshold (%s) using '%s'"%(entries, self._threshold, self.__class__.__name__))
@@ -52,6 +183,135 @@ class BaseMetric:
 
     def calculate(self, histo):
         raise StandardError("you should not use the baseclass as a metric. Use the derived classes!")
+
+
+class _Result:
+    "a metric evaluated in this process, with the ready/get of a job of the FitExecutor"
+    def __init__(self, value=None, error=None):
+        self.__value = value
+        self.__error = error
+    def ready(self):
+        return True
+    def get(self, timeout=None):
+        if self.__error != None:
+            raise self.__error
+        return self.__value
+
+class MetricGroup:
+    """metrics of several plots evaluated together on the histograms of one run. Metrics without ROOT
+    on the same histogram get one SharedHisto, the bin array, moments and integrals are computed once
+    for all of them, and the results go to the cache in one update.
+    With a FitExecutor the fits (useFitWorkers) run on its workers while the next runs are read.
+    Their results, and everything queued after them, are handed back in the order they were queued,
+    so the outcome does not depend on which fit finishes first. At most maxQueued entries wait."""
+    def __init__(self, cache=None, executor=None, maxQueued=10000):
+        self.__cache = cache
+        self.__executor = executor
+        self.__maxQueued = maxQueued
+        self.__pending = []
+        self.__queue = []
+
+    def __len__(self):
+        return len(self.__pending)+len(self.__queue)
+
+    def add(self, key, metric, histo, cacheLocation, done, failed):
+        """queues metric on histo. key names the histogram, e.g. (server, run, dataset, path), metrics
+        with the same key see the same histogram. Once evaluated done((value, (errLow, errHigh))) is
+        called, or failed(msg) if the metric raised."""
+        self.__pending.append(("metric", key, metric, histo, cacheLocation, done, failed))
+
+    def call(self, function):
+        """calls function() once everything queued before is done, e.g. to add a point taken from the
+        cache after the points of the earlier runs"""
+        self.__pending.append(("call", function))
+
+    def evaluate(self):
+        """evaluates the metrics queued for the run, or sends them to the executor, and hands back what
+        is done. Returns the number of entries still waiting."""
+        from metrics.histo import SharedHisto
+        shared = {}
+        for entry in self.__pending:
+            if entry[0] == "call":
+                self.__queue.append(entry)
+                continue
+            (kind, key, metric, histo, cacheLocation, done, failed) = entry
+            # the metric object is reused for the next run, keep what goes to the cache now
+            source = metric.getSource()
+            fitKey = None
+            try:
+                if metric.useFitWorkers() and self.__executor != None:
+                    fitKey = metric.getFitKey()
+                    stored = metric.getStoredFit(fitKey)
+                    if stored != None:
+                        job = _Result((stored, None))
+                        fitKey = None
+                    else:
+                        if metric.usesEarlierRuns():
+                            # start from the fits of all earlier runs, however fast the workers are
+                            self.__collect(False, metric)
+                        job = self.__executor.submit(metric, histo, metric.getStartParameters())
+                else:
+                    if not metric.needsROOT():
+                        if key not in shared:
+                            shared[key] = SharedHisto(histo)
+                        histo = shared[key]
+                    job = _Result((metric.evaluate(histo), None))
+            except StandardError as msg :
+                job = _Result(error=msg)
+            self.__queue.append(("metric", job, metric, source, fitKey, cacheLocation, done, failed))
+        self.__pending = []
+        self.__collect(False)
+        return len(self.__queue)
+
+    def finish(self):
+        "waits for everything queued, call it after the last run"
+        self.evaluate()
+        self.__collect(True)
+
+    def __collect(self, wait, metric=None):
+        "hands back what is done; with wait everything, with metric everything up to its last entry"
+        values = {}
+        actions = []
+        waitFor = 0
+        if metric != None:
+            for i, entry in enumerate(self.__queue):
+                if entry[0] == "metric" and entry[2] is metric:
+                    waitFor = i+1
+        while self.__queue:
+            entry = self.__queue[0]
+            if entry[0] == "metric" and not entry[1].ready() and not wait and waitFor <= 0 and len(self.__queue) <= self.__maxQueued:
+                break
+            waitFor -= 1
+            self.__queue.pop(0)
+            if entry[0] == "call":
+                actions.append(entry[1])
+                continue
+            (kind, job, metric, source, fitKey, cacheLocation, done, failed) = entry
+            try:
+                ((result, entries), state) = job.get()
+            except StandardError as msg :
+                actions.append(lambda failed=failed, msg=msg: failed(msg))
+                continue
+            if state != None:
+                metric.setWorkerState(state)
+            # fitted by a worker, which has no fit store
+            metric.storeFit(fitKey, (result, entries))
+            if cacheLocation != None:
+                values[cacheLocation] = (result, entries)+source
+            actions.append(lambda metric=metric, result=result, entries=entries, done=done, failed=failed:
+                           self.__check(metric, result, entries, done, failed))
+        if values and self.__cache != None:
+            self.__cache.update(values)
+        for action in actions:
+            action()
+
+    def __check(self, metric, result, entries, done, failed):
+        try:
+            result = metric.check(result, entries)
+        except StandardError as msg :
+            failed(msg)
+            return
+        done(result)
         
         
 class SummaryMapPartition(BaseMetric):
@@ -73,18 +333,16 @@ class AverageYwithXCut(BaseMetric):
         self.__nbinsx = nbinx
 
     def calculate(self, histo):
-        value = 0
-        Nbins = histo.GetNbinsX()
-        self.__nbinsx=Nbins
-        for xbin in range(self.__nbinsx):
-            if histo.GetBinContent(xbin)>0:
-                NN=xbin
-        self.__nbinsx=NN-3
-        for xbin in range(self.__nbinsx):
-            value += histo.GetBinContent(xbin)
-            value1=value
-        value /= self.__nbinsx
-        return (value, 0)
+        import numpy
+        from metrics.histo import binContents
+        bins = binContents(histo).ravel()
+        # average up to three bins before the last filled one
+        filled = numpy.flatnonzero(bins[:histo.GetNbinsX()] > 0)
+        if not filled.size:
+            raise StandardError("no filled bin in '%s'" % histo.GetName())
+        nbinsx = int(filled[-1])-3
+        value = float(bins[:max(nbinsx, 0)].sum())
+        return (value/nbinsx, 0)
 
 
 class Mean(BaseMetric):
@@ -164,48 +422,22 @@ class RMSYAxis(BaseMetric):
 
 class ProfileMean(BaseMetric):
     def calculate(self, histo):
-        from math import sqrt
-        nbinx=histo.GetNbinsX();
-        nbiny=histo.GetNbinsY();
-        summy=0
-        sumSquare=0
-        count=0
-        for i in range(1,nbinx+1):
-            for j in range(1,nbiny+1):
-                if histo.GetBinContent(i,j) != 0 :
-                    summy+=histo.GetBinContent(i,j)
-                    sumSquare+=histo.GetBinContent(i,j)*histo.GetBinContent(i,j)
-                    count+=1
-        if count==0:
-            return (0,0)
-        rms= sqrt( sumSquare/count-(summy*summy/(count*count)) )
-        return (summy/count, rms/sqrt(count))
+        values = _bins2D(histo)[1:histo.GetNbinsY()+1, 1:histo.GetNbinsX()+1]
+        return _profileMean(values[values != 0])
 
 class ProfileMeanBPixModules(BaseMetric):
     def __init__(self, modNum):
         self.__modCounter = 4-modNum
 
     def calculate(self, histo):
-        from math import sqrt
+        import numpy
         nbinx=histo.GetNbinsX();
-        nbiny=histo.GetNbinsY();
-        summy=0
-        sumSquare=0
-        count=0
-        for j in range(1,nbiny+1):
-            if histo.GetBinContent(1+self.__modCounter,j) != 0 :
-                summy+=histo.GetBinContent(1+self.__modCounter,j)
-                sumSquare+=histo.GetBinContent(1+self.__modCounter,j)*histo.GetBinContent(1+self.__modCounter,j)
-                count+=1
-            if histo.GetBinContent(nbinx-self.__modCounter,j) != 0 :
-                summy+=histo.GetBinContent(nbinx-self.__modCounter,j)
-                sumSquare+=histo.GetBinContent(nbinx-self.__modCounter,j)*histo.GetBinContent(nbinx-self.__modCounter,j)
-                count+=1
-        print(count)
-        if count==0:
-            return (0,0)
-        rms= sqrt( sumSquare/count-(summy*summy/(count*count)) )
-        return (summy/count, rms/sqrt(count))
+        bins = _bins2D(histo)
+        # the module column on either side of the barrel
+        columns = numpy.clip([1+self.__modCounter, nbinx-self.__modCounter], 0, bins.shape[1]-1)
+        values = bins[1:histo.GetNbinsY()+1][:, columns]
+        values = values[values != 0]
+        return _profileMean(values)
 
 
 
@@ -279,11 +511,7 @@ class FED25ErrorFraction(BaseMetric):
         ref=histo.GetMaximum()*self.__thr
         nbinx=histo.GetNbinsX();
         nbiny=histo.GetNbinsY();
-        count=0
-        for i in range(1,nbinx+1):
-            for j in range(1,nbiny+1):
-                if histo.GetBinContent(i,j)>ref:
-                    count+=1
+        count=int((_bins2D(histo)[1:nbiny+1, 1:nbinx+1] > ref).sum())
         res=float(count)/self.__norm
         err=0
         if self.__normErr :
@@ -330,9 +558,8 @@ class EntriesCount(BaseMetric):
 
     def calculate(self, histo):
         from math import sqrt
-        sum=float(0.0)
-        for bin in range(histo.FindBin(self.__loVal),histo.GetNbinsX()+1) :
-            sum+=histo.GetBinContent(bin)
+        from metrics.histo import binContents
+        sum=float(binContents(histo).ravel()[histo.FindBin(self.__loVal):histo.GetNbinsX()+1].sum())
         return ( sum, sqrt(1/sum)*sum if sum else 0)   
 
 class EntriesRate(BaseMetric):
@@ -342,13 +569,10 @@ class EntriesRate(BaseMetric):
 
     def calculate(self, histo):
         from math import sqrt
-        trksum=float(0.0)
-        for bin in range(histo.FindBin(self.__loVal),histo.GetNbinsX()+1) :
-            trksum+=histo.GetBinContent(bin)
-        nLS=0
-        for bin in range(1,self._histo1.GetNbinsX()+1) :
-            if self._histo1.GetBinContent(bin) > 0 :
-                nLS+=1
+        from metrics.histo import binContents
+        trksum=float(binContents(histo).ravel()[histo.FindBin(self.__loVal):histo.GetNbinsX()+1].sum())
+        # lumi sections with tracks
+        nLS=int((binContents(self._histo1).ravel()[1:self._histo1.GetNbinsX()+1] > 0).sum())
         if nLS :
             return (trksum/(nLS*23), sqrt(trksum)/(nLS*23))
         else :
@@ -523,25 +747,18 @@ class MeanYRange(BaseMetric):
         self.__ymax = float(ymax)
         
     def calculate(self, histo):
-        sum , count = 0 , 0
-        for i in range(self.__ymin,self.__ymax):
-            for j in range(0,histo.GetXaxis().GetNbins()+1):
-                sum+=histo.GetBinContent(j,i)
-                count+=1
-        if count==0:
+        bins = _bins2D(histo)
+        values = bins[_clipBins(int(self.__ymin), int(self.__ymax), bins.shape[0]), :histo.GetXaxis().GetNbins()+1]
+        if values.size==0:
             return (0,0)
-        return (sum/count,0)
+        return (float(values.sum())/values.size,0)
 
 class Mean2D(BaseMetric):
     def calculate(self,histo):
-        sum, count = 0 , 0
-        for i in range(histo.GetXaxis().GetNbins()):
-            for j in range(histo.GetYaxis().GetNbins()):
-                sum+=histo.GetBinContent(i,j)
-                count+=1
-        if count==0:
+        values = _bins2D(histo)[:histo.GetYaxis().GetNbins(), :histo.GetXaxis().GetNbins()]
+        if values.size==0:
             return (0,0)
-        return (sum/count, 0)
+        return (float(values.sum())/values.size, 0)
 
 class BinRatio2D(BaseMetric):
     def __init__(self, Nxbin,Nybin,Dxbin,Dybin):
@@ -607,14 +824,11 @@ class MeanYForXBin(BaseMetric):
         self.__xbin = int(xbin)
 
     def calculate(self,histo):
-        sum,count = 0,0
-        for i in range(1,histo.GetYaxis().GetNbins()+1):
-            if histo.GetBinContent(self.__xbin,i) >= 0:
-                sum+=histo.GetBinContent(self.__xbin,i)
-            count+=1
-        if count == 0:
+        bins = _bins2D(histo)
+        values = bins[1:histo.GetYaxis().GetNbins()+1, min(max(self.__xbin, 0), bins.shape[1]-1)]
+        if values.size == 0:
             return (0,0)
-        return (sum/count, 0)
+        return (float(values[values >= 0].sum())/values.size, 0)
         
 
 class MeanPosOnly(BaseMetric):
@@ -634,23 +848,22 @@ class MeanXRange(BaseMetric):
         self.__xmax = int(xmax)
         
     def calculate(self, histo):
-        sum,count = 0,0
-        for i in range(self.__xmin,self.__xmax):
-            for j in range(1,histo.GetYaxis().GetNbins()+1):
-                if histo.GetBinContent(i,j) >= 0:
-                    sum+=histo.GetBinContent(i,j)
-                count+=1
-        if count==0:
+        bins = _bins2D(histo)
+        values = bins[1:histo.GetYaxis().GetNbins()+1][:, _clipBins(self.__xmin, self.__xmax, bins.shape[1])]
+        if values.size==0:
             return (0,0)
-        return (sum/count,0)
+        return (float(values[values >= 0].sum())/values.size,0)
 
 class Quantile(BaseMetric):
     def __init__(self,  frac = 0.95):
         self.__frac = float(frac)
-        from ROOT import gROOT
-        gROOT.LoadMacro( 'Quantile.h+' )
+
+    def needsROOT(self):
+        return True
 
     def calculate(self, histo):
+        from metrics.kernels import loadKernel
+        loadKernel("Quantile")
         from ROOT import Quantile
         q = Quantile(histo)
         "frac is the fraction from the left"
@@ -661,16 +874,25 @@ class Quantile(BaseMetric):
 
 #--- statistical Tests            
 class Kolmogorov(BaseMetric):
+    def needsROOT(self):
+        return True
+
     def calculate(self, histo):
         k = histo.KolmogorovTest( self._reference)
         return (k, 0)
 
 class Chi2(BaseMetric):
+    def needsROOT(self):
+        return True
+
     def calculate(self, histo):
         chi2 = histo.Chi2Test( self._reference, "UUNORMCHI2")
         return (chi2, 0 )
 
 class NormChi2(BaseMetric):
+    def needsROOT(self):
+        return True
+
     def calculate(self, histo):
         chi2 = histo.Chi2Test( self._reference, "UUNORMCHI2/NDF")
         return (chi2, 0 )
@@ -1,6 +1,90 @@
 from basic import BaseMetric
+from kernels import loadKernel
 
-class LanGau(BaseMetric):
+class BaseFit(BaseMetric):
+    """baseclass for the fit metrics, they work on the ROOT histogram. With setWarmStart(True) a fit
+    first starts from the parameters of the last good fit of the same dataset, one fit instead of the
+    defaults and refits, which are only tried when that one does not converge."""
+    __warmStart = False
+    __parameters = None
+    __kept = None
+    __fits = 0
+    __firstAttempt = 0
+
+    def needsROOT(self):
+        return True
+
+    def setWarmStart(self, warmStart):
+        self.__warmStart = warmStart
+
+    def getFitStats(self):
+        "(warm-started fits, those that converged on the first attempt)"
+        return (self.__fits, self.__firstAttempt)
+
+    def _warmFit(self, histo, fit, option, good=None, key=None):
+        """fits once from the last good parameters of the dataset, True if that converged and good(fit).
+        key tells apart fits of the same dataset that need different starts."""
+        key = (self._dataset, key)
+        if not self.__warmStart or not self.__parameters or key not in self.__parameters:
+            return False
+        for i, value in enumerate(self.__parameters[key]):
+            fit.SetParameter(i, value)
+        self.__fits += 1
+        if not self._keep(fit, self._fit(histo, fit, option), good, key[1]):
+            return False
+        self.__firstAttempt += 1
+        return True
+
+    def _fit(self, histo, fit, option):
+        "the fit of _warmFit, returns the fit status"
+        return histo.Fit(fit, option)
+
+    def _keep(self, fit, status, good=None, key=None):
+        "True if the fit converged and good(fit), its parameters are then the start for the next run"
+        if int(status) != 0 or (good != None and not good(fit)):
+            return False
+        if self.__warmStart:
+            if self.__parameters == None:
+                self.__parameters = {}
+            self.__kept = ((self._dataset, key), [fit.GetParameter(i) for i in range(fit.GetNpar())])
+            self.__parameters[self.__kept[0]] = self.__kept[1]
+        return True
+
+    def __getstate__(self):
+        # a fit worker counts from zero, setWorkerState adds its numbers to ours. Its start parameters
+        # come separately, with setStartParameters
+        state = BaseMetric.__getstate__(self)
+        state["_BaseFit__parameters"] = None
+        state["_BaseFit__kept"] = None
+        state["_BaseFit__fits"] = 0
+        state["_BaseFit__firstAttempt"] = 0
+        return state
+
+    def usesEarlierRuns(self):
+        return self.__warmStart
+
+    def getStartParameters(self):
+        "the last good parameters of each dataset, a copy"
+        if not self.__warmStart or self.__parameters == None:
+            return None
+        return dict(self.__parameters)
+
+    def setStartParameters(self, parameters):
+        self.__parameters = parameters
+
+    def getWorkerState(self):
+        return (self.__kept, self.__fits, self.__firstAttempt)
+
+    def setWorkerState(self, state):
+        (kept, fits, firstAttempt) = state
+        if kept != None:
+            if self.__parameters == None:
+                self.__parameters = {}
+            self.__parameters[kept[0]] = kept[1]
+        self.__fits += fits
+        self.__firstAttempt += firstAttempt
+
+class LanGau(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, controlVal, paramDefaults):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -10,20 +94,24 @@ class LanGau(BaseMetric):
         self.controlVal = controlVal 
         
     def calculate(self, histo):
-        import ROOT
-        ROOT.gSystem.Load("/data/users/HDQM/CMSSW_10_1_0_pre3/HistoricDQM/python/metrics/langau_c")
+        loadKernel("langau")
         from ROOT import langaufun
         from ROOT import TF1
         fit = TF1("langau",langaufun, self.range[0],self.range[1],4)
         if(histo.GetEntries()<150):
             histo.Rebin(2)
+        good = lambda fit: not (fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.range[0])
+        if self._warmFit(histo, fit, "QOR", good):
+            result = (fit.GetMaximumX(), fit.GetParError(self.desired))
+            del fit
+            return result
         fit.SetParameters(*(self.parameters))
         if(histo.GetBinCenter(histo.GetMaximumBin())>self.range[0]):
             fit.SetParameter(1,histo.GetBinCenter(histo.GetMaximumBin()))
         fit.SetParameter(2,histo.Integral())
         histo.Fit(fit,"QOR")
         histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
+        status = histo.Fit(fit,"QOR")
         control = 0
         while control < 5 :
             if(fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.range[0]):
@@ -35,16 +123,17 @@ class LanGau(BaseMetric):
                 fit.SetParameter(4,self.parameters[3]*(control+1))
                 histo.Fit(fit,"QO","",self.range[0]-2,self.range[1])
                 histo.Fit(fit,"QO","",self.range[0]-2,self.range[1])
-                histo.Fit(fit,"QO","",self.range[0]-2,self.range[1])
+                status = histo.Fit(fit,"QO","",self.range[0]-2,self.range[1])
                 control=control+1
             else:
                 print "##### GOOD #####"
                 control = 5
+        self._keep(fit, status, good)
         result = (fit.GetMaximumX(), fit.GetParError(self.desired))
         del fit
         return result
 
-class LanGauAroundMax(BaseMetric):
+class LanGauAroundMax(BaseFit):
     def __init__(self, diseredParameter, minFrac, maxFrac, controlVal):
         BaseMetric.__init__(self)
         self.min = minFrac
@@ -54,22 +143,26 @@ class LanGauAroundMax(BaseMetric):
         self.controlVal = controlVal 
         
     def calculate(self, histo):
-        import ROOT
-        ROOT.gSystem.Load("/data/users/HDQM/CMSSW_10_1_0_pre3/HistoricDQM/python/metrics/langau_c")
+        loadKernel("langau")
         from ROOT import langaufun
         from ROOT import TF1
         if(histo.GetEntries()<150):
             histo.Rebin(2)
         initm=histo.GetBinCenter(histo.GetMaximumBin())
         fit = TF1("langau",langaufun, self.min*initm,self.max*initm,4)
+        fit.SetParLimits(3,0,1000)
+        good = lambda fit: not (fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.min*initm)
+        if self._warmFit(histo, fit, "QORB", good):
+            result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
+            del fit
+            return result
         fit.SetParameter(0,histo.GetRMS()/6)
         fit.SetParameter(1,initm)
         fit.SetParameter(2,histo.Integral())
         fit.SetParameter(3,histo.GetRMS()/6)
-        fit.SetParLimits(3,0,1000)
         histo.Fit(fit,"QORB")
         histo.Fit(fit,"QORB")
-        histo.Fit(fit,"ORB")
+        status = histo.Fit(fit,"ORB")
         control = 0
         while control < 5 :
             if(fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.min*initm):
@@ -80,18 +173,126 @@ class LanGauAroundMax(BaseMetric):
                 fit.SetParameter(3,histo.GetRMS()/6*(control+1))
                 histo.Fit(fit,"QORB","")
                 histo.Fit(fit,"QORB","")
-                histo.Fit(fit,"ORB","")
+                status = histo.Fit(fit,"ORB","")
                 control=control+1
             else:
                 print "##### GOOD #####"
                 control = 5
+        self._keep(fit, status, good)
         result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
         del fit
         return result
 
 
 
-class GauLand(BaseMetric):
+class NumpyLanGau(BaseFit):
+    """LanGau without ROOT: the same starting values and refits with the langau of metrics/langau.py
+    and a scipy chi2 fit. Takes the parameters of LanGau, validateLanGau.py compares the two."""
+    def __init__(self, diseredParameter, minVal, maxVal, controlVal, paramDefaults):
+        BaseMetric.__init__(self)
+        self.range = [minVal, maxVal]
+        self.parameters = paramDefaults
+        assert diseredParameter in [0,1,2], "can only get parameter 0, 1 or 2 not '%s'"%desiredParameter
+        self.desired = diseredParameter
+        self.controlVal = controlVal
+
+    def needsROOT(self):
+        return False
+
+    def useFitWorkers(self):
+        return True
+
+    def _fit(self, histo, fit, option):
+        return fit.fit()
+
+    def calculate(self, histo):
+        from langau import LanGauFit
+        fit = LanGauFit(histo, self.range[0], self.range[1], 2 if histo.GetEntries()<150 else 1)
+        good = lambda fit: not (fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.range[0])
+        if self._warmFit(histo, fit, "QOR", good):
+            return (fit.GetMaximumX(), fit.GetParError(self.desired))
+        fit.SetParameters(*(self.parameters))
+        if(fit.maximumBinCenter()>self.range[0]):
+            fit.SetParameter(1,fit.maximumBinCenter())
+        fit.SetParameter(2,fit.integral())
+        #3x as LanGau, each fit starts from the last one
+        fit.fit()
+        fit.fit()
+        status = fit.fit()
+        control = 0
+        while control < 5 :
+            if(fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.range[0]):
+                print "########### REFIT #######"
+                fit.SetParameters(*(self.parameters))
+                if(fit.maximumBinCenter()>self.range[0]):
+                    fit.SetParameter(1,fit.maximumBinCenter())
+                fit.SetParameter(2,fit.integral()*(5+control)/5)
+                # LanGau sets parameter 4 here, the TF1 has only 0 to 3 and ignores it
+                fit.fit(self.range[0]-2,self.range[1])
+                fit.fit(self.range[0]-2,self.range[1])
+                status = fit.fit(self.range[0]-2,self.range[1])
+                control=control+1
+            else:
+                print "##### GOOD #####"
+                control = 5
+        self._keep(fit, status, good)
+        return (fit.GetMaximumX(), fit.GetParError(self.desired))
+
+class NumpyLanGauAroundMax(BaseFit):
+    "LanGauAroundMax without ROOT, see NumpyLanGau"
+    def __init__(self, diseredParameter, minFrac, maxFrac, controlVal):
+        BaseMetric.__init__(self)
+        self.min = minFrac
+        self.max = maxFrac
+        assert diseredParameter in [0,1,2], "can only get parameter 0, 1 or 2 not '%s'"%desiredParameter
+        self.desired = diseredParameter
+        self.controlVal = controlVal
+
+    def needsROOT(self):
+        return False
+
+    def useFitWorkers(self):
+        return True
+
+    def _fit(self, histo, fit, option):
+        return fit.fit()
+
+    def calculate(self, histo):
+        from langau import LanGauFit
+        rebin = 2 if histo.GetEntries()<150 else 1
+        fit = LanGauFit(histo, 0, 0, rebin)
+        initm = fit.maximumBinCenter()
+        fit.SetRange(self.min*initm, self.max*initm)
+        fit.SetParLimits(3,0,1000)
+        good = lambda fit: not (fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.min*initm)
+        if self._warmFit(histo, fit, "QORB", good):
+            return (fit.GetParameter(self.desired), fit.GetParError(self.desired))
+        fit.SetParameter(0,histo.GetRMS()/6)
+        fit.SetParameter(1,initm)
+        fit.SetParameter(2,fit.integral())
+        fit.SetParameter(3,histo.GetRMS()/6)
+        fit.fit()
+        fit.fit()
+        status = fit.fit()
+        control = 0
+        while control < 5 :
+            if(fit.GetParameter(0)<self.controlVal or fit.GetParameter(1)<self.min*initm):
+                print "########### REFIT #######"
+                fit.SetParameter(0,histo.GetRMS()/6)
+                fit.SetParameter(1,initm)
+                fit.SetParameter(2,fit.integral()*(5+control)/5)
+                fit.SetParameter(3,histo.GetRMS()/6*(control+1))
+                fit.fit()
+                fit.fit()
+                status = fit.fit()
+                control=control+1
+            else:
+                print "##### GOOD #####"
+                control = 5
+        self._keep(fit, status, good)
+        return (fit.GetParameter(self.desired), fit.GetParError(self.desired))
+
+class GauLand(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, paramDefaults):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -102,18 +303,19 @@ class GauLand(BaseMetric):
     def calculate(self, histo):
         from ROOT import TF1
         fit = TF1("landau","[2]*TMath::Landau(x,[0],[1],0)+[4]*TMath::Gaus(x,[0],[3])", *(self.range))
-        fit.SetParameters(*(self.parameters))
-        fit.SetParameter(2,histo.GetMaximum()/2)
-        fit.SetParameter(4,histo.GetMaximum()/2)
-        #3x to stabilise minimization
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
+        if not self._warmFit(histo, fit, "QOR"):
+            fit.SetParameters(*(self.parameters))
+            fit.SetParameter(2,histo.GetMaximum()/2)
+            fit.SetParameter(4,histo.GetMaximum()/2)
+            #3x to stabilise minimization
+            histo.Fit(fit,"QOR")
+            histo.Fit(fit,"QOR")
+            self._keep(fit, histo.Fit(fit,"QOR"))
         result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
         del fit
         return result
 
-class Landau(BaseMetric):
+class Landau(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, paramDefaults):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -124,11 +326,13 @@ class Landau(BaseMetric):
     def calculate(self, histo):
         from ROOT import TF1
         fit = TF1("landau","[2]*TMath::Landau(x,[0],[1],0)", *(self.range))
-        fit.SetParameters(*(self.parameters))
-        #3x to stabilise minimization
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"OR")
+        good = lambda fit: fit.GetParameter(self.desired)>0
+        if not self._warmFit(histo, fit, "QOR", good):
+            fit.SetParameters(*(self.parameters))
+            #3x to stabilise minimization
+            histo.Fit(fit,"QOR")
+            histo.Fit(fit,"QOR")
+            self._keep(fit, histo.Fit(fit,"OR"), good)
         if (fit.GetParameter(self.desired)>0) :
             result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
         else :
@@ -136,7 +340,7 @@ class Landau(BaseMetric):
         del fit
         return result
 
-class LandauTest(BaseMetric):
+class LandauTest(BaseFit):
     def __init__(self, diseredParameter, minVal1, maxVal1, minVal2, maxVal2, turnRun, paramDefaults):
         BaseMetric.__init__(self)
         self.range2 = [minVal2, maxVal2]
@@ -158,10 +362,13 @@ class LandauTest(BaseMetric):
             fit.SetParameters(*(self.parameters))
             fit.SetParameter(0,fit.GetParameter(0)*1.58)
             fit.SetParameter(1,fit.GetParameter(1)*1.58)
-        #3x to stabilise minimization
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"OR")
+        good = lambda fit: fit.GetParameter(self.desired)>0 and fit.GetParameter(self.desired)<60000
+        # a warm start only from a fit in the same range
+        if not self._warmFit(histo, fit, "QOR", good, self._run >= self.turn):
+            #3x to stabilise minimization
+            histo.Fit(fit,"QOR")
+            histo.Fit(fit,"QOR")
+            self._keep(fit, histo.Fit(fit,"OR"), good, self._run >= self.turn)
         if (fit.GetParameter(self.desired)>0 and fit.GetParameter(self.desired)<60000) :
             result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
         else :
@@ -170,7 +377,7 @@ class LandauTest(BaseMetric):
         return result
 
 
-class LandauAroundMaxBin(BaseMetric):
+class LandauAroundMaxBin(BaseFit):
     def __init__(self, diseredParameter, width):
         BaseMetric.__init__(self)
         assert diseredParameter in [0,1,2], "can only get parameter 0, 1 or 2 not '%s'"%desiredParameter
@@ -189,7 +396,7 @@ class LandauAroundMaxBin(BaseMetric):
         result = (func.GetParameter(self.desired), func.GetParError(self.desired))
         return result
 
-class LandauAroundMax(BaseMetric):
+class LandauAroundMax(BaseFit):
     def __init__(self, diseredParameter, lowFrac, highFrac, hLimit, lowLimit=0):
         BaseMetric.__init__(self)
         assert diseredParameter in [0,1,2], "can only get parameter 0, 1 or 2 not '%s'"%desiredParameter
@@ -212,13 +419,15 @@ class LandauAroundMax(BaseMetric):
         self.range = [maxbincenter*self.lowF , maxbincenter*self.highF]
         #print maxbincenter
         fit = TF1("landau","[2]*TMath::Landau(x,[0],[1],0)", *(self.range))
-        fit.SetParameter(0,maxbincenter)
-        fit.SetParameter(1,maxbincenter/10.)
-        fit.SetParameter(2,histo.GetMaximum())
-        #3x to stabilise minimization
-        histo.Fit(fit,"QOR","",*(self.range))
-        histo.Fit(fit,"QOR","",*(self.range))
-        histo.Fit(fit,"OR","",*(self.range))
+        good = lambda fit: fit.GetParameter(self.desired)>0 and fit.GetParameter(self.desired)<self.cut
+        if not self._warmFit(histo, fit, "QOR", good):
+            fit.SetParameter(0,maxbincenter)
+            fit.SetParameter(1,maxbincenter/10.)
+            fit.SetParameter(2,histo.GetMaximum())
+            #3x to stabilise minimization
+            histo.Fit(fit,"QOR","",*(self.range))
+            histo.Fit(fit,"QOR","",*(self.range))
+            self._keep(fit, histo.Fit(fit,"OR","",*(self.range)), good)
         if (fit.GetParameter(self.desired)>0 and fit.GetParameter(self.desired)<self.cut) :
             result = (fit.GetParameter(self.desired), fit.GetParError(self.desired))
         else :
@@ -227,7 +436,7 @@ class LandauAroundMax(BaseMetric):
         return result
 
 
-class Gaussian(BaseMetric):
+class Gaussian(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, paramDefaults):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -244,7 +453,7 @@ class Gaussian(BaseMetric):
         del fit
         return result
 
-class StudentT(BaseMetric):
+class StudentT(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -252,9 +461,8 @@ class StudentT(BaseMetric):
         self.desired = diseredParameter
 
     def calculate(self, histo):
-        import ROOT
         import math
-        ROOT.gSystem.Load("/data/users/HDQM/CMSSW_10_1_0_pre3/HistoricDQM/python/metrics/residuals_c")
+        loadKernel("residuals")
         from ROOT import tStud
         from ROOT import TF1
         fit = TF1("tStud",tStud,self.range[0],self.range[1],5)
@@ -272,7 +480,7 @@ class StudentT(BaseMetric):
         return result
 
 
-class TripleGaus(BaseMetric):
+class TripleGaus(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal,average=True):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -284,10 +492,11 @@ class TripleGaus(BaseMetric):
         from ROOT import TF1
         from math import sqrt
         fit = TF1("tgaus","[2]*TMath::Gaus(x,[0],[1])+[5]*TMath::Gaus(x,[3],[4])+[8]*TMath::Gaus(x,[6],[7])", *(self.range))
-        fit.SetParameters(histo.GetMaximum(),0,histo.GetRMS()/10,histo.GetMaximum()/5,0,histo.GetRMS()/3,histo.GetMaximum()/5,0,histo.GetRMS())
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"QOR")
-        histo.Fit(fit,"OR")
+        if not self._warmFit(histo, fit, "QOR"):
+            fit.SetParameters(histo.GetMaximum(),0,histo.GetRMS()/10,histo.GetMaximum()/5,0,histo.GetRMS()/3,histo.GetMaximum()/5,0,histo.GetRMS())
+            histo.Fit(fit,"QOR")
+            histo.Fit(fit,"QOR")
+            self._keep(fit, histo.Fit(fit,"OR"))
         if self.average:
             g1=TF1("g1","[2]*TMath::Gaus(x,[0],[1])",*(self.range))
             g1.SetParameters(fit.GetParameter(0),fit.GetParameter(1),fit.GetParameter(2))
@@ -305,7 +514,7 @@ class TripleGaus(BaseMetric):
         del fit
         return result
 
-class FlatLine(BaseMetric):
+class FlatLine(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, paramDefault):
         BaseMetric.__init__(self)
         self.range = [minVal, maxVal]
@@ -322,7 +531,7 @@ class FlatLine(BaseMetric):
         del fit
         return result
 
-class FlatLineXcut(BaseMetric):
+class FlatLineXcut(BaseFit):
     def __init__(self, diseredParameter, minVal, maxVal, paramDefault):
         BaseMetric.__init__(self)
         
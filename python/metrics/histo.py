@@ -0,0 +1,390 @@
+import numpy
+from hashlib import sha1
+
+# stats layout of TH1::GetStats: sumw, sumw2, sumwx, sumwx2, sumwy, sumwy2, sumwxy, sumwz, sumwz2
+_STATS_AXIS = {1: 2, 2: 4, 3: 7}
+_NSTATS = 13
+_DTYPES = {'C': numpy.int8, 'S': numpy.int16, 'I': numpy.int32, 'F': numpy.float32, 'D': numpy.float64}
+
+def _fromBuffer(buffer, size, dtype):
+    "copies a C array returned by PyROOT into a numpy array"
+    if hasattr(buffer, 'reshape'):
+        buffer.reshape((size,))
+    else:
+        buffer.SetSize(size)
+    return numpy.frombuffer(buffer, dtype=dtype, count=size).astype(numpy.float64)
+
+
+class NumpyAxis(object):
+    "minimal TAxis replacement"
+    __slots__ = ('edges', 'labels')
+
+    def __init__(self, edges, labels=None):
+        self.edges = numpy.asarray(edges, dtype=numpy.float64)
+        self.labels = labels
+
+    def GetNbins(self):
+        return len(self.edges)-1
+    def GetXmin(self):
+        return self.edges[0]
+    def GetXmax(self):
+        return self.edges[-1]
+    def GetBinLowEdge(self, bin):
+        return self.edges[min(max(bin, 1), len(self.edges))-1]
+    def GetBinUpEdge(self, bin):
+        return self.edges[min(max(bin, 0), len(self.edges)-1)]
+    def GetBinCenter(self, bin):
+        if 1 <= bin < len(self.edges):
+            return 0.5*(self.edges[bin-1]+self.edges[bin])
+        width = self.edges[1]-self.edges[0] if bin < 1 else self.edges[-1]-self.edges[-2]
+        return self.edges[0]-0.5*width if bin < 1 else self.edges[-1]+0.5*width
+
+    def centers(self):
+        return 0.5*(self.edges[1:]+self.edges[:-1])
+
+    def FindBin(self, x):
+        if isinstance(x, str):
+            if self.labels is None or x not in self.labels:
+                return -1
+            return self.labels.index(x)+1
+        return int(numpy.searchsorted(self.edges, x, side='right'))
+
+
+class NumpyHisto(object):
+    """ROOT free 1D/2D histogram implementing the part of the TH1 interface used by the simple metrics.
+    contents and errors include under- and overflow and use the ROOT cell layout, i.e. [y, x] for 2D.
+    For profiles contents holds the bin means and binEntries the bin entries."""
+    __slots__ = ('name', 'title', 'className', 'contents', 'errors', 'xaxis', 'yaxis', 'entries', 'stats', 'binEntries')
+
+    def __init__(self, name, title, className, contents, errors, xaxis, yaxis=None, entries=0., stats=None, binEntries=None):
+        self.name = name
+        self.title = title
+        self.className = className
+        self.contents = numpy.asarray(contents, dtype=numpy.float64)
+        self.errors = numpy.sqrt(numpy.abs(self.contents)) if errors is None else numpy.asarray(errors, dtype=numpy.float64)
+        self.xaxis = xaxis
+        self.yaxis = yaxis
+        self.entries = float(entries)
+        self.stats = numpy.zeros(_NSTATS)
+        if stats is not None:
+            self.stats[:len(stats)] = stats
+        self.binEntries = binEntries
+
+    @classmethod
+    def fromJSON(cls, histo):
+        """builds the histogram from a jsonfairy 'hist' dictionary, giving the same numbers as
+        the ROOT object built by dqm_getSingleHist_json"""
+        stats = histo['stats']
+        entries = stats['entries']
+        def moments(axis):
+            mean = stats['mean'][axis]['value']
+            rms = stats['rms'][axis]['value']
+            return [entries*mean, (rms*rms+mean*mean)*entries]
+        def axis(name, nbins):
+            first = histo[name]['first']['value']
+            last = histo[name]['last']['value']
+            return NumpyAxis(numpy.linspace(first, last, nbins+1))
+        if histo['type'] == 'TProfile':
+            # ROOT gets one fill per bin centre with weight 1/error^2, bins without error stay empty
+            xaxis = axis('xaxis', len(histo['bins']['content']))
+            values = numpy.asarray(histo['bins']['content'], dtype=numpy.float64)
+            errors = numpy.asarray(histo['bins']['error'], dtype=numpy.float64)
+            weights = numpy.zeros(len(values))
+            numpy.divide(1., errors*errors, out=weights, where=errors!=0)
+            filled = weights != 0
+            contents = numpy.zeros(len(values)+2)
+            contents[1:-1] = numpy.where(filled, values, 0.)
+            binErrors = numpy.zeros(len(values)+2)
+            binErrors[1:-1] = numpy.where(filled, errors, 0.)
+            binEntries = numpy.zeros(len(values)+2)
+            binEntries[1:-1] = weights
+            moment = [entries, entries]+moments('X')+[(weights*values).sum(), (weights*values*values).sum()]
+            return cls(stats['name'], histo['title'], histo['type'], contents, binErrors, xaxis,
+                       entries=entries, stats=moment, binEntries=binEntries)
+        if 'TH1' in histo['type']:
+            # stored as TH1F by ROOT
+            values = numpy.asarray(histo['bins']['content'], dtype=numpy.float32)
+            contents = numpy.zeros(len(values)+2)
+            errors = numpy.zeros(len(values)+2)
+            contents[1:-1] = values
+            errors[1:-1] = histo['bins']['error']
+            return cls(stats['name'], histo['title'], histo['type'], contents, errors, axis('xaxis', len(values)),
+                       entries=entries, stats=[entries, entries]+moments('X'))
+        nbinsx = histo['xaxis']['last']['id']
+        nbinsy = histo['yaxis']['last']['id']
+        xaxis = axis('xaxis', nbinsx)
+        yaxis = axis('yaxis', nbinsy)
+        contents = numpy.zeros((nbinsy+2, nbinsx+2))
+        if 'TH2' in histo['type']:
+            # stored as TH2F by ROOT, errors are sqrt(content)
+            contents[1:-1, 1:-1] = numpy.asarray(histo['bins']['content'], dtype=numpy.float32)
+            return cls(stats['name'], histo['title'], histo['type'], contents, None, xaxis, yaxis,
+                       entries, [entries, entries]+moments('X')+moments('Y'))
+        # TProfile2D: one entry per bin, ROOT recomputes the stats from the bins
+        contents[1:-1, 1:-1] = histo['bins']['content']
+        binEntries = numpy.zeros(contents.shape)
+        binEntries[1:-1, 1:-1] = 1.
+        x, y = numpy.meshgrid(xaxis.centers(), yaxis.centers())
+        moment = [nbinsx*nbinsy, nbinsx*nbinsy, x.sum(), (x*x).sum(), y.sum(), (y*y).sum(), (x*y).sum(),
+                  contents.sum(), 0.]
+        return cls(stats['name'], histo['title'], histo['type'], contents, numpy.abs(contents), xaxis, yaxis,
+                   entries, moment, binEntries)
+
+    @classmethod
+    def fromROOT(cls, histo):
+        "copies a ROOT TH1/TH2 or profile, the ROOT object is left untouched"
+        from array import array
+        className = histo.ClassName()
+        dimension = histo.GetDimension()
+        if dimension > 2:
+            raise ValueError("NumpyHisto only supports 1D and 2D histograms, got %s" % className)
+        stats = array('d', [0.]*_NSTATS)
+        histo.GetStats(stats)
+        binEntries = None
+        values = histo
+        if histo.InheritsFrom("TProfile") or histo.InheritsFrom("TProfile2D"):
+            project = histo.ProjectionX if dimension == 1 else histo.ProjectionXY
+            values = project(histo.GetName()+"_numpy", "")
+            entriesHisto = project(histo.GetName()+"_numpyEntries", "B")
+            binEntries = _fromBuffer(entriesHisto.GetArray(), entriesHisto.GetSize(), numpy.float64)
+            values.SetDirectory(0)
+            entriesHisto.SetDirectory(0)
+        size = values.GetSize()
+        contents = _fromBuffer(values.GetArray(), size, _DTYPES.get(values.ClassName()[-1], numpy.float64))
+        errors = None
+        if values.GetSumw2N():
+            errors = numpy.sqrt(_fromBuffer(values.GetSumw2().GetArray(), size, numpy.float64))
+        def axis(rootAxis):
+            bins = rootAxis.GetNbins()
+            edges = [rootAxis.GetBinLowEdge(i) for i in range(1, bins+2)]
+            labels = None
+            if rootAxis.GetLabels():
+                labels = [rootAxis.GetBinLabel(i) for i in range(1, bins+1)]
+            return NumpyAxis(edges, labels)
+        xaxis = axis(histo.GetXaxis())
+        yaxis = None
+        if dimension == 2:
+            yaxis = axis(histo.GetYaxis())
+            contents = contents.reshape((yaxis.GetNbins()+2, xaxis.GetNbins()+2))
+            if errors is not None:
+                errors = errors.reshape(contents.shape)
+            if binEntries is not None:
+                binEntries = binEntries.reshape(contents.shape)
+        return cls(histo.GetName(), histo.GetTitle(), className, contents, errors, xaxis, yaxis,
+                   histo.GetEntries(), stats, binEntries)
+
+    def toROOT(self):
+        "builds the equivalent ROOT histogram, e.g. for fits"
+        import ROOT
+        if self.yaxis is None:
+            roothist = ROOT.TH1D(self.name, self.title, self.xaxis.GetNbins(), self.xaxis.edges)
+        else:
+            roothist = ROOT.TH2D(self.name, self.title, self.xaxis.GetNbins(), self.xaxis.edges,
+                                 self.yaxis.GetNbins(), self.yaxis.edges)
+        roothist.SetDirectory(0)
+        roothist.SetContent(numpy.ascontiguousarray(self.contents.ravel()))
+        roothist.SetError(numpy.ascontiguousarray(self.errors.ravel()))
+        roothist.SetEntries(self.entries)
+        roothist.PutStats(numpy.array(self.stats))
+        return roothist
+
+    def __repr__(self):
+        return "<NumpyHisto %s '%s'>" % (self.className, self.name)
+
+    def contentHash(self):
+        "sha1 of everything a metric can see: bins, errors, axes, entries and stats. The name is left out."
+        digest = sha1(repr((self.className, self.entries, self.xaxis.labels,
+                            None if self.yaxis is None else self.yaxis.labels)).encode('utf-8'))
+        for values in (self.contents, self.errors, self.stats, self.binEntries, self.xaxis.edges,
+                       None if self.yaxis is None else self.yaxis.edges):
+            digest.update(b'-' if values is None else numpy.ascontiguousarray(values, dtype=numpy.float64).tobytes())
+        return digest.hexdigest()
+
+    def GetName(self):
+        return self.name
+    def GetTitle(self):
+        return self.title
+    def ClassName(self):
+        return self.className
+    def GetDimension(self):
+        return 1 if self.yaxis is None else 2
+    def GetXaxis(self):
+        return self.xaxis
+    def GetYaxis(self):
+        return self.yaxis
+    def GetNbinsX(self):
+        return self.xaxis.GetNbins()
+    def GetNbinsY(self):
+        return 1 if self.yaxis is None else self.yaxis.GetNbins()
+    def GetSize(self):
+        return self.contents.size
+    def GetEntries(self):
+        return self.entries
+    def SetEntries(self, entries):
+        self.entries = float(entries)
+
+    def GetBin(self, binx, biny=0):
+        if self.yaxis is None:
+            return binx
+        return binx+(self.xaxis.GetNbins()+2)*biny
+
+    def __cell(self, binx, biny):
+        if biny is None:
+            # global bin number as returned by GetBin, GetMaximumBin, FindBin
+            binx = min(max(int(binx), 0), self.contents.size-1)
+            return numpy.unravel_index(binx, self.contents.shape)
+        if self.yaxis is None:
+            return (min(max(int(binx), 0), self.contents.size-1),)
+        return (min(max(int(biny), 0), self.contents.shape[0]-1), min(max(int(binx), 0), self.contents.shape[1]-1))
+
+    def GetBinContent(self, binx, biny=None):
+        return float(self.contents[self.__cell(binx, biny)])
+    def GetBinError(self, binx, biny=None):
+        return float(self.errors[self.__cell(binx, biny)])
+
+    def GetBinCenter(self, bin):
+        return self.xaxis.GetBinCenter(bin)
+
+    def FindBin(self, x, y=None):
+        if self.yaxis is None or y is None:
+            return self.xaxis.FindBin(x)
+        return self.GetBin(self.xaxis.FindBin(x), self.yaxis.FindBin(y))
+
+    def __inRange(self, array):
+        if self.yaxis is None:
+            return array[1:-1]
+        return array[1:-1, 1:-1]
+
+    def GetMaximum(self):
+        return float(self.__inRange(self.contents).max())
+    def GetMinimum(self):
+        return float(self.__inRange(self.contents).min())
+
+    def __extremumBin(self, index):
+        inRange = self.__inRange(self.contents)
+        cell = numpy.unravel_index(index(inRange), inRange.shape)
+        if self.yaxis is None:
+            return int(cell[0])+1
+        return self.GetBin(int(cell[1])+1, int(cell[0])+1)
+    def GetMaximumBin(self):
+        return self.__extremumBin(numpy.argmax)
+    def GetMinimumBin(self):
+        return self.__extremumBin(numpy.argmin)
+
+    def GetSumOfWeights(self):
+        if self.binEntries is not None:
+            return float(self.__inRange(self.binEntries).sum())
+        return float(self.__inRange(self.contents).sum())
+
+    def Integral(self, binx1=None, binx2=None):
+        if binx1 is None:
+            return float(self.__inRange(self.contents).sum())
+        # same clipping as TH1::Integral, the y range includes under- and overflow
+        nbins = self.xaxis.GetNbins()
+        binx1 = max(int(binx1), 0)
+        binx2 = int(binx2)
+        if binx2 > nbins+1 or binx2 < binx1:
+            binx2 = nbins+1
+        if self.yaxis is None:
+            return float(self.contents[binx1:binx2+1].sum())
+        return float(self.contents[:, binx1:binx2+1].sum())
+
+    def GetStats(self, stats=None):
+        if stats is None:
+            return numpy.array(self.stats)
+        for i in range(min(len(stats), _NSTATS)):
+            stats[i] = self.stats[i]
+        return stats
+
+    def GetEffectiveEntries(self):
+        if self.stats[1]:
+            return self.stats[0]*self.stats[0]/self.stats[1]
+        return abs(self.stats[0])
+
+    def GetMean(self, axis=1):
+        if axis not in _STATS_AXIS or self.stats[0] == 0:
+            return 0.
+        return self.stats[_STATS_AXIS[axis]]/self.stats[0]
+
+    def GetStdDev(self, axis=1):
+        if axis not in _STATS_AXIS or self.stats[0] == 0:
+            return 0.
+        mean = self.GetMean(axis)
+        return numpy.sqrt(abs(self.stats[_STATS_AXIS[axis]+1]/self.stats[0]-mean*mean))
+    GetRMS = GetStdDev
+
+    def GetMeanError(self, axis=1):
+        neff = self.GetEffectiveEntries()
+        return self.GetStdDev(axis)/numpy.sqrt(neff) if neff > 0 else 0.
+
+    def GetStdDevError(self, axis=1):
+        neff = self.GetEffectiveEntries()
+        return self.GetStdDev(axis)/numpy.sqrt(2*neff) if neff > 0 else 0.
+    GetRMSError = GetStdDevError
+
+
+class SharedHisto(object):
+    """read only view of a histogram evaluated by several metrics. The bin array and the results of
+    the statistics accessors are computed on first use and shared, everything else goes to the
+    histogram."""
+    _SHARED = frozenset(("GetEntries", "GetEffectiveEntries", "GetSumOfWeights", "Integral", "GetMean",
+                         "GetMeanError", "GetRMS", "GetRMSError", "GetStdDev", "GetStdDevError", "GetMaximum",
+                         "GetMinimum", "GetMaximumBin", "GetMinimumBin", "GetNbinsX", "GetNbinsY", "GetSize",
+                         "FindBin", "GetBinContent", "GetBinError"))
+
+    def __init__(self, histo):
+        self.histo = histo
+        self.__values = {}
+        self.__contents = None
+
+    def binContents(self):
+        if self.__contents is None:
+            self.__contents = binContents(self.histo)
+        return self.__contents
+
+    def __getattr__(self, name):
+        attribute = getattr(self.histo, name)
+        if name not in SharedHisto._SHARED:
+            return attribute
+        values = self.__values
+        def shared(*args):
+            key = (name,)+args
+            if key not in values:
+                values[key] = attribute(*args)
+            return values[key]
+        return shared
+
+    def __repr__(self):
+        return "<SharedHisto %r>" % (self.histo,)
+
+def binContents(histo):
+    """all bin contents of a ROOT histogram or NumpyHisto in one array, under- and overflow included.
+    Indexed [bin] for 1D and [biny, binx] for 2D, like GetBinContent. Profiles give the bin means."""
+    if isinstance(histo, NumpyHisto):
+        return histo.contents
+    if isinstance(histo, SharedHisto):
+        return histo.binContents()
+    dimension = histo.GetDimension()
+    if dimension > 2:
+        raise ValueError("binContents only supports 1D and 2D histograms, got %s" % histo.ClassName())
+    values = histo
+    if histo.InheritsFrom("TProfile") or histo.InheritsFrom("TProfile2D"):
+        project = histo.ProjectionX if dimension == 1 else histo.ProjectionXY
+        values = project(histo.GetName()+"_bins", "")
+        values.SetDirectory(0)
+    contents = _fromBuffer(values.GetArray(), values.GetSize(), _DTYPES.get(values.ClassName()[-1], numpy.float64))
+    if dimension == 2:
+        contents = contents.reshape((histo.GetNbinsY()+2, histo.GetNbinsX()+2))
+    return contents
+
+def contentHash(*histos):
+    "combined hash of the input histograms of a metric, ROOT histograms are converted first. None is allowed."
+    digest = sha1()
+    for histo in histos:
+        if histo is None:
+            digest.update(b'-')
+            continue
+        if not isinstance(histo, NumpyHisto):
+            histo = NumpyHisto.fromROOT(histo)
+        digest.update(histo.contentHash().encode('utf-8'))
+    return digest.hexdigest()
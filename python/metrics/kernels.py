@@ -0,0 +1,69 @@
+import os
+
+# compiled functions used by the fits: name -> source in this directory. The shared objects ACLiC
+# makes of them (langau.c -> langau_c.so) are not in git, they depend on the ROOT version. Build them
+# once per installation with python -m metrics.kernels, without one the source is compiled when the
+# kernel is first used.
+KERNELS = {
+    "langau": "langau.c",
+    "residuals": "residuals.c",
+    "Quantile": "Quantile.h",
+}
+
+# the command that builds them, named in the errors
+BUILD = "python -m metrics.kernels (in the python/ directory)"
+
+_directory = os.path.dirname(os.path.abspath(__file__))
+_loaded = {}
+
+class MissingKernelError(RuntimeError):
+    "a fit kernel is neither built nor available as source, the metric fails like any other"
+
+def getLibrary(name):
+    "path of the shared object of a kernel without .so, e.g. .../metrics/langau_c"
+    if name not in KERNELS:
+        raise MissingKernelError("unknown fit kernel '%s', known are %s" % (name, ", ".join(sorted(KERNELS))))
+    (base, extension) = os.path.splitext(KERNELS[name])
+    return os.path.join(_directory, "%s_%s" % (base, extension[1:]))
+
+def loadKernel(name):
+    """loads a kernel into ROOT, once per process, and returns the path of its library. Raises
+    MissingKernelError if there is no shared object and no source to compile it from."""
+    if name in _loaded:
+        return _loaded[name]
+    library = getLibrary(name)
+    source = os.path.join(_directory, KERNELS[name])
+    import ROOT
+    if os.path.exists(library+".so"):
+        if ROOT.gSystem.Load(library) < 0:
+            raise MissingKernelError("fit kernel '%s': ROOT can not load %s.so, rebuild it from %s with %s" % (name, library, source, BUILD))
+    elif os.path.exists(source):
+        if not ROOT.gSystem.CompileMacro(source, "kO"):
+            raise MissingKernelError("fit kernel '%s': compiling %s failed, see the ACLiC output above or build it with %s" % (name, source, BUILD))
+    else:
+        raise MissingKernelError("fit kernel '%s' is missing: neither %s.so nor %s exist, restore the source from git and run %s" % (name, library, source, BUILD))
+    _loaded[name] = library
+    return library
+
+def loadedKernels():
+    "names of the kernels loaded in this process"
+    return sorted(_loaded)
+
+def buildKernels(names=None):
+    "(re)compiles the shared objects of the kernels whose source is there, returns the names built"
+    import ROOT
+    built = []
+    for name in sorted(names or KERNELS):
+        source = os.path.join(_directory, KERNELS[name])
+        if not os.path.exists(source):
+            continue
+        if not ROOT.gSystem.CompileMacro(source, "kfO"):
+            raise MissingKernelError("fit kernel '%s': compiling %s failed" % (name, source))
+        _loaded[name] = getLibrary(name)
+        built.append(name)
+    return built
+
+if __name__ == '__main__':
+    # python -m metrics.kernels: builds the shared objects shipped with the metrics
+    for name in buildKernels():
+        print("built {0}.so".format(getLibrary(name)))
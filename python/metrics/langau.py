@@ -0,0 +1,210 @@
+import numpy
+
+# ROOT free version of langau.c: the Landau density convolved with a Gaussian and the chi2 fit
+# TH1::Fit does with it, for fits.NumpyLanGau
+
+# CERNLIB DENLAN, the approximation behind TMath::Landau
+_P = [(0.4259894875, -0.1249762550, 0.03984243700, -0.006298287635, 0.001511162253),
+      (0.1788541609, 0.1173957403, 0.01488850518, -0.001394989411, 0.0001283617211),
+      (0.1788544503, 0.09359161662, 0.006325387654, 0.00006611667319, -0.000002031049101),
+      (0.9874054407, 118.6723273, 849.2794360, -743.7792444, 427.0262186),
+      (1.003675074, 167.5702434, 4789.711289, 21217.86767, -22324.94910),
+      (1.000827619, 664.9143136, 62972.92665, 475554.6998, -5743609.109)]
+_Q = [(1.0, -0.3388260629, 0.09594393323, -0.01608042283, 0.003778942063),
+      (1.0, 0.7428795082, 0.3153932961, 0.06694219548, 0.008790609714),
+      (1.0, 0.6097809921, 0.2560616665, 0.04746722384, 0.006957301675),
+      (1.0, 106.8615961, 337.6496214, 2016.712389, 1597.063511),
+      (1.0, 156.9424537, 3745.310488, 9834.698876, 66924.28357),
+      (1.0, 651.4101098, 56974.73333, 165917.4725, -2815759.939)]
+_A1 = (0.04166666667, -0.01996527778, 0.02709538966)
+_A2 = (-1.845568670, -4.284640743)
+
+def _ratio(i, u):
+    p = _P[i]
+    q = _Q[i]
+    return (p[0]+(p[1]+(p[2]+(p[3]+p[4]*u)*u)*u)*u)/(q[0]+(q[1]+(q[2]+(q[3]+q[4]*u)*u)*u)*u)
+
+def landau(x, mpv=0., sigma=1.):
+    "TMath::Landau(x, mpv, sigma) for an array of x, not normalised"
+    v = (numpy.asarray(x, dtype=numpy.float64)-mpv)/sigma if sigma > 0 else None
+    if v is None:
+        return numpy.zeros(numpy.shape(x))
+    result = numpy.zeros(v.shape)
+    with numpy.errstate(all='ignore'):
+        region = v < -5.5
+        u = numpy.exp(v[region]+1.0)
+        result[region] = numpy.where(u < 1e-10, 0.,
+                                     0.3989422803*(numpy.exp(-1/u)/numpy.sqrt(u))*(1+(_A1[0]+(_A1[1]+_A1[2]*u)*u)*u))
+        region = (v >= -5.5) & (v < -1)
+        u = numpy.exp(-v[region]-1)
+        result[region] = numpy.exp(-u)*numpy.sqrt(u)*_ratio(0, v[region])
+        region = (v >= -1) & (v < 1)
+        result[region] = _ratio(1, v[region])
+        region = (v >= 1) & (v < 5)
+        result[region] = _ratio(2, v[region])
+        for (i, low, high) in ((3, 5, 12), (4, 12, 50), (5, 50, 300)):
+            region = (v >= low) & (v < high)
+            u = 1/v[region]
+            result[region] = u*u*_ratio(i, u)
+        region = v >= 300
+        u = 1/(v[region]-v[region]*numpy.log(v[region])/(v[region]+1))
+        result[region] = u*u*(1+(_A2[0]+_A2[1]*u)*u)
+    return result
+
+# the convolution of langau.c: 100 steps over +-5 Gaussian sigmas. In units of sigma the grid and
+# the Gaussian weights are the same for every x and every parameter set.
+_STEPS = 100
+_SIGMAS = 5.
+_GRID = (numpy.arange(1, _STEPS+1)-0.5)*(2*_SIGMAS/_STEPS)-_SIGMAS
+_WEIGHTS = numpy.exp(-0.5*_GRID*_GRID)
+_MPSHIFT = -0.22278298
+_INVSQ2PI = 0.3989422804014
+
+def langau(x, parameters):
+    """langaufun of langau.c for an array of x. parameters: Landau width, most probable value,
+    area and Gaussian sigma."""
+    (width, mp, area, sigma) = parameters[:4]
+    x = numpy.asarray(x, dtype=numpy.float64)
+    if width <= 0:
+        return numpy.zeros(x.shape)
+    points = x[..., numpy.newaxis]+_GRID*sigma
+    density = landau(points, mp-_MPSHIFT*width, width)/width
+    return area*(2*_SIGMAS/_STEPS)*_INVSQ2PI*(density*_WEIGHTS).sum(axis=-1)
+
+def _bins(histo, rebin=1):
+    "(centres, contents, errors) of the bins of a 1D histogram, every rebin bins merged like TH1::Rebin"
+    from metrics.histo import NumpyHisto, SharedHisto
+    if isinstance(histo, SharedHisto):
+        histo = histo.histo
+    if not isinstance(histo, NumpyHisto):
+        histo = NumpyHisto.fromROOT(histo)
+    edges = histo.xaxis.edges
+    contents = histo.contents[1:-1]
+    errors = histo.errors[1:-1]
+    if rebin > 1:
+        # the bins left over go to the overflow
+        bins = len(contents)//rebin
+        edges = edges[:bins*rebin+1:rebin]
+        contents = contents[:bins*rebin].reshape((bins, rebin)).sum(axis=1)
+        errors = numpy.sqrt((errors[:bins*rebin]**2).reshape((bins, rebin)).sum(axis=1))
+    return (0.5*(edges[1:]+edges[:-1]), contents, errors)
+
+def _hessian(function, point, steps):
+    "matrix of the second derivatives of function at point, central differences"
+    size = len(point)
+    hessian = numpy.zeros((size, size))
+    value = function(point)
+    def shifted(i, di, j=None, dj=0.):
+        moved = numpy.array(point, dtype=numpy.float64)
+        moved[i] += di
+        if j is not None:
+            moved[j] += dj
+        return function(moved)
+    for i in range(size):
+        hessian[i, i] = (shifted(i, steps[i])-2*value+shifted(i, -steps[i]))/steps[i]**2
+        for j in range(i+1, size):
+            hessian[i, j] = hessian[j, i] = (shifted(i, steps[i], j, steps[j])-shifted(i, steps[i], j, -steps[j])
+                                             -shifted(i, -steps[i], j, steps[j])+shifted(i, -steps[i], j, -steps[j]))/(4*steps[i]*steps[j])
+    return hessian
+
+class LanGauFit(object):
+    """the langau function fitted to a histogram. It has the calls of TF1 the fit metrics use,
+    fit(xmin, xmax) does what TH1::Fit does with the TF1: a chi2 fit at the bin centres of the bins
+    with errors inside the range, parameter errors from the Hessian of the chi2."""
+    def __init__(self, histo, xmin, xmax, rebin=1):
+        (self.__centers, self.__contents, self.__errors) = _bins(histo, rebin)
+        self.__range = (xmin, xmax)
+        self.__parameters = numpy.zeros(4)
+        self.__parErrors = numpy.zeros(4)
+        self.__limits = None
+        self.__chi2 = 0.
+        self.__ndf = 0
+
+    def SetRange(self, xmin, xmax):
+        self.__range = (xmin, xmax)
+    def GetNpar(self):
+        return 4
+    def SetParameter(self, i, value):
+        # like TF1, a parameter that does not exist is ignored
+        if 0 <= i < 4:
+            self.__parameters[i] = value
+    def SetParameters(self, *values):
+        for i, value in enumerate(values):
+            self.SetParameter(i, value)
+    def SetParLimits(self, i, low, high):
+        "bounds used by every fit from then on, like TF1::SetParLimits with option B"
+        if self.__limits == None:
+            self.__limits = (numpy.full(4, -numpy.inf), numpy.full(4, numpy.inf))
+        self.__limits[0][i] = low
+        self.__limits[1][i] = high
+    def GetParameter(self, i):
+        return float(self.__parameters[i])
+    def GetParError(self, i):
+        return float(self.__parErrors[i])
+    def GetChisquare(self):
+        return self.__chi2
+    def GetNDF(self):
+        return self.__ndf
+    def Eval(self, x):
+        return langau(x, self.__parameters)
+
+    def integral(self):
+        "TH1::Integral of the histogram"
+        return float(self.__contents.sum())
+    def maximumBinCenter(self):
+        "centre of the maximum bin, TH1::GetBinCenter(TH1::GetMaximumBin())"
+        return float(self.__centers[numpy.argmax(self.__contents)])
+
+    def GetMaximumX(self):
+        "x of the maximum inside the range: a grid of 100 points, then Brent around the best one"
+        from scipy.optimize import minimize_scalar
+        (xmin, xmax) = self.__range
+        grid = numpy.linspace(xmin, xmax, 101)
+        best = int(numpy.argmax(self.Eval(grid)))
+        bounds = (grid[max(best-1, 0)], grid[min(best+1, len(grid)-1)])
+        found = minimize_scalar(lambda x: -float(self.Eval(numpy.array([x]))[0]), bounds=bounds, method="bounded",
+                                options={"xatol": 1e-10*max(abs(xmax-xmin), 1.)})
+        return float(found.x)
+
+    def fit(self, xmin=None, xmax=None):
+        """fits the function from its current parameters, by default in its range. Returns 0 if the
+        fit converged, like the status of TH1::Fit."""
+        from scipy.optimize import least_squares
+        if xmin is None:
+            (xmin, xmax) = self.__range
+        selected = (self.__centers >= xmin) & (self.__centers <= xmax) & (self.__errors > 0)
+        if selected.sum() <= 4:
+            return 4
+        centers = self.__centers[selected]
+        contents = self.__contents[selected]
+        errors = self.__errors[selected]
+        residuals = lambda parameters: (contents-langau(centers, parameters))/errors
+        try:
+            with numpy.errstate(all='ignore'):
+                if self.__limits == None:
+                    found = least_squares(residuals, self.__parameters, method="lm", x_scale="jac")
+                else:
+                    start = numpy.clip(self.__parameters, *self.__limits)
+                    found = least_squares(residuals, start, bounds=self.__limits, method="trf", x_scale="jac")
+        except ValueError:
+            return 4
+        if not numpy.all(numpy.isfinite(found.x)):
+            return 4
+        self.__parameters = found.x
+        # J^T J for the step sizes of the Hessian
+        try:
+            covariance = numpy.linalg.inv(numpy.dot(found.jac.T, found.jac))
+        except numpy.linalg.LinAlgError:
+            return 4
+        # errors from the Hessian of the chi2, what HESSE gives TH1::Fit. Unlike J^T J it keeps the
+        # second derivatives of the function, TH1::Fit does not scale them with chi2/ndf either.
+        steps = numpy.maximum(numpy.sqrt(numpy.abs(numpy.diag(covariance)))*1e-2, 1e-8*numpy.maximum(numpy.abs(found.x), 1.))
+        try:
+            with numpy.errstate(all='ignore'):
+                covariance = numpy.linalg.inv(_hessian(lambda parameters: (residuals(parameters)**2).sum(), found.x, steps)/2)
+        except numpy.linalg.LinAlgError:
+            return 4
+        self.__parErrors = numpy.sqrt(numpy.abs(numpy.diag(covariance)))
+        self.__chi2 = float((found.fun**2).sum())
+        self.__ndf = int(selected.sum())-4
+        return 0 if found.success else 4
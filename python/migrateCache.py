@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# imports the text metric caches (.DQMCache*) into SQLite caches for [output] cacheBackend = sqlite
+from optparse import OptionParser
+
+def main(argv=None):
+    import sys
+    from src.metricCache import migrateTextCache
+    if argv == None:
+        argv = sys.argv[1:]
+    parser = OptionParser(usage="%prog [options] textCache [textCache ...]")
+    parser.add_option("-o", "--output", dest="output", default=None,
+                      help="SQLite file to write (default is <textCache>.sqlite, only with a single input)")
+    (opts, args) = parser.parse_args(argv)
+    if not args:
+        parser.error("no text cache given")
+    if opts.output != None and len(args) > 1:
+        parser.error("--output needs a single text cache")
+    for textPath in args:
+        sqlitePath = opts.output if opts.output != None else textPath+".sqlite"
+        print("Importing {0} into {1}".format(textPath, sqlitePath))
+        print(".....done! {0} entries".format(migrateTextCache(textPath, sqlitePath)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import time
+import zlib
+
+from src.metricCache import readMetricCache, readLiteral, SQLiteMetricCache
+
+# Backups of a cache live in <backupDir>/<name>/, one file per snapshot named after its time.
+# A snapshot holds only what changed since the previous one: repr((changedEntries, deletedKeys)),
+# zlib compressed and read back like the text cache, NaN and inf included. Every fullEvery snapshots
+# a full one is written, restores and new deltas replay from the last full snapshot only.
+
+TIMEFORMAT = "%Y%m%d-%H%M%S"
+
+def backupName(cachePath):
+    "name of the backup directory of a cache, .DQMCacheCronX -> DQMCacheCronX"
+    return os.path.basename(cachePath.rstrip("/")).lstrip(".")
+
+def parseTime(text):
+    "seconds since the epoch from 'YYYY-mm-dd HH:MM[:SS]', 'YYYY-mm-dd' or a snapshot name"
+    for fmt in (TIMEFORMAT, "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(text, fmt))
+        except ValueError:
+            pass
+    raise ValueError("can not read the time '%s', use YYYY-mm-dd HH:MM" % text)
+
+def listSnapshots(backupDir, name):
+    "(time, isFull, fileName) of the snapshots of a cache, oldest first"
+    directory = os.path.join(backupDir, name)
+    if not os.path.isdir(directory):
+        return []
+    snapshots = []
+    for fileName in os.listdir(directory):
+        parts = fileName.split(".")
+        if len(parts) != 2 or parts[1] not in ("full", "delta"):
+            continue
+        snapshots.append((parseTime(parts[0]), parts[1] == "full", os.path.join(directory, fileName)))
+    return sorted(snapshots)
+
+def _readSnapshot(fileName):
+    snapshotFile = open(fileName, "rb")
+    (changed, deleted) = readLiteral(zlib.decompress(snapshotFile.read()).decode("utf-8"))
+    snapshotFile.close()
+    return (changed, deleted)
+
+def replaySnapshots(backupDir, name, until=None):
+    "state of the cache as of the last snapshot taken at or before until (default: the last one)"
+    snapshots = [s for s in listSnapshots(backupDir, name) if until is None or s[0] <= until]
+    fulls = [i for i, s in enumerate(snapshots) if s[1]]
+    rows = {}
+    if not fulls:
+        return rows
+    for (when, isFull, fileName) in snapshots[fulls[-1]:]:
+        (changed, deleted) = _readSnapshot(fileName)
+        for key in deleted:
+            rows.pop(key, None)
+        rows.update(changed)
+    return rows
+
+def takeSnapshot(cachePath, backupDir, fullEvery=30):
+    """stores the changes of a cache since its previous snapshot, returns (fileName, changed, deleted).
+    fileName is None when nothing changed."""
+    name = backupName(cachePath)
+    current = readMetricCache(cachePath)
+    snapshots = listSnapshots(backupDir, name)
+    fulls = [i for i, s in enumerate(snapshots) if s[1]]
+    isFull = not fulls or len(snapshots)-fulls[-1] >= fullEvery
+    if isFull:
+        changed, deleted = current, []
+    else:
+        previous = replaySnapshots(backupDir, name)
+        # compared as text, a NaN result is not equal to itself
+        changed = dict((key, value) for key, value in current.items() if repr(previous.get(key)) != repr(value))
+        deleted = [key for key in previous if key not in current]
+        if not changed and not deleted:
+            return (None, 0, 0)
+    directory = os.path.join(backupDir, name)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    stamp = time.time()
+    if snapshots and stamp < snapshots[-1][0]+1:
+        # one snapshot per second at most, the names have to sort
+        time.sleep(snapshots[-1][0]+1-stamp)
+        stamp = time.time()
+    fileName = os.path.join(directory, "%s.%s" % (time.strftime(TIMEFORMAT, time.localtime(stamp)), "full" if isFull else "delta"))
+    tmpName = "%s.%d.tmp" % (fileName, os.getpid())
+    snapshotFile = open(tmpName, "wb")
+    snapshotFile.write(zlib.compress(repr((changed, deleted)).encode("utf-8"), 9))
+    snapshotFile.flush()
+    os.fsync(snapshotFile.fileno())
+    snapshotFile.close()
+    os.rename(tmpName, fileName)
+    return (fileName, len(changed), len(deleted))
+
+def restoreSnapshot(backupDir, name, outputPath, until=None, backend="text"):
+    "writes the state of a cache as of until into a new cache file, returns the number of entries"
+    rows = replaySnapshots(backupDir, name, until)
+    if backend == "sqlite":
+        target = SQLiteMetricCache(outputPath)
+        target.update(rows)
+        target.close()
+    elif backend == "text":
+        tmpPath = "%s.%d.tmp" % (outputPath, os.getpid())
+        cacheFile = open(tmpPath, "w")
+        cacheFile.write(str(rows))
+        cacheFile.close()
+        os.rename(tmpPath, outputPath)
+    else:
+        raise ValueError("unknown cache backend '%s', use text or sqlite" % backend)
+    return len(rows)
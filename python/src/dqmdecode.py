@@ -0,0 +1,60 @@
+import json
+import re
+
+# The DQM GUI writes non finite numbers as bare nan/inf tokens, which are not valid json.
+# They are rewritten to the json constants only in value position. A string is matched as a whole
+# by the first alternative and put back as it is, so a "nan, inf" inside one is never looked at.
+_NONFINITE = re.compile(r'"(?:[^"\\]|\\.)*"|([:,\[]\s*)(-?)(nan|inf)(?=\s*[,\]\}])')
+_SEPARATORS = re.compile(r'[\s,]*')
+
+def _constant(name):
+    # nan used to be replaced by 0 before eval, keep doing so
+    if name == 'NaN':
+        return 0
+    return float(name.replace('Infinity', 'inf'))
+
+def _nonfinite(match):
+    if match.group(1) is None:
+        return match.group(0)
+    # json has -Infinity but no -NaN
+    if match.group(3) == 'nan':
+        return match.group(1) + 'NaN'
+    return match.group(1) + match.group(2) + 'Infinity'
+
+_decoder = json.JSONDecoder(parse_constant=_constant)
+
+def _text(body):
+    if not isinstance(body, str):
+        body = body.decode('utf-8')
+    if 'nan' in body or 'inf' in body:
+        body = _NONFINITE.sub(_nonfinite, body)
+    return body
+
+def dqm_decode(body):
+    "decodes a full DQM GUI json response"
+    return _decoder.decode(_text(body))
+
+def dqm_decode_contents(body, names=None):
+    """yields the items of the 'contents' list of a DQM GUI json response one by one.
+    If names is given only the items whose 'obj' is in names are returned, and decoding
+    stops as soon as all of them have been found."""
+    text = _text(body)
+    wanted = None if names is None else set(names)
+    start = text.find('"contents"')
+    start = text.find('[', start) if start >= 0 else -1
+    if start < 0:
+        for item in _decoder.decode(text).get('contents', []):
+            if wanted is None or item.get('obj') in wanted:
+                yield item
+        return
+    idx = _SEPARATORS.match(text, start+1).end()
+    while idx < len(text) and text[idx] != ']':
+        item, idx = _decoder.raw_decode(text, idx)
+        idx = _SEPARATORS.match(text, idx).end()
+        if wanted is None:
+            yield item
+        elif item.get('obj') in wanted:
+            wanted.discard(item['obj'])
+            yield item
+            if not wanted:
+                return
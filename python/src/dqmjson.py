@@ -3,6 +3,12 @@
 import ROOT
 from ROOT import TBufferFile, TH1F, TProfile, TProfile2D, TH2F, TFile, TH1D, TH2D
 import re
+import numpy
+import socket
+from binascii import unhexlify
+import threading
+import time
+import atexit
 import getpass
 import platform
 user = getpass.getuser()
@@ -11,50 +17,194 @@ if node.startswith("vocms061") and user.startswith("cctrack"):
     from src.x509auth import * #use cctrack certificate if working on vocms061
 else:
     from src.x509auth_lxplus import * #use your personal certificate if working elsewhere
+from src.dqmdecode import dqm_decode, dqm_decode_contents
 
 X509CertAuth.ssl_key_file, X509CertAuth.ssl_cert_file = x509_params()
 print(X509CertAuth.ssl_key_file)
 print(X509CertAuth.ssl_cert_file)
 print(x509_params())
 
-def dqm_get_json(server, run, dataset, folder, rootContent=False):
+try:
+    from urllib.parse import urlsplit
+    from http.client import HTTPException
+except ImportError:
+    from urlparse import urlsplit
+    from httplib import HTTPException
+
+class DQMRequestError(IOError):
+    def __init__(self, url, code, reason=""):
+        IOError.__init__(self, "HTTP Error %s: %s (%s)" % (code, reason, url))
+        self.url = url
+        self.code = code
+
+class DQMClient:
+    "pool of keep-alive X509 authenticated connections, shared by all the dqm_* functions"
+    def __init__(self, poolSize=4, maxRedirects=5):
+        self.__lock = threading.Lock()
+        self.__idle = {}
+        self.__maxRedirects = maxRedirects
+        self.setPoolSize(poolSize)
+
+    def setPoolSize(self, poolSize):
+        self.__poolSize = max(1, int(poolSize))
+        self.__slots = threading.BoundedSemaphore(self.__poolSize)
+
+    def getPoolSize(self):
+        return self.__poolSize
+
+    def get(self, url):
+        return self.request(url, "GET")[1]
+
+    def request(self, url, method="GET"):
+        for redirect in range(self.__maxRedirects+1):
+            status, reason, headers, body = self.__send(url, method)
+            location = headers.get('location')
+            if status in (301, 302, 303, 307, 308) and location:
+                if location.startswith('/'):
+                    parts = urlsplit(url)
+                    location = "%s://%s%s" % (parts.scheme, parts.netloc, location)
+                url = location
+                continue
+            if status >= 400:
+                raise DQMRequestError(url, status, reason)
+            return status, body
+        raise DQMRequestError(url, status, "too many redirects")
+
+    def close(self):
+        with self.__lock:
+            for conns in self.__idle.values():
+                for conn in conns:
+                    conn.close()
+            self.__idle = {}
+
+    def __send(self, url, method):
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        self.__slots.acquire()
+        try:
+            conn = self.__checkout(parts.netloc)
+            try:
+                response = self.__roundTrip(conn, method, path)
+            except (socket.error, HTTPException):
+                # the server dropped an idle keep-alive connection, retry once on a fresh one
+                conn.close()
+                conn = X509CertAuth(parts.netloc)
+                response = self.__roundTrip(conn, method, path)
+            body = response.read()
+            headers = dict((k.lower(), v) for k, v in response.getheaders())
+            if response.will_close:
+                conn.close()
+            else:
+                self.__checkin(parts.netloc, conn)
+            return response.status, response.reason, headers, body
+        finally:
+            self.__slots.release()
+
+    def __roundTrip(self, conn, method, path):
+        conn.request(method, path, headers={'User-agent': ident})
+        return conn.getresponse()
+
+    def __checkout(self, host):
+        with self.__lock:
+            conns = self.__idle.get(host, [])
+            if conns:
+                return conns.pop()
+        return X509CertAuth(host)
+
+    def __checkin(self, host, conn):
+        with self.__lock:
+            conns = self.__idle.setdefault(host, [])
+            if len(conns) < self.__poolSize:
+                conns.append(conn)
+                return
+        conn.close()
+
+_client = DQMClient()
+
+def dqm_client():
+    return _client
+
+def dqm_set_pool_size(poolSize):
+    _client.setPoolSize(poolSize)
+
+# Responses of runs flagged as complete do not change any more and can be kept on disk
+_payloadCache = None
+_completeRuns = set()
+
+def dqm_set_payload_cache(path, maxSize=2*1024**3):
+    global _payloadCache
+    from src.payloadCache import PayloadCache
+    _payloadCache = PayloadCache(path, maxSize) if path else None
+
+def dqm_set_run_complete(server, run, dataset):
+    _completeRuns.add((server, str(run), dataset))
+
+def dqm_get_payload(server, run, dataset, what, rootContent, url):
+    "returns the response for url, from the payload cache if the run is complete and was fetched before"
+    key = (server, run, dataset, what, bool(rootContent))
+    if _payloadCache is not None:
+        body = _payloadCache.get(key)
+        if body is not None:
+            return body
+    body = dqm_client().get(url)
+    if _payloadCache is not None and (server, str(run), dataset) in _completeRuns:
+        _payloadCache.put(key, body)
+    return body
+
+def dqm_read_rootobj(item):
+    a = array('B', unhexlify(item['rootobj']))
+    t = TBufferFile(TBufferFile.kRead, len(a), a, False)
+    rootType = item['properties']['type']
+    if rootType == 'TPROF': rootType = 'TProfile'
+    if rootType == 'TPROF2D': rootType = 'TProfile'
+    return t.ReadObject(eval(rootType+'.Class()'))
+
+class DQMFolderItem(dict):
+    """item of a folder listing that keeps the hex payload and only builds the ROOT object
+    when item['rootobj'] is first read"""
+    def __init__(self, item):
+        dict.__init__(self, item)
+        self.__built = 'rootobj' not in item
+
+    def __getitem__(self, key):
+        if key == 'rootobj' and not self.__built:
+            raw = {'rootobj': dict.__getitem__(self, 'rootobj'), 'properties': dict.__getitem__(self, 'properties')}
+            dict.__setitem__(self, 'rootobj', dqm_read_rootobj(raw))
+            self.__built = True
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def isBuilt(self):
+        return self.__built
+
+def dqm_get_json(server, run, dataset, folder, rootContent=False, names=None):
+    # With rootContent the ROOT objects are built lazily, see DQMFolderItem. names restricts
+    # the result to the given objects, the rest of the folder is not even decoded.
     postfix = "?rootcontent=1" if rootContent else ""
-    datareq = urllib.request.Request(('%s/data/json/archive/%s/%s/%s%s') % (server, run, dataset, folder, postfix))
-    datareq.add_header('User-agent', ident)
     # Get data
-    data = eval(re.sub(r"\bnan\b", "0", urllib.request.build_opener(X509CertOpen()).open(datareq).read()),
-               { "__builtins__": None }, {})
+    url = ('%s/data/json/archive/%s/%s/%s%s') % (server, run, dataset, folder, postfix)
+    body = dqm_get_payload(server, run, dataset, folder, rootContent, url)
+    contents = list(dqm_decode_contents(body, names))
+    if names is None:
+        contents = contents[1:]
+    if folder == "Info/ProvInfo" and _payloadCache is not None and (server, str(run), dataset) not in _completeRuns:
+        # the ProvInfo of a run is only stored once it is complete, finding it in the cache
+        # therefore means the whole run can be served from disk
+        for item in contents:
+            if item.get('obj') == 'runIsComplete' and str(item.get('value')).strip() == '1':
+                dqm_set_run_complete(server, run, dataset)
+                _payloadCache.put((server, run, dataset, folder, bool(rootContent)), body)
     if rootContent:
-        # Now convert into real ROOT histograms   
-        #print("Now convert into real ROOT histograms 1"  )
-        for idx,item in enumerate(data['contents']):
-            #print("Now convert into real ROOT histograms 2")  
-            if 'obj' in item.keys():
-               #print("Now convert into real ROOT histograms 3"  )
-               if 'rootobj' in item.keys(): 
-                    #print "Now convert into real ROOT histograms 4"  )
-                    a = array('B')
-                    #print "Now convert into real ROOT histograms 5"  )
-                    a.fromstring(item['rootobj'].decode('hex'))
-                    #print("Now convert into real ROOT histograms 6"  )
-                    t = TBufferFile(TBufferFile.kRead, len(a), a, False)
-                    #print("Now convert into real ROOT histograms 7"  )
-                    rootType = item['properties']['type']
-                    #print("Now convert into real ROOT histograms 8"  )
-                    if rootType == 'TPROF': rootType = 'TProfile'
-                    #print("Now convert into real ROOT histograms 9"  )
-                    if rootType == 'TPROF2D': rootType = 'TProfile'
-		    #print("Now convert into real ROOT histograms 10")
-                    data['contents'][idx]['rootobj'] = t.ReadObject(eval(rootType+'.Class()'))
-		    #print "Now convert into real ROOT histograms 11"
-    return dict( [ (x['obj'], x) for x in data['contents'][1:] if 'obj' in x] )
+        contents = [DQMFolderItem(x) if 'rootobj' in x else x for x in contents]
+    return dict( [ (x['obj'], x) for x in contents if 'obj' in x] )
 
 def dqm_get_samples(server, match, type="offline_data"):
-    datareq = urllib.request.Request(('%s/data/json/samples?match=%s') % (server, match))
-    datareq.add_header('User-agent', ident)
     # Get data
-    data = eval(re.sub(r"\bnan\b", "0", urllib.request.build_opener(X509CertOpen()).open(datareq).read().decode('utf-8')),
-               { "__builtins__": None }, {})
+    data = dqm_decode(dqm_client().get(('%s/data/json/samples?match=%s') % (server, match)))
     ret = []
     for l in data['samples']:
         if l['type'] == type:
@@ -64,50 +214,57 @@ def dqm_get_samples(server, match, type="offline_data"):
 
 def dqm_get_json_hist(server, run, dataset, folder, histoName, rootContent=False):
     postfix = "?rootcontent=1" if rootContent else ""
-    datareq = urllib.request.Request(('%s/data/json/archive/%s/%s/%s%s') % (server, run, dataset, folder, postfix))
-    datareq.add_header('User-agent', ident)
-    # Get data
-    data = eval(re.sub(r"\bnan\b", "0", urllib.request.build_opener(X509CertOpen()).open(datareq).read()),
-               { "__builtins__": None }, {})
+    # Get data, decoding stops at the requested histogram
+    body = dqm_get_payload(server, run, dataset, folder, rootContent, ('%s/data/json/archive/%s/%s/%s%s') % (server, run, dataset, folder, postfix))
     histoOut=None
     if rootContent:
-        # Now convert into real ROOT histograms   
-        #print("Now convert into real ROOT histograms 1"  )
-        for idx,item in enumerate(data['contents']):
-            #print("Now convert into real ROOT histograms 2")  
-            if 'obj' in item.keys():
-               #print("Now convert into real ROOT histograms 3")
-               if item['obj']==histoName:  
-                   if 'rootobj' in item.keys(): 
-                       #print("Now convert into real ROOT histograms 4" )
-                       a = array('B')
-                       #print("Now convert into real ROOT histograms 5"  )
-                       a.fromstring(item['rootobj'].decode('hex'))
-                       #print("Now convert into real ROOT histograms 6"  )
-                       t = TBufferFile(TBufferFile.kRead, len(a), a, False)
-                       #print("Now convert into real ROOT histograms 7"  )
-                       rootType = item['properties']['type']
-                       #print("Now convert into real ROOT histograms 8"  )
-                       if rootType == 'TPROF': rootType = 'TProfile'
-                       #print("Now convert into real ROOT histograms 9"  )
-                       if rootType == 'TPROF2D': rootType = 'TProfile'
-		       #print("Now convert into real ROOT histograms 10")
-                       #data['contents'][idx]['rootobj'] = t.ReadObject(eval(rootType+'.Class()'))
-                       histoOut = t.ReadObject(eval(rootType+'.Class()'))
-		       #print("Now convert into real ROOT histograms 11")
-                
+        # Now convert into real ROOT histograms
+        for item in dqm_decode_contents(body, [histoName]):
+            if 'rootobj' in item.keys():
+                histoOut = dqm_read_rootobj(item)
+
     return histoOut
 
 
-def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False):
+def dqm_get_json_folder(server, run, dataset, folder, names=None, rootContent=True):
+    # Fetch a folder once and keep only the requested objects (all of them if names is None).
+    # With rootContent=False the items are returned undecoded, they can be converted later
+    # with dqm_read_rootobj, e.g. after downloading them on a worker thread.
+    # Get data
+    body = dqm_get_payload(server, run, dataset, folder, True, ('%s/data/json/archive/%s/%s/%s?rootcontent=1') % (server, run, dataset, folder))
+    histos = {}
+    for item in dqm_decode_contents(body, names):
+        if 'obj' in item.keys() and 'rootobj' in item.keys():
+            histos[item['obj']] = dqm_read_rootobj(item) if rootContent else item
+    return histos
+
+
+_binEntriesDeclared = False
+
+def _setBinEntries(profile, entries):
+    "sets the entries of all cells of a TProfile2D from an array, in one call instead of one per bin"
+    global _binEntriesDeclared
+    if not _binEntriesDeclared:
+        # fBinEntries is protected, the loop runs in C++
+        ROOT.gInterpreter.Declare("""
+            void dqmjsonSetBinEntries(TProfile2D *profile, const double *entries) {
+                for (Int_t bin = 0; bin < profile->GetNcells(); ++bin)
+                    profile->SetBinEntries(bin, entries[bin]);
+            }""")
+        _binEntriesDeclared = True
+    ROOT.dqmjsonSetBinEntries(profile, numpy.ascontiguousarray(entries, dtype=numpy.float64))
+
+def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False, numpyHisto=False):
     postfix = "?rootcontent=1" if rootContent else ""
-    datareq = urllib.request.Request(('%s/jsonfairy/archive/%s/%s/%s%s') % (server, run, dataset, hist, postfix))
-    datareq.add_header('User-agent', ident)
     # Get data
-    data = eval(re.sub(r"\bnan\b", "0", urllib.request.build_opener(X509CertOpen()).open(datareq).read()),
-               { "__builtins__": None }, {})
+    data = dqm_decode(dqm_get_payload(server, run, dataset, "jsonfairy/"+hist, rootContent, ('%s/jsonfairy/archive/%s/%s/%s%s') % (server, run, dataset, hist, postfix)))
     histo = data['hist']
-    # Now convert into real ROOT histogram object
+    if numpyHisto:
+        # ROOT free histogram for the metrics that do not fit
+        from metrics.histo import NumpyHisto
+        return NumpyHisto.fromJSON(histo)
+    # Now convert into real ROOT histogram object. The bin contents are handed to ROOT as
+    # whole arrays including under- and overflow, cell index is x + (nbinsx+2)*y
     if 'TH1' in histo['type']:
         # The following assumes a TH1F object
         contents = histo['bins']['content']
@@ -115,9 +272,11 @@ def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False):
         xmin = histo['xaxis']['first']['value']
         xmax = histo['xaxis']['last']['value']
         roothist = TH1F(histo['stats']['name'],histo['title'],nbins,xmin,xmax)
-        for xx in range(1,nbins+1):
-            roothist.SetBinContent(xx, contents[xx-1])
-            roothist.SetBinError(xx, histo['bins']['error'][xx-1])
+        cells = numpy.zeros(nbins+2)
+        cells[1:nbins+1] = contents
+        roothist.SetContent(cells)
+        cells[1:nbins+1] = histo['bins']['error']
+        roothist.SetError(cells)
         roothist.SetEntries(histo['stats']['entries']) 
         stats=array('d')
         stats.append(histo['stats']['entries'])
@@ -132,14 +291,12 @@ def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False):
         xmax = histo['xaxis']['last']['value']
         roothist = TProfile(histo['stats']['name'],histo['title'],nbins,xmin,xmax)
         roothist.SetErrorOption("g")
-        for xx in range(0,nbins):
-            if(histo['bins']['error'][xx]!=0):
-                ww=1./(histo['bins']['error'][xx]*histo['bins']['error'][xx])
-            else:
-                ww=0.
-            roothist.Fill(xmin+(2*xx+1)*((xmax-xmin)/(nbins*2.0)), contents[xx],ww)
-#            roothist.SetBinContent(xx, contents[xx-1])
-#            roothist.SetBinError(xx, histo['bins']['error'][xx-1])
+        # one weighted fill per bin centre, the weight is 1/error^2 (0 for bins without error)
+        errors = numpy.asarray(histo['bins']['error'], dtype=numpy.float64)
+        weights = numpy.zeros(nbins)
+        numpy.divide(1., errors*errors, out=weights, where=errors!=0)
+        centres = xmin+(2*numpy.arange(nbins)+1)*((xmax-xmin)/(nbins*2.0))
+        roothist.FillN(nbins, centres, numpy.asarray(contents, dtype=numpy.float64), weights)
         roothist.SetEntries(histo['stats']['entries']) 
         stats=array('d')
         for i in range(0,6):
@@ -159,10 +316,10 @@ def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False):
         ymin = histo['yaxis']['first']['value']
         ymax = histo['yaxis']['last']['value']
         roothist = TH2F(histo['stats']['name'],histo['title'],nbinsx,xmin,xmax,nbinsy,ymin,ymax)
-        for xx in range(1,nbinsx+1):
-            for yy in range(1,nbinsy+1):
-                roothist.SetBinContent(xx,yy, contents[yy-1][xx-1])
-        roothist.SetEntries(histo['stats']['entries']) 
+        cells = numpy.zeros((nbinsy+2, nbinsx+2))
+        cells[1:nbinsy+1, 1:nbinsx+1] = contents
+        roothist.SetContent(cells.ravel())
+        roothist.SetEntries(histo['stats']['entries'])
         stats=array('d')
         stats.append(histo['stats']['entries'])
         stats.append(histo['stats']['entries'])
@@ -181,52 +338,164 @@ def dqm_getSingleHist_json(server, run, dataset, hist, rootContent=False):
         ymin = histo['yaxis']['first']['value']
         ymax = histo['yaxis']['last']['value']
         roothist = TProfile2D(histo['stats']['name'],histo['title'],nbinsx,xmin,xmax,nbinsy,ymin,ymax)
-        for xx in range(0,nbinsx):
-            for yy in range(0,nbinsy):
-                roothist.Fill(xmin+(2*xx+1)*((xmax-xmin)/(nbinsx*2.0)),ymin+(2*yy+1)*((ymax-ymin)/(nbinsy*2.0)),0,1)
-        for xx in range(1,nbinsx+1):
-            for yy in range(1,nbinsy+1):
-                roothist.SetBinContent(xx,yy, contents[yy-1][xx-1])
-                roothist.SetEntries(histo['stats']['entries']) 
+        # what a Fill(x,y,0,1) at every bin centre followed by SetBinContent leaves behind: one entry
+        # per bin, the bin means from SetContent, the sums of the fills as stats and the sum of the
+        # contents as sum of weights times z (GetMean(3)); the fills were at z=0, sum of z^2 stays 0
+        xcentres = xmin+(2*numpy.arange(nbinsx)+1)*((xmax-xmin)/(nbinsx*2.0))
+        ycentres = ymin+(2*numpy.arange(nbinsy)+1)*((ymax-ymin)/(nbinsy*2.0))
+        cells = numpy.zeros((nbinsy+2, nbinsx+2))
+        cells[1:nbinsy+1, 1:nbinsx+1] = 1.
+        _setBinEntries(roothist, cells.ravel())
+        cells[1:nbinsy+1, 1:nbinsx+1] = contents
+        roothist.SetContent(cells.ravel())
+        stats = numpy.zeros(9)
+        stats[0] = stats[1] = nbinsx*nbinsy
+        stats[2] = nbinsy*xcentres.sum()
+        stats[3] = nbinsy*(xcentres*xcentres).sum()
+        stats[4] = nbinsx*ycentres.sum()
+        stats[5] = nbinsx*(ycentres*ycentres).sum()
+        stats[6] = xcentres.sum()*ycentres.sum()
+        stats[7] = cells.sum()
+        roothist.PutStats(stats)
+        roothist.SetEntries(histo['stats']['entries']) 
 
     return roothist
 
 
+def _tfileUrl(server, run, dataset,version,epoch,datatier):
+    datainfo=dataset.split('/')
+    runGen=('%.9d' % (run))
+    return ('%s/data/browse/ROOT/OfflineData/%s/%s/%sxx/DQM_V%.4d_R%.9d__%s__%s__%s.root') % (server, epoch,datainfo[1], runGen[0:-2],version, run, datainfo[1], datainfo[2],datatier)
+
+# ROOT files downloaded ahead by dqm_prefetch_TFile, url -> local copy
+_prefetchedFiles = {}
+_prefetchLock = threading.Lock()
+
+def _removePrefetched():
+    import os
+    with _prefetchLock:
+        for path in _prefetchedFiles.values():
+            if os.path.exists(path):
+                os.remove(path)
+        _prefetchedFiles.clear()
+atexit.register(_removePrefetched)
+
+def dqm_prefetch_TFile(server, run, dataset,version,epoch,datatier):
+    """downloads the ROOT file to a temporary file over the connection pool, the next dqm_getTFile
+    of it opens that copy. Safe to call from worker threads, on errors dqm_getTFile reads the server."""
+    import os
+    import tempfile
+    url = _tfileUrl(server, run, dataset,version,epoch,datatier)
+    try:
+        body = dqm_client().get(url)
+    except Exception as msg:
+        print("### prefetch of %s failed: %s" % (url, msg))
+        return
+    (handle, path) = tempfile.mkstemp(prefix="DQM_R%.9d_" % run, suffix=".root")
+    with os.fdopen(handle, "wb") as out:
+        out.write(body)
+    with _prefetchLock:
+        _prefetchedFiles[url] = path
+
 def dqm_getTFile(server, run, dataset,version,epoch,datatier):
+    import os
 
+    url = _tfileUrl(server, run, dataset,version,epoch,datatier)
+    with _prefetchLock:
+        path = _prefetchedFiles.pop(url, None)
+    if path is not None:
+        tfile=TFile.Open(path)
+        # the open file stays readable, the copy goes away with it
+        os.remove(path)
+        if tfile and not tfile.IsZombie():
+            return tfile
 
     ROOT.gEnv.SetValue("Davix.GSI.UserCert",X509CertAuth.ssl_cert_file)
     ROOT.gEnv.SetValue("Davix.GSI.UserKey",X509CertAuth.ssl_key_file)
 
-    datainfo=dataset.split('/')
-    runGen=('%.9d' % (run))
-
-    tfile=TFile.Open(('%s/data/browse/ROOT/OfflineData/%s/%s/%sxx/DQM_V%.4d_R%.9d__%s__%s__%s.root') % (server, epoch,datainfo[1], runGen[0:-2],version, run, datainfo[1], datainfo[2],datatier))
+    tfile=TFile.Open(url)
     #print(tfile)
     
     return tfile
 
 
+# last version found per (server, dataset, datatier), the next run starts probing there
+_lastVersions = {}
+_maxVersion = 29
+
+_probeWorkers = 4
+_probePool = None
+_probePoolLock = threading.Lock()
+
+def _probe(url):
+    "True if url exists, False if the server says 404, the error otherwise"
+    try:
+        dqm_client().request(url, "HEAD")
+        return True
+    except DQMRequestError as msg:
+        return False if msg.code == 404 else msg
+    except Exception as msg:
+        return msg
+
+def _probeVersions(urls):
+    "HEAD requests on a few threads shared by all runs, returns {version: True/False/error}"
+    global _probePool
+    with _probePoolLock:
+        if _probePool is None:
+            from multiprocessing.pool import ThreadPool
+            _probePool = ThreadPool(_probeWorkers)
+    versions = sorted(urls)
+    return dict(zip(versions, _probePool.map(_probe, [urls[i] for i in versions])))
+
 def dqm_getTFile_Version(server, run, dataset,datatier):
 
     datainfo=dataset.split('/')
     runGen=('%.9d' % (run))
-    vers=0
-    for i in range(1,30):
-        urlpath=(('%s/data/browse/ROOT/OfflineData/%s/%s/%sxx/DQM_V%.4d_R%.9d__%s__%s__%s.root') % (server, datainfo[2][0:7],datainfo[1], runGen[0:-2],i, run, datainfo[1], datainfo[2],datatier))
-#        print(urlpath)
-        try:
-            urllib.request.build_opener(X509CertOpen()).open(urlpath)
-            vers=i
-#            print("Version ",vers," Exists!")
-            break
-        except urllib2.HTTPError:
- #           print('Version ',i,' not found')
-            continue
-
+    blockpath=(('%s/data/browse/ROOT/OfflineData/%s/%s/%sxx/') % (server, datainfo[2][0:7],datainfo[1], runGen[0:-2]))
+    def url(i):
+        return blockpath+(('DQM_V%.4d_R%.9d__%s__%s__%s.root') % (i, run, datainfo[1], datainfo[2],datatier))
+    # The latest version may sit above any gap, so every version from the last one seen for this
+    # dataset up to _maxVersion is probed. Those below it only if none of them exists.
+    dsKey = (server, dataset, datatier)
+    start = _lastVersions.get(dsKey, 1)
+    found = _probeVersions(dict((i, url(i)) for i in range(start, _maxVersion+1)))
+    if not [i for i in found if found[i] is True]:
+        found.update(_probeVersions(dict((i, url(i)) for i in range(1, start))))
+    if [i for i in found if found[i] not in (True, False)]:
+        # the server refused the HEAD requests, use the directory index instead
+        versions = dqm_get_listing(blockpath, refresh=True).get((int(run), datainfo[1], datainfo[2], datatier), [])
+        found = dict((i, True) for i in versions)
+    vers = max([0]+[i for i in found if found[i] is True])
+    if vers:
+        _lastVersions[dsKey] = vers
     return vers
 
-def dqm_getTFile_Version2(server, run, dataset,epoch,datatier):
+# Directory listings of the OfflineData run blocks, parsed into (run, PD, processing, tier) -> versions
+_ROOTFILE = re.compile(r'DQM_V([0-9]+)_R([0-9]+)__(.+?)__(.+?)__([^_/"<>]+?)\.root')
+_listings = {}
+_listingLock = threading.Lock()
+_listingTTL = 600.
+
+def dqm_set_listing_ttl(seconds):
+    "listings older than this are downloaded again when a run is not found in them"
+    global _listingTTL
+    _listingTTL = seconds
+
+def dqm_get_listing(urlpath, refresh=False):
+    with _listingLock:
+        listing = _listings.get(urlpath)
+        if listing is not None and not (refresh and time.time()-listing[0] > _listingTTL):
+            return listing[1]
+        files = {}
+        for match in _ROOTFILE.finditer(dqm_client().get(urlpath).decode('utf-8')):
+            version, run, pd, processing, tier = match.groups()
+            versions = files.setdefault((int(run), pd, processing, tier), [])
+            if int(version) not in versions:
+                versions.append(int(version))
+        _listings[urlpath] = (time.time(), files)
+        return files
+
+def dqm_getTFile_Version2(server, run, dataset,epoch,datatier,refresh=True):
 
     datainfo=dataset.split('/')
     runGen=('%.9d' % (run))
@@ -234,13 +503,10 @@ def dqm_getTFile_Version2(server, run, dataset,epoch,datatier):
     urlpath=(('%s/data/browse/ROOT/OfflineData/%s/%s/%sxx/') % (server, epoch,datainfo[1], runGen[0:-2]))
 #    print(datainfo[2])
 #    print(urlpath)
-    vers=0
-
-    data = urllib.request.build_opener(X509CertOpen()).open(urlpath)
-    string = data.read().decode('utf-8')
-    match = re.search((('[0-9]+(?=_R%.9d__%s__%s__%s.root)')%(run, datainfo[1], datainfo[2],datatier)),string)
-    if match is None:
-        vers=0
-    else:
-        vers=int(match.group(0))
-    return vers
+    key = (int(run), datainfo[1], datainfo[2], datatier)
+    versions = dqm_get_listing(urlpath).get(key)
+    if versions is None:
+        # the run may have been added since the listing was read
+        versions = dqm_get_listing(urlpath, refresh=refresh).get(key, [0])
+    # first entry of the listing, as with the former regex search
+    return versions[0]
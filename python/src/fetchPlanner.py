@@ -0,0 +1,75 @@
+from os.path import split as splitPath
+from src.dqmjson import dqm_get_json_folder, dqm_read_rootobj
+from metrics.histo import NumpyHisto
+
+def splitHistoPath(path):
+    if(path[0]=='/'):
+        path=path.replace('/','',1)
+    return splitPath(path)
+
+
+class FetchPlanner:
+    """collects the histograms needed by all plots of a run and downloads every DQM GUI folder only once.
+    fetch() only does network and json decoding, so it can run on a worker thread; the ROOT objects are
+    built by get() on the thread that uses them."""
+    def __init__(self):
+        self.__wanted = {}
+        self.__folders = {}
+        self.__histos = {}
+        self.__numpyHistos = {}
+
+    def add(self, server, run, dataset, path):
+        # alternatives "folder/name1,name2" are looked up in the folder of the whole path, as getHistoFromDQM does
+        folder = splitHistoPath(path)[0]
+        for alternative in path.split(","):
+            self.__wanted.setdefault((server, run, dataset, folder), set()).add(splitPath(alternative)[1])
+
+    def addPaths(self, server, run, dataset, paths):
+        for path in paths:
+            self.add(server, run, dataset, path)
+
+    def folders(self):
+        return sorted(self.__wanted.keys())
+
+    def fetch(self):
+        for key in self.folders():
+            if key not in self.__folders:
+                self.__fetch(key)
+
+    def get(self, server, run, dataset, path, numpyHisto=False):
+        """returns a private copy of the histogram, metrics are free to rebin or fit it.
+        With numpyHisto a NumpyHisto is returned instead, it is shared by all callers and must not be modified."""
+        folder, name = splitHistoPath(path)
+        key = (server, run, dataset, folder)
+        if key not in self.__folders or name not in self.__wanted.get(key, ()):
+            self.add(server, run, dataset, path)
+            self.__fetch(key)
+        content = self.__folders[key]
+        if isinstance(content, Exception):
+            raise content
+        if name not in content:
+            return None
+        if (key, name) not in self.__histos:
+            self.__histos[(key, name)] = dqm_read_rootobj(content[name])
+        if numpyHisto:
+            if (key, name) not in self.__numpyHistos:
+                self.__numpyHistos[(key, name)] = NumpyHisto.fromROOT(self.__histos[(key, name)])
+            return self.__numpyHistos[(key, name)]
+        histo = self.__histos[(key, name)].Clone()
+        if hasattr(histo, "SetDirectory"):
+            histo.SetDirectory(0)
+        return histo
+
+    def clear(self):
+        self.__wanted = {}
+        self.__folders = {}
+        self.__histos = {}
+        self.__numpyHistos = {}
+
+    def __fetch(self, key):
+        server, run, dataset, folder = key
+        print("-> Fetching folder {0} ({1} histograms) for run {2}".format(folder, len(self.__wanted[key]), run))
+        try:
+            self.__folders[key] = dqm_get_json_folder(server, run, dataset, folder, self.__wanted[key], rootContent=False)
+        except Exception as msg:
+            self.__folders[key] = msg
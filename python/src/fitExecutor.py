@@ -0,0 +1,49 @@
+import multiprocessing
+import pickle
+
+def _initWorker(kernels):
+    try:
+        import ROOT
+    except ImportError:
+        # only fits without ROOT, e.g. fits.NumpyLanGau
+        return
+    from metrics.kernels import loadKernel
+    ROOT.gROOT.SetBatch(True)
+    for name in kernels:
+        loadKernel(name)
+
+def _evaluate(snapshot):
+    (metric, histo, startParameters) = pickle.loads(snapshot)
+    metric.setStartParameters(startParameters)
+    return (metric.evaluate(histo), metric.getWorkerState())
+
+class FitExecutor:
+    """evaluates the fits (metrics with useFitWorkers) on a pool of worker processes with ROOT and the
+    fit kernels loaded. The histogram goes over as its bin arrays (a NumpyHisto) and is turned back
+    into a ROOT histogram in the worker if the metric needs ROOT, the metric goes without its cache.
+    Metric, histogram and start parameters are pickled by submit, the caller may set the metric up for
+    the next run right away. submit returns at once, the get() of the returned job waits for
+    ((result, entries), metric.getWorkerState())."""
+    def __init__(self, workers, kernels=None):
+        from metrics.kernels import loadedKernels
+        if kernels == None:
+            # those loaded so far, the fits load the others on their first call in each worker
+            kernels = loadedKernels()
+        self.__workers = workers
+        self.__pool = multiprocessing.Pool(workers, _initWorker, (kernels,))
+
+    def getWorkers(self):
+        return self.__workers
+
+    def submit(self, metric, histo, startParameters=None):
+        "startParameters: what the metric starts from on the worker, see BaseMetric.getStartParameters"
+        from metrics.histo import NumpyHisto
+        if not isinstance(histo, NumpyHisto):
+            histo = NumpyHisto.fromROOT(histo)
+        # the pool pickles its tasks later in a thread of its own, the metric is not ours by then
+        snapshot = pickle.dumps((metric, histo, startParameters), pickle.HIGHEST_PROTOCOL)
+        return self.__pool.apply_async(_evaluate, (snapshot,))
+
+    def close(self):
+        self.__pool.close()
+        self.__pool.join()
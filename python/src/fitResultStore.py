@@ -0,0 +1,34 @@
+import pickle
+
+from src.payloadCache import PayloadCache
+
+class FitResultStore:
+    """results of the fits addressed by (metric, run, hash of the input histograms), whatever server,
+    dataset or file version the input came from. The same histogram reached through another dataset
+    (Express and Prompt copies of a run) or fetched again is not fitted a second time. Kept on disk,
+    size bounded like the payload cache, with the results of this job in memory as well."""
+    def __init__(self, path, maxSize=64*1024**2):
+        self.__payloads = PayloadCache(path, maxSize)
+        self.__results = {}
+
+    def getPath(self):
+        return self.__payloads.getPath()
+
+    def get(self, metric, run, contentHash):
+        "(result, entries) or None"
+        key = (metric, run, contentHash)
+        if key not in self.__results:
+            body = self.__payloads.get(key)
+            if body is None:
+                return None
+            try:
+                self.__results[key] = pickle.loads(body)
+            except Exception:
+                # written by another python version
+                return None
+        return self.__results[key]
+
+    def put(self, metric, run, contentHash, value):
+        key = (metric, run, contentHash)
+        self.__results[key] = value
+        self.__payloads.put(key, pickle.dumps(value, 2))
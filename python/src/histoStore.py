@@ -0,0 +1,30 @@
+import pickle
+
+from src.payloadCache import PayloadCache
+
+class HistoStore:
+    """input histograms of the metrics that do not need ROOT, kept on disk as NumpyHisto and addressed by
+    (server, run, dataset, path, file version). After a change of the parameters of such a metric it is
+    evaluated again from here instead of reading the DQM files. Size bounded like the payload cache."""
+    def __init__(self, path, maxSize=2*1024**3):
+        self.__payloads = PayloadCache(path, maxSize)
+
+    def getPath(self):
+        return self.__payloads.getPath()
+
+    def has(self, server, run, dataset, path, version):
+        return self.__payloads.has((server, run, dataset, path, version))
+
+    def get(self, server, run, dataset, path, version):
+        "the stored NumpyHisto or None"
+        body = self.__payloads.get((server, run, dataset, path, version))
+        if body is None:
+            return None
+        try:
+            return pickle.loads(body)
+        except Exception:
+            # written by another python version
+            return None
+
+    def put(self, server, run, dataset, path, version, histo):
+        self.__payloads.put((server, run, dataset, path, version), pickle.dumps(histo, 2))
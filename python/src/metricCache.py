@@ -0,0 +1,501 @@
+import errno
+import os
+import socket
+import threading
+import time
+
+# The metric cache maps (server, run, dataset, relativePath, metricKey) to
+# (result, entries, version, contentHash), where result is (value, error) or (value, (errorLow, errorHigh)),
+# version is the version of the DQM file the input came from and contentHash the hash of the input
+# histograms. Entries written before those were recorded are (result, entries) and count as current.
+# metricKey is BaseMetric.getKey(), the parameters of the metric with the defaults filled in.
+# All backends behave like that dict.
+
+def _unpack(key, value):
+    (server, run, dataset, path, metric) = key
+    (result, entries) = value[:2]
+    (version, contentHash) = (tuple(value[2:4])+(None, None))[:2]
+    error = result[1]
+    if "__iter__" in dir(error):
+        errLow, errHigh, symmetric = error[0], error[1], 0
+    else:
+        errLow, errHigh, symmetric = error, error, 1
+    if version != None:
+        version = int(version)
+    return (server, int(run), dataset, path, metric, float(result[0]), float(errLow), float(errHigh), symmetric, float(entries),
+            version, contentHash)
+
+def _nan(number):
+    "SQLite stores a NaN as NULL, it is a NaN again when read back"
+    return float("nan") if number is None else number
+
+def _pack(row):
+    (value, errLow, errHigh, symmetric, entries, version, contentHash) = row
+    (value, errLow, errHigh, entries) = (_nan(value), _nan(errLow), _nan(errHigh), _nan(entries))
+    return ((value, errLow if symmetric else (errLow, errHigh)), entries, version, contentHash)
+
+def _version(value):
+    return value[2] if len(value) > 2 else None
+
+def isCurrent(entryVersion, version):
+    """False when an entry was computed from another version of the DQM file than version.
+    Entries of unknown version and runs without a file (version 0) can not be checked and count as current."""
+    return entryVersion == None or not version or entryVersion == version
+
+# repr writes NaN and infinite results as nan and inf, names the text cache is read back with
+_LITERALS = {"nan": float("nan"), "inf": float("inf")}
+
+def readLiteral(text):
+    "the python literal of a text cache file, journal line or backup, NaN and inf included"
+    return eval(text, dict(_LITERALS))
+
+def _readJournal(journalPath):
+    "yields the (items, deletedKeys) checkpoints of a text cache journal"
+    journal = open(journalPath, "r")
+    lines = journal.readlines()
+    journal.close()
+    for number, line in enumerate(lines):
+        try:
+            checkpoint = readLiteral(line)
+        except Exception:
+            if number == len(lines)-1:
+                # the job died while writing its last checkpoint
+                break
+            raise ValueError("checkpoint {0} of {1} in {2} can not be read, the journal is left as it is".format(number+1, len(lines), journalPath))
+        yield checkpoint
+
+
+class Checkpointer:
+    "decides when the entries of the finished runs are made durable: every nRuns runs or every seconds"
+    def __init__(self, nRuns=10, seconds=300.):
+        self.__nRuns = nRuns
+        self.__seconds = seconds
+        self.__runs = 0
+        self.__last = time.time()
+
+    def runDone(self):
+        self.__runs += 1
+        return self.__runs >= self.__nRuns or time.time()-self.__last >= self.__seconds
+
+    def reset(self):
+        self.__runs = 0
+        self.__last = time.time()
+
+
+class TextMetricCache(dict):
+    """the original cache file: a python dict literal read at start and rewritten on close.
+    A secondary index (server, run, dataset) -> {(path, metric)} answers the per-run questions.
+    New entries are appended to <path>.journal at every checkpoint, a job that crashes loses at
+    most the runs since the last one. The journal is folded into the cache file on the next start
+    and on close."""
+    def __init__(self, path, checkpointRuns=10, checkpointSeconds=300.):
+        dict.__init__(self)
+        self.__path = path
+        self.__journalPath = path+".journal"
+        self.__index = {}
+        self.__pending = {}
+        self.__deleted = set()
+        self.__checkpointer = Checkpointer(checkpointRuns, checkpointSeconds)
+        if os.path.exists(path):
+            cacheFile = open(path, "r")
+            for key, value in readLiteral(cacheFile.read()).items():
+                self.__insert(key, value)
+            cacheFile.close()
+        if os.path.exists(self.__journalPath):
+            replayed = self.__replay()
+            print("Recovered {0} cache entries from {1}".format(replayed, self.__journalPath))
+            self.compact()
+
+    def getPath(self):
+        return self.__path
+
+    def __insert(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.__index.setdefault(key[:3], set()).add(key[3:])
+
+    def __remove(self, key):
+        dict.__delitem__(self, key)
+        entries = self.__index.get(key[:3], set())
+        entries.discard(key[3:])
+        if not entries:
+            self.__index.pop(key[:3], None)
+
+    def __setitem__(self, key, value):
+        # plain floats only, the file is read back with eval
+        value = _pack(_unpack(key, value)[5:])
+        self.__insert(key, value)
+        self.__pending[key] = value
+        self.__deleted.discard(key)
+
+    def __delitem__(self, key):
+        self.__remove(key)
+        self.__pending.pop(key, None)
+        self.__deleted.add(key)
+
+    def update(self, items):
+        if hasattr(items, "items"):
+            items = items.items()
+        for key, value in items:
+            self[key] = value
+
+    def hasRun(self, server, run, dataset):
+        return (server, run, dataset) in self.__index
+
+    def getRunEntries(self, server, run, dataset):
+        "{(path, metric): version} of everything cached for the run"
+        return dict((entry, _version(dict.__getitem__(self, (server, run, dataset)+entry)))
+                    for entry in self.__index.get((server, run, dataset), ()))
+
+    def getMetrics(self):
+        "all (path, metric) in the cache"
+        return set(key[3:] for key in self)
+
+    def renameMetrics(self, names):
+        """moves the entries of {(path, oldMetric): newMetric} to the new metric, returns their number.
+        Entries that exist under both names keep the new one."""
+        moved = 0
+        for key in [key for key in self if key[3:] in names]:
+            newKey = key[:4]+(names[key[3:]],)
+            if newKey not in self:
+                self[newKey] = dict.__getitem__(self, key)
+                moved += 1
+            del self[key]
+        return moved
+
+    def removeMetrics(self, entries):
+        "drops every entry of the given (path, metric), returns their number"
+        entries = set(entries)
+        keys = [key for key in self if key[3:] in entries]
+        for key in keys:
+            del self[key]
+        return len(keys)
+
+    def __replay(self):
+        count = 0
+        for (items, deleted) in _readJournal(self.__journalPath):
+            for key in deleted:
+                if key in self:
+                    self.__remove(key)
+            for key, value in items:
+                self.__insert(key, value)
+            count += len(items)
+        return count
+
+    def lockRun(self, server, run, dataset):
+        "a text cache belongs to a single job, use the sqlite backend to share a cache"
+        pass
+
+    def unlockRun(self, server, run, dataset):
+        pass
+
+    def flush(self):
+        "called after each run, writes a checkpoint when one is due"
+        if self.__checkpointer.runDone():
+            self.checkpoint()
+
+    def checkpoint(self):
+        if self.__pending or self.__deleted:
+            journal = open(self.__journalPath, "a")
+            journal.write(repr((list(self.__pending.items()), list(self.__deleted)))+"\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+            journal.close()
+            self.__pending = {}
+            self.__deleted = set()
+        self.__checkpointer.reset()
+
+    def compact(self):
+        "rewrites the cache file with everything in memory and drops the journal"
+        tmpPath = "%s.%d.tmp" % (self.__path, os.getpid())
+        cacheFile = open(tmpPath, "w")
+        cacheFile.write(str(dict(self)))
+        cacheFile.flush()
+        os.fsync(cacheFile.fileno())
+        cacheFile.close()
+        os.rename(tmpPath, self.__path)
+        if os.path.exists(self.__journalPath):
+            os.remove(self.__journalPath)
+        self.__pending = {}
+        self.__deleted = set()
+
+    def close(self):
+        self.compact()
+
+
+class SQLiteMetricCache:
+    """metric cache in an indexed SQLite table (WAL journal), meant to be shared by several jobs.
+    The database is opened on first use. The entries of a run are kept in memory and written in one
+    short transaction by flush(), so writers block each other only for milliseconds and every job
+    sees what the others have committed. lockRun() gives a job exclusive use of a run, a second job
+    waits and then finds the results in the cache."""
+    def __init__(self, path, lockTimeout=7200., busyTimeout=60.):
+        self.__path = path
+        self.__db = None
+        self.__lock = threading.RLock()
+        self.__pending = {}
+        self.__lockTimeout = lockTimeout
+        self.__busyTimeout = busyTimeout
+        self.__owner = "%s:%d" % (socket.gethostname(), os.getpid())
+
+    def getPath(self):
+        return self.__path
+
+    def __connect(self):
+        if self.__db is None:
+            import sqlite3
+            # autocommit, the writes use explicit BEGIN IMMEDIATE transactions. The fetch workers
+            # test membership too, access is serialized by the lock
+            self.__db = sqlite3.connect(self.__path, timeout=self.__busyTimeout, check_same_thread=False, isolation_level=None)
+            self.__db.execute("PRAGMA journal_mode=WAL")
+            self.__db.execute("PRAGMA synchronous=NORMAL")
+            self.__db.execute("""CREATE TABLE IF NOT EXISTS metrics (
+                server TEXT, run INTEGER, dataset TEXT, path TEXT, metric TEXT,
+                value REAL, errLow REAL, errHigh REAL, symmetric INTEGER, entries REAL,
+                version INTEGER, contentHash TEXT,
+                PRIMARY KEY (run, dataset, path, metric, server))""")
+            self.__db.execute("BEGIN IMMEDIATE")
+            if "version" not in [row[1] for row in self.__db.execute("PRAGMA table_info(metrics)")]:
+                # written before the file version and the input hash were recorded
+                self.__db.execute("ALTER TABLE metrics ADD COLUMN version INTEGER")
+                self.__db.execute("ALTER TABLE metrics ADD COLUMN contentHash TEXT")
+            self.__db.execute("COMMIT")
+            self.__db.execute("""CREATE TABLE IF NOT EXISTS runLocks (
+                server TEXT, run INTEGER, dataset TEXT, owner TEXT, since REAL,
+                PRIMARY KEY (run, dataset, server))""")
+        return self.__db
+
+    def __execute(self, query, args=()):
+        with self.__lock:
+            return self.__connect().execute(query, args).fetchall()
+
+    def __write(self, query, rows):
+        with self.__lock:
+            db = self.__connect()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.executemany(query, rows)
+            except:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def __where(self, key):
+        (server, run, dataset, path, metric) = key
+        return (int(run), dataset, path, metric, server)
+
+    def __contains__(self, key):
+        if key in self.__pending:
+            return True
+        return len(self.__execute("SELECT 1 FROM metrics WHERE run=? AND dataset=? AND path=? AND metric=? AND server=?",
+                                  self.__where(key))) > 0
+
+    def __getitem__(self, key):
+        if key in self.__pending:
+            return self.__pending[key]
+        rows = self.__execute("SELECT value, errLow, errHigh, symmetric, entries, version, contentHash FROM metrics "
+                              "WHERE run=? AND dataset=? AND path=? AND metric=? AND server=?", self.__where(key))
+        if not rows:
+            raise KeyError(key)
+        return _pack(rows[0])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        with self.__lock:
+            self.__pending[key] = _pack(_unpack(key, value)[5:])
+
+    def update(self, items):
+        if hasattr(items, "items"):
+            items = items.items()
+        self.__write("INSERT OR REPLACE INTO metrics VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                     [_unpack(key, value) for key, value in items])
+
+    def __len__(self):
+        return self.__execute("SELECT COUNT(*) FROM metrics")[0][0]+len(self.__pending)
+
+    def keys(self):
+        return [tuple(row) for row in self.__execute("SELECT server, run, dataset, path, metric FROM metrics")]+list(self.__pending.keys())
+
+    def hasRun(self, server, run, dataset):
+        with self.__lock:
+            for key in self.__pending:
+                if key[:3] == (server, run, dataset):
+                    return True
+        return len(self.__execute("SELECT 1 FROM metrics WHERE run=? AND dataset=? AND server=? LIMIT 1",
+                                  (int(run), dataset, server))) > 0
+
+    def getRunEntries(self, server, run, dataset):
+        "{(path, metric): version} of everything cached for the run"
+        entries = dict((tuple(row[:2]), row[2]) for row in self.__execute("SELECT path, metric, version FROM metrics WHERE run=? AND dataset=? AND server=?",
+                                                                           (int(run), dataset, server)))
+        with self.__lock:
+            entries.update((key[3:], _version(value)) for key, value in self.__pending.items() if key[:3] == (server, run, dataset))
+        return entries
+
+    def getMetrics(self):
+        "all (path, metric) in the cache"
+        self.flush()
+        return set(tuple(row) for row in self.__execute("SELECT DISTINCT path, metric FROM metrics"))
+
+    def renameMetrics(self, names):
+        """moves the entries of {(path, oldMetric): newMetric} to the new metric, returns their number.
+        Entries that exist under both names keep the new one."""
+        self.flush()
+        with self.__lock:
+            db = self.__connect()
+            db.execute("BEGIN IMMEDIATE")
+            moved = 0
+            for (path, oldMetric), newMetric in names.items():
+                moved += db.execute("UPDATE OR IGNORE metrics SET metric=? WHERE path=? AND metric=?", (newMetric, path, oldMetric)).rowcount
+                db.execute("DELETE FROM metrics WHERE path=? AND metric=?", (path, oldMetric))
+            db.execute("COMMIT")
+        return moved
+
+    def removeMetrics(self, entries):
+        "drops every entry of the given (path, metric), returns their number"
+        self.flush()
+        with self.__lock:
+            db = self.__connect()
+            db.execute("BEGIN IMMEDIATE")
+            removed = 0
+            for (path, metric) in entries:
+                removed += db.execute("DELETE FROM metrics WHERE path=? AND metric=?", (path, metric)).rowcount
+            db.execute("COMMIT")
+        return removed
+
+    def getRun(self, run, dataset=None):
+        "all committed entries of one run, optionally of one dataset only"
+        query = "SELECT server, run, dataset, path, metric, value, errLow, errHigh, symmetric, entries, version, contentHash FROM metrics WHERE run=?"
+        args = (int(run),)
+        if dataset is not None:
+            query += " AND dataset=?"
+            args += (dataset,)
+        return dict((tuple(row[:5]), _pack(row[5:])) for row in self.__execute(query, args))
+
+    def getRunRange(self, firstRun, lastRun):
+        "all committed entries with firstRun <= run <= lastRun"
+        rows = self.__execute("SELECT server, run, dataset, path, metric, value, errLow, errHigh, symmetric, entries, version, contentHash "
+                              "FROM metrics WHERE run BETWEEN ? AND ?", (int(firstRun), int(lastRun)))
+        return dict((tuple(row[:5]), _pack(row[5:])) for row in rows)
+
+    def __isStale(self, owner, since):
+        if time.time()-since > self.__lockTimeout:
+            return True
+        host, pid = owner.rsplit(":", 1)
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except OSError as msg:
+            return msg.errno == errno.ESRCH
+        return False
+
+    def lockRun(self, server, run, dataset, poll=5.):
+        "blocks until no other job works on the run. Locks of dead jobs are taken over."
+        waiting = False
+        while True:
+            with self.__lock:
+                db = self.__connect()
+                db.execute("BEGIN IMMEDIATE")
+                rows = db.execute("SELECT owner, since FROM runLocks WHERE run=? AND dataset=? AND server=?",
+                                  (int(run), dataset, server)).fetchall()
+                if not rows or rows[0][0] == self.__owner or self.__isStale(rows[0][0], rows[0][1]):
+                    db.execute("INSERT OR REPLACE INTO runLocks VALUES (?,?,?,?,?)",
+                               (server, int(run), dataset, self.__owner, time.time()))
+                    db.execute("COMMIT")
+                    return
+                db.execute("COMMIT")
+            if not waiting:
+                print("Run {0} is being processed by {1}, waiting".format(run, rows[0][0]))
+                waiting = True
+            time.sleep(poll)
+
+    def unlockRun(self, server, run, dataset):
+        "writes the results of the run and releases it"
+        self.flush()
+        self.__write("DELETE FROM runLocks WHERE run=? AND dataset=? AND server=? AND owner=?",
+                     [(int(run), dataset, server, self.__owner)])
+
+    def flush(self):
+        "called after each run, commits its entries"
+        with self.__lock:
+            if self.__pending:
+                self.__write("INSERT OR REPLACE INTO metrics VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+                             [_unpack(key, value) for key, value in self.__pending.items()])
+                self.__pending = {}
+
+    def checkpoint(self):
+        self.flush()
+
+    def close(self):
+        with self.__lock:
+            self.flush()
+            if self.__db is not None:
+                self.__db.execute("DELETE FROM runLocks WHERE owner=?", (self.__owner,))
+                # fold the WAL back into the database file
+                self.__db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self.__db.close()
+                self.__db = None
+
+
+def openMetricCache(path, backend="text", checkpointRuns=10, checkpointSeconds=300.):
+    if backend == "text":
+        return TextMetricCache(path, checkpointRuns, checkpointSeconds)
+    if backend == "sqlite":
+        # commits after every run, other jobs sharing the file need to see the results
+        return SQLiteMetricCache(path)
+    raise ValueError("unknown cache backend '%s', use text or sqlite" % backend)
+
+def migrateTextCache(textPath, sqlitePath):
+    "imports a text cache into a SQLite cache, returns the number of entries"
+    source = TextMetricCache(textPath)
+    target = SQLiteMetricCache(sqlitePath)
+    target.update(source)
+    target.close()
+    return len(source)
+
+def isSQLiteCache(path):
+    "tells the backend of an existing cache file from its header"
+    try:
+        with open(path, "rb") as cacheFile:
+            return cacheFile.read(16) == b"SQLite format 3\x00"
+    except IOError:
+        return False
+
+def readMetricCache(path):
+    """consistent copy of a cache that may be in use by a running job, as a plain dict.
+    Nothing is written: a text cache is read together with its journal without compacting it,
+    a SQLite cache is read in one transaction so concurrent commits are either all in or all out."""
+    rows = {}
+    if isSQLiteCache(path):
+        import sqlite3
+        db = sqlite3.connect(path, timeout=60., isolation_level=None)
+        db.execute("BEGIN")
+        columns = [row[1] for row in db.execute("PRAGMA table_info(metrics)")]
+        source = "version, contentHash" if "version" in columns else "NULL, NULL"
+        for row in db.execute("SELECT server, run, dataset, path, metric, value, errLow, errHigh, symmetric, entries, %s FROM metrics" % source):
+            rows[tuple(row[:5])] = _pack(row[5:])
+        db.execute("COMMIT")
+        db.close()
+        return rows
+    # compact() renames the new cache file into place before it removes the journal, replaying a
+    # journal that is already folded in changes nothing
+    if os.path.exists(path):
+        cacheFile = open(path, "r")
+        for key, value in readLiteral(cacheFile.read()).items():
+            rows[key] = _pack(_unpack(key, value)[5:])
+        cacheFile.close()
+    try:
+        for (items, deleted) in _readJournal(path+".journal"):
+            for key in deleted:
+                rows.pop(key, None)
+            for key, value in items:
+                rows[key] = _pack(_unpack(key, value)[5:])
+    except IOError:
+        # no journal, or it was folded in after the cache file was read
+        pass
+    return rows
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+import zlib
+from hashlib import sha1
+
+class PayloadCache:
+    """size bounded on-disk cache of raw DQM GUI responses. Entries are addressed by a hash of
+    their key and the least recently used ones are removed once maxSize bytes are exceeded."""
+    def __init__(self, path, maxSize=2*1024**3):
+        self.__path = path
+        self.__maxSize = maxSize
+        self.__lock = threading.Lock()
+        self.__entries = None
+        self.__size = 0
+
+    def getPath(self):
+        return self.__path
+
+    def get(self, key):
+        "returns the cached response for key or None"
+        fileName = self.__fileName(key)
+        with self.__lock:
+            self.__scan()
+            if fileName not in self.__entries:
+                return None
+            try:
+                body = open(fileName, "rb").read()
+                os.utime(fileName, None)
+            except (IOError, OSError):
+                self.__drop(fileName)
+                return None
+            self.__entries[fileName] = (time.time(), self.__entries[fileName][1])
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            with self.__lock:
+                self.__remove(fileName)
+            return None
+
+    def has(self, key):
+        with self.__lock:
+            self.__scan()
+            return self.__fileName(key) in self.__entries
+
+    def put(self, key, body):
+        fileName = self.__fileName(key)
+        data = zlib.compress(body if isinstance(body, bytes) else body.encode('utf-8'))
+        directory = os.path.dirname(fileName)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass
+        # write under a temporary name first, readers never see half written entries
+        tmpName = "%s.%d.%d.tmp" % (fileName, os.getpid(), threading.current_thread().ident)
+        tmpFile = open(tmpName, "wb")
+        tmpFile.write(data)
+        tmpFile.close()
+        with self.__lock:
+            self.__scan()
+            os.rename(tmpName, fileName)
+            self.__drop(fileName)
+            self.__entries[fileName] = (time.time(), len(data))
+            self.__size += len(data)
+            self.__evict()
+
+    def __fileName(self, key):
+        digest = sha1("|".join([str(x) for x in key]).encode('utf-8')).hexdigest()
+        return os.path.join(self.__path, digest[:2], digest)
+
+    def __scan(self):
+        if self.__entries is not None:
+            return
+        self.__entries = {}
+        self.__size = 0
+        if not os.path.isdir(self.__path):
+            return
+        for dirPath, dirNames, fileNames in os.walk(self.__path):
+            for name in fileNames:
+                fileName = os.path.join(dirPath, name)
+                if name.endswith(".tmp"):
+                    continue
+                stat = os.stat(fileName)
+                self.__entries[fileName] = (stat.st_mtime, stat.st_size)
+                self.__size += stat.st_size
+
+    def __drop(self, fileName):
+        if fileName in self.__entries:
+            self.__size -= self.__entries.pop(fileName)[1]
+
+    def __remove(self, fileName):
+        self.__drop(fileName)
+        try:
+            os.remove(fileName)
+        except OSError:
+            pass
+
+    def __evict(self):
+        if self.__size <= self.__maxSize:
+            return
+        for fileName in sorted(self.__entries.keys(), key=lambda x: self.__entries[x][0]):
+            if self.__size <= self.__maxSize:
+                break
+            self.__remove(fileName)
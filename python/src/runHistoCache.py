@@ -0,0 +1,71 @@
+from collections import OrderedDict
+
+def _histoSize(histo):
+    "rough memory use of a histogram in bytes"
+    if hasattr(histo, "contents"):
+        # NumpyHisto
+        size = histo.contents.nbytes+histo.errors.nbytes
+        if histo.binEntries is not None:
+            size += histo.binEntries.nbytes
+        return size+1024
+    if hasattr(histo, "GetSize"):
+        return histo.GetSize()*(16 if histo.GetSumw2N() else 8)+1024
+    return 1024
+
+class RunHistoCache:
+    """histograms of the run being processed, shared by all plot sections: every distinct path is fetched
+    and deserialized once per run, however many sections use it. Callers get a private Clone of ROOT
+    histograms, metrics may rebin or fit them, and the shared object otherwise (NumpyHisto). At most
+    maxSize bytes are kept, least recently used first out, and everything is dropped when the next run
+    starts."""
+    def __init__(self, maxSize=512*1024**2):
+        self.__maxSize = maxSize
+        self.__run = None
+        self.__histos = OrderedDict()
+        self.__size = 0
+
+    def get(self, server, run, dataset, path, load, numpyHisto=False):
+        """the histogram path of the run, load() fetches it on a miss. Histograms that do not exist are
+        remembered as None as well. numpyHisto tells apart the NumpyHisto of a path from its ROOT histogram."""
+        name = (path.lstrip('/'), numpyHisto)
+        run = (server, run, dataset)
+        if run != self.__run:
+            self.clear()
+            self.__run = run
+        if name in self.__histos:
+            histo, size = self.__histos.pop(name)
+            self.__histos[name] = (histo, size)
+        else:
+            histo = load()
+            if histo == None or not hasattr(histo, "Clone"):
+                # missing histograms, NumpyHisto
+                size = 0 if histo == None else _histoSize(histo)
+            else:
+                # ROOT objects read from a file belong to it, keep a copy of our own
+                histo = histo.Clone()
+                if hasattr(histo, "SetDirectory"):
+                    histo.SetDirectory(0)
+                size = _histoSize(histo)
+            self.__histos[name] = (histo, size)
+            self.__size += size
+            while self.__size > self.__maxSize and len(self.__histos) > 1:
+                self.__size -= self.__histos.popitem(last=False)[1][1]
+        if histo == None or not hasattr(histo, "Clone"):
+            return histo
+        histo = histo.Clone()
+        if hasattr(histo, "SetDirectory"):
+            histo.SetDirectory(0)
+        return histo
+
+    def clear(self):
+        "called when the run is done"
+        self.__run = None
+        self.__histos = OrderedDict()
+        self.__size = 0
+
+def openRunHistoCache(config):
+    "the RunHistoCache of a job, [output] runHistoCacheSize in MB (default 512)"
+    runHistoCacheSize = 512
+    if config.has_option("output","runHistoCacheSize"):
+        runHistoCacheSize = config.getint("output","runHistoCacheSize")
+    return RunHistoCache(runHistoCacheSize*1024**2)
@@ -0,0 +1,62 @@
+import sys
+import threading
+
+class RunPrefetcher:
+    """calls prepare(run) for the upcoming runs on a bounded pool of worker threads and hands
+    the results back strictly in run order. With workers=0 everything runs inline."""
+    def __init__(self, runs, prepare, workers=0, depth=None):
+        self.__runs = list(runs)
+        self.__prepare = prepare
+        self.__workers = max(0, int(workers))
+        self.__depth = depth if depth else 2*self.__workers
+
+    def __iter__(self):
+        if self.__workers == 0:
+            for run in self.__runs:
+                yield run, self.__prepare(run)
+            return
+
+        self.__cond = threading.Condition()
+        self.__results = {}
+        self.__next = 0
+        self.__consumed = 0
+        self.__stop = False
+        threads = [threading.Thread(target=self.__work) for i in range(min(self.__workers, len(self.__runs)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for idx, run in enumerate(self.__runs):
+                with self.__cond:
+                    while idx not in self.__results:
+                        self.__cond.wait(1.)
+                    ok, value = self.__results.pop(idx)
+                    self.__consumed = idx+1
+                    self.__cond.notify_all()
+                if not ok:
+                    raise value
+                yield run, value
+        finally:
+            with self.__cond:
+                self.__stop = True
+                self.__cond.notify_all()
+            for thread in threads:
+                thread.join()
+
+    def __work(self):
+        while True:
+            with self.__cond:
+                # do not run more than depth runs ahead of the consumer, payloads can be large
+                while not self.__stop and self.__next < len(self.__runs) and self.__next >= self.__consumed+self.__depth:
+                    self.__cond.wait(1.)
+                if self.__stop or self.__next >= len(self.__runs):
+                    return
+                idx = self.__next
+                self.__next += 1
+            try:
+                result = (True, self.__prepare(self.__runs[idx]))
+            except Exception:
+                result = (False, sys.exc_info()[1])
+            with self.__cond:
+                self.__results[idx] = result
+                self.__cond.notify_all()
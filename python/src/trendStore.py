@@ -0,0 +1,189 @@
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+import numpy
+
+# one block of float64 columns per trend, in this order
+COLUMNS = ("run", "x", "y", "yErrLow", "yErrHigh", "ySysErrLow", "ySysErrHigh")
+
+class TrendStore:
+    """columnar copy of the trends of a directory (JSON/ of a job). The columns of every trend are
+    appended to trends.bin, the small index trends.idx holds their offset and length and the titles of
+    the plot. Readers map trends.bin and slice runs and metrics out of it without parsing any JSON.
+    Several jobs may share the directory: put keeps the new trends in memory, close appends them and
+    merges them into the index on disk while it holds the lock on trends.lock."""
+    def __init__(self, directory):
+        self.__directory = directory
+        self.__dataPath = os.path.join(directory, "trends.bin")
+        self.__indexPath = os.path.join(directory, "trends.idx")
+        self.__lockPath = os.path.join(directory, "trends.lock")
+        self.__index = {}
+        self.__pending = {}
+        self.__data = None
+        if os.path.exists(self.__indexPath):
+            with self.__locked(fcntl.LOCK_SH):
+                self.__load()
+
+    @contextmanager
+    def __locked(self, operation):
+        "trends.idx and trends.bin only change together, under the exclusive lock"
+        if not os.path.isdir(self.__directory):
+            os.makedirs(self.__directory)
+        with open(self.__lockPath, "a") as lockFile:
+            fcntl.flock(lockFile.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile.fileno(), fcntl.LOCK_UN)
+
+    def __load(self):
+        "reads the index and maps the data it points to, with the lock held"
+        self.__index = {}
+        self.__data = None
+        if os.path.exists(self.__indexPath):
+            with open(self.__indexPath) as indexFile:
+                self.__index = json.load(indexFile)["trends"]
+        # mapped now, a compaction by another job replaces the file but not our mapping of it
+        if os.path.exists(self.__dataPath) and os.path.getsize(self.__dataPath):
+            self.__data = numpy.memmap(self.__dataPath, dtype=numpy.float64, mode="r")
+
+    def getPath(self):
+        return self.__directory
+
+    def getIndexPath(self):
+        return self.__indexPath
+
+    def titles(self):
+        return sorted(set(self.__index) | set(self.__pending))
+
+    def __contains__(self, title):
+        return title in self.__pending or title in self.__index
+
+    def getInfo(self, title):
+        "yTitle, hTitle, ymin and ymax of a trend"
+        if title in self.__pending:
+            return dict(self.__pending[title][1])
+        return dict((key, value) for key, value in self.__index[title].items() if key not in ("offset", "rows"))
+
+    def get(self, title, firstRun=None, lastRun=None):
+        """{column: array} of a trend, optionally only the runs firstRun <= run <= lastRun.
+        The arrays are read only views of the mapped file, or of the block put since the last close."""
+        if title in self.__pending:
+            block = self.__pending[title][0]
+        else:
+            entry = self.__index[title]
+            rows = entry["rows"]
+            if rows == 0:
+                return dict((name, numpy.zeros(0)) for name in COLUMNS)
+            block = self.__data[entry["offset"]:entry["offset"]+len(COLUMNS)*rows].reshape((len(COLUMNS), rows))
+        if firstRun is not None or lastRun is not None:
+            runs = block[0]
+            selected = numpy.ones(block.shape[1], dtype=bool)
+            if firstRun is not None:
+                selected &= runs >= firstRun
+            if lastRun is not None:
+                selected &= runs <= lastRun
+            block = block[:, selected]
+        return dict(zip(COLUMNS, block))
+
+    def getPoints(self, title):
+        "the trend as the list of points of JSON/<title>.json"
+        columns = self.get(title)
+        info = self.getInfo(title)
+        points = []
+        for i in range(len(columns["run"])):
+            point = {'run': int(columns["run"][i]), 'x': float(columns["x"][i]), 'y': float(columns["y"][i]),
+                     'yErr': float(columns["yErrLow"][i])}
+            point.update(info)
+            points.append(point)
+        return points
+
+    def put(self, title, columns, **info):
+        """adds or replaces a trend, on disk with the next close. columns maps the names in COLUMNS to
+        sequences of equal length, a missing yErrHigh is yErrLow and missing systematic errors are the
+        statistical ones."""
+        columns = dict(columns)
+        columns.setdefault("yErrHigh", columns["yErrLow"])
+        columns.setdefault("ySysErrLow", columns["yErrLow"])
+        columns.setdefault("ySysErrHigh", columns["yErrHigh"])
+        block = numpy.array([numpy.asarray(columns[name], dtype=numpy.float64) for name in COLUMNS])
+        block.setflags(write=False)
+        self.__pending[title] = (block, dict(info))
+
+    def __compact(self):
+        "rewrites trends.bin with the blocks of the index only, with the exclusive lock held"
+        tmpPath = "%s.%d.tmp" % (self.__dataPath, os.getpid())
+        offset = 0
+        with open(tmpPath, "wb") as dataFile:
+            for title in sorted(self.__index):
+                entry = self.__index[title]
+                size = len(COLUMNS)*entry["rows"]
+                if size:
+                    dataFile.write(numpy.ascontiguousarray(self.__data[entry["offset"]:entry["offset"]+size]).tobytes())
+                entry["offset"] = offset
+                offset += size
+        os.rename(tmpPath, self.__dataPath)
+
+    def __writeIndex(self):
+        tmpPath = "%s.%d.tmp" % (self.__indexPath, os.getpid())
+        with open(tmpPath, "w") as indexFile:
+            json.dump({"columns": COLUMNS, "trends": self.__index}, indexFile)
+        os.rename(tmpPath, self.__indexPath)
+
+    def compact(self):
+        "rewrites trends.bin with the current blocks only, replaced trends leave their old block behind"
+        with self.__locked(fcntl.LOCK_EX):
+            self.__load()
+            self.__compact()
+            self.__writeIndex()
+            self.__load()
+
+    def close(self):
+        """appends what was put since the last close and merges it into the index on disk, the trends
+        written by other jobs meanwhile are kept. Readers see the new trends from then on."""
+        if not self.__pending:
+            return
+        with self.__locked(fcntl.LOCK_EX):
+            self.__load()
+            with open(self.__dataPath, "ab") as dataFile:
+                for title in sorted(self.__pending):
+                    (block, info) = self.__pending[title]
+                    entry = dict(info)
+                    entry["offset"] = dataFile.tell()//8
+                    entry["rows"] = block.shape[1]
+                    dataFile.write(numpy.ascontiguousarray(block).tobytes())
+                    self.__index[title] = entry
+            self.__pending = {}
+            self.__data = None
+            if os.path.getsize(self.__dataPath):
+                self.__data = numpy.memmap(self.__dataPath, dtype=numpy.float64, mode="r")
+            used = sum(len(COLUMNS)*entry["rows"] for entry in self.__index.values())
+            if os.path.getsize(self.__dataPath)//8 > 2*used:
+                self.__compact()
+            self.__writeIndex()
+            self.__load()
+
+
+def readTrend(directory, title):
+    """the points of a trend as in <directory>/<title>.json. They come from the store of the directory
+    when it has the trend and the JSON file is not newer, from the JSON file otherwise."""
+    jsonPath = os.path.join(directory, title+".json")
+    store = TrendStore(directory)
+    if title in store and (not os.path.exists(jsonPath) or os.path.getmtime(jsonPath) <= os.path.getmtime(store.getIndexPath())):
+        return store.getPoints(title)
+    with open(jsonPath) as jsonFile:
+        return json.load(jsonFile)[title]
+
+def writeTrend(directory, title, points):
+    "writes <directory>/<title>.json and, if the directory has a store, adds the trend to it"
+    with open(os.path.join(directory, title+".json"), 'w') as outfile:
+        json.dump({title: points}, outfile, indent=4)
+    store = TrendStore(directory)
+    if not store.titles():
+        return
+    info = dict((key, value) for key, value in points[0].items() if key not in ('run', 'x', 'y', 'yErr')) if points else {}
+    store.put(title, {"run": [point['run'] for point in points], "x": [point['x'] for point in points],
+                      "y": [point['y'] for point in points], "yErrLow": [point['yErr'] for point in points]}, **info)
+    store.close()
@@ -0,0 +1,229 @@
+"""the metrics of basic.py that work on the bin array, checked against the GetBinContent loops they
+replaced (kept here as the reference) on random histograms"""
+import unittest
+from math import sqrt
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# --- the loops of the previous implementation, with the histogram and the parameters as arguments
+
+def loopProfileMean(histo):
+    nbinx=histo.GetNbinsX();
+    nbiny=histo.GetNbinsY();
+    summy=0
+    sumSquare=0
+    count=0
+    for i in range(1,nbinx+1):
+        for j in range(1,nbiny+1):
+            if histo.GetBinContent(i,j) != 0 :
+                summy+=histo.GetBinContent(i,j)
+                sumSquare+=histo.GetBinContent(i,j)*histo.GetBinContent(i,j)
+                count+=1
+    if count==0:
+        return (0,0)
+    rms= sqrt( sumSquare/count-(summy*summy/(count*count)) )
+    return (summy/count, rms/sqrt(count))
+
+def loopProfileMeanBPixModules(histo, modNum):
+    modCounter = 4-modNum
+    nbinx=histo.GetNbinsX();
+    nbiny=histo.GetNbinsY();
+    summy=0
+    sumSquare=0
+    count=0
+    for j in range(1,nbiny+1):
+        if histo.GetBinContent(1+modCounter,j) != 0 :
+            summy+=histo.GetBinContent(1+modCounter,j)
+            sumSquare+=histo.GetBinContent(1+modCounter,j)*histo.GetBinContent(1+modCounter,j)
+            count+=1
+        if histo.GetBinContent(nbinx-modCounter,j) != 0 :
+            summy+=histo.GetBinContent(nbinx-modCounter,j)
+            sumSquare+=histo.GetBinContent(nbinx-modCounter,j)*histo.GetBinContent(nbinx-modCounter,j)
+            count+=1
+    if count==0:
+        return (0,0)
+    rms= sqrt( sumSquare/count-(summy*summy/(count*count)) )
+    return (summy/count, rms/sqrt(count))
+
+def loopFED25ErrorFraction(histo, thr, norm, normErr=True):
+    ref=histo.GetMaximum()*thr
+    nbinx=histo.GetNbinsX();
+    nbiny=histo.GetNbinsY();
+    count=0
+    for i in range(1,nbinx+1):
+        for j in range(1,nbiny+1):
+            if histo.GetBinContent(i,j)>ref:
+                count+=1
+    res=float(count)/norm
+    err=0
+    if normErr :
+        err=sqrt(res*(1-res)/(nbinx*nbiny))
+    return (100*res, 100*err)
+
+def loopMeanXRange(histo, xmin, xmax):
+    sum,count = 0,0
+    for i in range(int(xmin),int(xmax)):
+        for j in range(1,histo.GetYaxis().GetNbins()+1):
+            if histo.GetBinContent(i,j) >= 0:
+                sum+=histo.GetBinContent(i,j)
+            count+=1
+    if count==0:
+        return (0,0)
+    return (sum/count,0)
+
+def loopMeanYRange(histo, ymin, ymax):
+    # the previous version passed float limits to range(), which raised and gave 0 for every
+    # histogram. This is the loop it was meant to run, with the integer part of the limits.
+    sum , count = 0 , 0
+    for i in range(int(ymin),int(ymax)):
+        for j in range(0,histo.GetXaxis().GetNbins()+1):
+            sum+=histo.GetBinContent(j,i)
+            count+=1
+    if count==0:
+        return (0,0)
+    return (sum/count,0)
+
+def loopMean2D(histo):
+    sum, count = 0 , 0
+    for i in range(histo.GetXaxis().GetNbins()):
+        for j in range(histo.GetYaxis().GetNbins()):
+            sum+=histo.GetBinContent(i,j)
+            count+=1
+    if count==0:
+        return (0,0)
+    return (sum/count, 0)
+
+def loopMeanYForXBin(histo, xbin):
+    sum,count = 0,0
+    for i in range(1,histo.GetYaxis().GetNbins()+1):
+        if histo.GetBinContent(int(xbin),i) >= 0:
+            sum+=histo.GetBinContent(int(xbin),i)
+        count+=1
+    if count == 0:
+        return (0,0)
+    return (sum/count, 0)
+
+def loopEntriesCount(histo, startValue):
+    sum=float(0.0)
+    for bin in range(histo.FindBin(startValue),histo.GetNbinsX()+1) :
+        sum+=histo.GetBinContent(bin)
+    return ( sum, sqrt(1/sum)*sum if sum else 0)
+
+def loopEntriesRate(histo, histo1, startValue):
+    trksum=float(0.0)
+    for bin in range(histo.FindBin(startValue),histo.GetNbinsX()+1) :
+        trksum+=histo.GetBinContent(bin)
+    nLS=0
+    for bin in range(1,histo1.GetNbinsX()+1) :
+        if histo1.GetBinContent(bin) > 0 :
+            nLS+=1
+    if nLS :
+        return (trksum/(nLS*23), sqrt(trksum)/(nLS*23))
+    else :
+        return (0,0)
+
+def loopAverageYwithXCut(histo):
+    value = 0
+    Nbins = histo.GetNbinsX()
+    for xbin in range(Nbins):
+        if histo.GetBinContent(xbin)>0:
+            NN=xbin
+    nbinsx=NN-3
+    for xbin in range(nbinsx):
+        value += histo.GetBinContent(xbin)
+    value /= nbinsx
+    return (value, 0)
+
+# --- sample histograms
+
+def makeHisto(nx, ny=None, seed=1, low=-3, high=20, zeros=0.3):
+    "NumpyHisto with random integer contents, some of them 0 and some negative"
+    from metrics.histo import NumpyHisto, NumpyAxis
+    random = numpy.random.RandomState(seed)
+    shape = (nx+2,) if ny == None else (ny+2, nx+2)
+    contents = random.randint(low, high, size=shape).astype(numpy.float64)
+    contents[random.uniform(size=shape) < zeros] = 0.
+    xaxis = NumpyAxis(numpy.linspace(0., 10., nx+1))
+    yaxis = None if ny == None else NumpyAxis(numpy.linspace(-5., 5., ny+1))
+    return NumpyHisto("h", "h", "TH1F" if ny == None else "TH2F", contents, numpy.sqrt(numpy.abs(contents)),
+                      xaxis, yaxis, float(numpy.abs(contents).sum()))
+
+@unittest.skipIf(numpy == None, "needs numpy")
+class VectorizedMetricTest(unittest.TestCase):
+    def setUp(self):
+        self.histos2D = [makeHisto(nx, ny, seed) for seed, (nx, ny) in enumerate(((8, 5), (13, 21), (4, 1)))]
+        self.histos1D = [makeHisto(nx, None, seed, low=0) for seed, nx in enumerate((20, 57, 6))]
+
+    def check(self, metric, reference, histos):
+        from metrics.histo import SharedHisto
+        for histo in histos:
+            expected = reference(histo)
+            for argument in (histo, SharedHisto(histo)):
+                result = metric.calculate(argument)
+                self.assertEqual(len(result), 2)
+                for value, expectedValue in zip(result, expected):
+                    self.assertAlmostEqual(value, expectedValue, places=9, msg="%s on %s" % (metric.__class__.__name__, histo.contents.shape))
+
+    def testProfileMean(self):
+        from metrics import basic
+        self.check(basic.ProfileMean(), loopProfileMean, self.histos2D+self.histos1D)
+
+    def testProfileMeanBPixModules(self):
+        from metrics import basic
+        for modNum in (1, 2, 3, 4):
+            self.check(basic.ProfileMeanBPixModules(modNum), lambda histo: loopProfileMeanBPixModules(histo, modNum), self.histos2D)
+
+    def testFED25ErrorFraction(self):
+        from metrics import basic
+        for (thr, norm, normErr) in ((0.5, 100., True), (0.1, 1000., True), (0.9, 40., False)):
+            self.check(basic.FED25ErrorFraction(thr, norm, normErr), lambda histo: loopFED25ErrorFraction(histo, thr, norm, normErr), self.histos2D)
+
+    def testMeanXRange(self):
+        from metrics import basic
+        for (xmin, xmax) in ((1, 4), (0, 30), (3, 3), (2.7, 6.2)):
+            self.check(basic.MeanXRange(xmin, xmax), lambda histo: loopMeanXRange(histo, xmin, xmax), self.histos2D)
+
+    def testMeanYRange(self):
+        from metrics import basic
+        for (ymin, ymax) in ((1, 3), (0, 30), (2., 5.), (1.5, 4.9)):
+            self.check(basic.MeanYRange(ymin, ymax), lambda histo: loopMeanYRange(histo, ymin, ymax), self.histos2D)
+
+    def testMeanYRangeNotZero(self):
+        # the previous version returned 0 for every histogram
+        from metrics import basic
+        self.assertNotEqual(basic.MeanYRange(1., 4.).calculate(self.histos2D[1])[0], 0)
+
+    def testMean2D(self):
+        from metrics import basic
+        self.check(basic.Mean2D(), loopMean2D, self.histos2D)
+
+    def testMeanYForXBin(self):
+        from metrics import basic
+        for xbin in (0, 1, 5, 40):
+            self.check(basic.MeanYForXBin(xbin), lambda histo: loopMeanYForXBin(histo, xbin), self.histos2D)
+
+    def testEntriesCount(self):
+        from metrics import basic
+        for startValue in (-1., 0., 2.3, 9.99, 12.):
+            self.check(basic.EntriesCount(startValue), lambda histo: loopEntriesCount(histo, startValue), self.histos1D)
+
+    def testEntriesRate(self):
+        from metrics import basic
+        for lumi in (self.histos1D[1], makeHisto(30, None, 7, low=-2, high=3)):
+            for startValue in (0., 4.2):
+                metric = basic.EntriesRate(startValue)
+                metric.setOptionalHisto1(lumi)
+                self.check(metric, lambda histo: loopEntriesRate(histo, lumi, startValue), self.histos1D)
+
+    def testAverageYwithXCut(self):
+        from metrics import basic
+        metric = basic.AverageYwithXCut(10)
+        self.check(metric, loopAverageYwithXCut, self.histos1D[:2])
+        # the parameter, and so the cache key, stays what the cfg gave
+        self.assertEqual(metric.getKey(), basic.AverageYwithXCut(10).getKey())
+
+if __name__ == '__main__':
+    unittest.main()
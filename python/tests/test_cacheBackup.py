@@ -0,0 +1,49 @@
+"""snapshots of a cache restore what was in it, NaN results included"""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.cacheBackup import takeSnapshot, restoreSnapshot, backupName
+from src.metricCache import TextMetricCache, SQLiteMetricCache
+
+def key(run):
+    return ("server", run, "/A/B/DQMIO", "SiStrip/h", "LanGau(1,2)")
+
+class CacheBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cachePath = os.path.join(self.directory, ".DQMCache")
+        self.backupDir = os.path.join(self.directory, "backup")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testRestoreNaN(self):
+        cache = TextMetricCache(self.cachePath)
+        cache[key(1)] = ((1.5, 0.1), 5.0, 4)
+        cache[key(2)] = ((float("nan"), 0.1), 5.0, 4)
+        cache.close()
+        self.assertEqual(takeSnapshot(self.cachePath, self.backupDir)[1], 2)
+        # the NaN entry did not change, only the new one goes into the delta
+        cache = TextMetricCache(self.cachePath)
+        cache[key(3)] = ((float("inf"), 0.2), 6.0, 4)
+        cache.close()
+        self.assertEqual(takeSnapshot(self.cachePath, self.backupDir, fullEvery=5)[1:], (1, 0))
+
+        restored = os.path.join(self.directory, "restored")
+        self.assertEqual(restoreSnapshot(self.backupDir, backupName(self.cachePath), restored), 3)
+        cache = TextMetricCache(restored)
+        self.assertTrue(math.isnan(cache[key(2)][0][0]))
+        self.assertEqual(cache[key(3)][0][0], float("inf"))
+
+        restored = os.path.join(self.directory, "restored.sqlite")
+        restoreSnapshot(self.backupDir, backupName(self.cachePath), restored, backend="sqlite")
+        cache = SQLiteMetricCache(restored)
+        self.assertTrue(math.isnan(cache[key(2)][0][0]))
+        self.assertEqual(cache[key(1)][0][0], 1.5)
+        cache.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import math
+import unittest
+
+from src.dqmdecode import dqm_decode, dqm_decode_contents
+
+class DecodeTest(unittest.TestCase):
+    def testNonFinite(self):
+        self.assertEqual(dqm_decode('{"a": inf, "b": nan}'), {'a': float('inf'), 'b': 0})
+        self.assertEqual(dqm_decode('[1, inf, nan]'), [1, float('inf'), 0])
+
+    def testNegativeInfinity(self):
+        self.assertEqual(dqm_decode('{"a": -inf}'), {'a': float('-inf')})
+        self.assertEqual(dqm_decode('[1, -inf, inf]'), [1, float('-inf'), float('inf')])
+        self.assertEqual(dqm_decode('[-nan]'), [0])
+
+    def testStringsUntouched(self):
+        self.assertEqual(dqm_decode('{"obj": "-inf", "title": "nan, inf"}'), {'obj': '-inf', 'title': 'nan, inf'})
+        # what looks like a value inside a string, also after escaped quotes
+        self.assertEqual(dqm_decode('{"title": "x: nan, [inf]", "y": inf}'), {'title': 'x: nan, [inf]', 'y': float('inf')})
+        self.assertEqual(dqm_decode(r'["a \", [-inf, nan]", "\\", nan]'), ['a ", [-inf, nan]', '\\', 0])
+
+    def testContents(self):
+        body = '{"contents": [{"obj": "a", "x": -inf}, {"obj": "b", "x": 1}, {"obj": "c"}]}'
+        items = list(dqm_decode_contents(body, ["a", "b"]))
+        self.assertEqual([item["obj"] for item in items], ["a", "b"])
+        self.assertTrue(math.isinf(items[0]["x"]) and items[0]["x"] < 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""fits on the FitExecutor workers give what they give in this process, however fast each worker is"""
+import time
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from metrics.basic import BaseMetric, MetricGroup
+
+class ChainedFit(BaseMetric):
+    "starts from the result of the previous run like a warm-started fit, the early runs are the slow ones"
+    def __init__(self):
+        BaseMetric.__init__(self)
+        self.__start = 0
+    def useFitWorkers(self):
+        return True
+    def usesEarlierRuns(self):
+        return True
+    def getStartParameters(self):
+        return self.__start
+    def setStartParameters(self, parameters):
+        self.__start = parameters
+    def calculate(self, histo):
+        time.sleep(0.05*max(4-self._run, 0))
+        self.__start = 2*self.__start+self._run
+        return (self.__start, 0)
+    def getWorkerState(self):
+        return self.__start
+    def setWorkerState(self, state):
+        self.__start = state
+
+def makeHisto():
+    from metrics.histo import NumpyAxis, NumpyHisto
+    contents = numpy.zeros(5)
+    contents[1:-1] = 1.
+    return NumpyHisto("h", "h", "TH1F", contents, contents, NumpyAxis(numpy.linspace(0., 3., 4)), entries=3.)
+
+@unittest.skipIf(numpy == None, "needs numpy")
+class FitExecutorTest(unittest.TestCase):
+    def setUp(self):
+        from src.fitExecutor import FitExecutor
+        self.executor = FitExecutor(3, [])
+
+    def tearDown(self):
+        self.executor.close()
+
+    def evaluateRuns(self, executor):
+        results = []
+        metric = ChainedFit()
+        group = MetricGroup(None, executor)
+        for run in range(1, 7):
+            metric.setRun(run)
+            group.add(("h", run), metric, makeHisto(), None, results.append, self.fail)
+            group.evaluate()
+        group.finish()
+        return [value for (value, errors) in results]
+
+    def testMetricChangedAfterSubmit(self):
+        metric = ChainedFit()
+        metric.setRun(1)
+        job = self.executor.submit(metric, makeHisto(), 5)
+        metric.setRun(2)
+        metric.setStartParameters(100)
+        self.assertEqual(job.get()[0], ((11, 0), 3.))
+
+    def testWarmStartInRunOrder(self):
+        self.assertEqual(self.evaluateRuns(self.executor), self.evaluateRuns(None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,17 @@
+"""every fit kernel has its source in git, the shared objects are built from it"""
+import os
+import unittest
+
+from metrics import kernels
+
+class KernelSourceTest(unittest.TestCase):
+    def testSourcesExist(self):
+        for name, source in sorted(kernels.KERNELS.items()):
+            self.assertTrue(os.path.exists(os.path.join(os.path.dirname(kernels.__file__), source)),
+                            "fit kernel '%s' has no source %s" % (name, source))
+
+    def testUnknownKernel(self):
+        self.assertRaises(kernels.MissingKernelError, kernels.getLibrary, "NoSuchKernel")
+
+if __name__ == '__main__':
+    unittest.main()
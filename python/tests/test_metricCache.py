@@ -0,0 +1,84 @@
+"""the metric cache backends keep what the metrics return, NaN and inf included"""
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.metricCache import SQLiteMetricCache, TextMetricCache, readMetricCache
+
+KEY = ("server", 2, "/A/B/DQMIO", "SiStrip/h", "LanGau(1,2)")
+
+class SQLiteMetricCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testNaNResult(self):
+        cache = SQLiteMetricCache(self.path)
+        cache[KEY] = ((float("nan"), 0.1), 5.0)
+        cache[KEY[:1]+(3,)+KEY[2:]] = ((float("inf"), (float("-inf"), 0.2)), 5.0, 4, "abc")
+        cache.close()
+        cache = SQLiteMetricCache(self.path)
+        ((value, error), entries, version, contentHash) = cache[KEY]
+        self.assertTrue(math.isnan(value))
+        self.assertEqual((error, entries, version, contentHash), (0.1, 5.0, None, None))
+        ((value, (errLow, errHigh)), entries, version, contentHash) = cache[KEY[:1]+(3,)+KEY[2:]]
+        self.assertEqual((value, errLow, errHigh, version), (float("inf"), float("-inf"), 0.2, 4))
+        self.assertTrue(math.isnan(cache.getRun(2)[KEY][0][0]))
+        cache.close()
+        self.assertTrue(math.isnan(readMetricCache(self.path)[KEY][0][0]))
+
+class TextMetricCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, ".DQMCache")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def key(self, run):
+        return KEY[:1]+(run,)+KEY[2:]
+
+    def testNaNInJournal(self):
+        # a job that dies after three checkpoints, the second one with a NaN result
+        cache = TextMetricCache(self.path)
+        for run, value in ((1, 1.5), (2, float("nan")), (3, float("inf"))):
+            cache[self.key(run)] = ((value, 0.1), 5.0, 4)
+            cache.checkpoint()
+        self.assertEqual(len(readMetricCache(self.path)), 3)
+        cache = TextMetricCache(self.path)
+        self.assertEqual(len(cache), 3)
+        self.assertTrue(math.isnan(cache[self.key(2)][0][0]))
+        self.assertEqual(cache[self.key(3)][0][0], float("inf"))
+        # and once more from the compacted cache file
+        cache = TextMetricCache(self.path)
+        self.assertEqual(len(cache), 3)
+        self.assertTrue(math.isnan(cache[self.key(2)][0][0]))
+
+    def testTornLastCheckpoint(self):
+        cache = TextMetricCache(self.path)
+        cache[self.key(1)] = ((1.5, 0.1), 5.0)
+        cache.checkpoint()
+        journal = open(self.path+".journal", "a")
+        journal.write("([(('server', 2")
+        journal.close()
+        self.assertEqual(list(TextMetricCache(self.path).keys()), [self.key(1)])
+
+    def testBrokenCheckpointKeepsJournal(self):
+        cache = TextMetricCache(self.path)
+        cache[self.key(1)] = ((1.5, 0.1), 5.0)
+        cache.checkpoint()
+        journal = open(self.path+".journal", "a")
+        journal.write("garbage(\n")
+        journal.close()
+        cache[self.key(3)] = ((2.5, 0.1), 5.0)
+        cache.checkpoint()
+        self.assertRaises(ValueError, TextMetricCache, self.path)
+        self.assertTrue(os.path.exists(self.path+".journal"))
+
+if __name__ == '__main__':
+    unittest.main()
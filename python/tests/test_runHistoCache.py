@@ -0,0 +1,81 @@
+"""RunHistoCache: one load per histogram and run, shared by the sections"""
+import unittest
+
+from src.runHistoCache import RunHistoCache, openRunHistoCache
+
+class FakeHisto(object):
+    "stands in for a ROOT histogram, Clone gives a new object"
+    def __init__(self, name):
+        self.name = name
+    def Clone(self):
+        return FakeHisto(self.name)
+    def GetSize(self):
+        return 10
+    def GetSumw2N(self):
+        return 0
+
+class FakeConfig(object):
+    def __init__(self, options):
+        self.options = options
+    def has_option(self, section, option):
+        return (section, option) in self.options
+    def getint(self, section, option):
+        return int(self.options[(section, option)])
+
+class RunHistoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.loads = []
+
+    def load(self, name):
+        def load():
+            self.loads.append(name)
+            return FakeHisto(name) if name != "missing" else None
+        return load
+
+    def testLoadedOncePerRun(self):
+        cache = RunHistoCache()
+        first = cache.get("server", 1, "/A/B/DQMIO", "/SiStrip/h", self.load("h"))
+        second = cache.get("server", 1, "/A/B/DQMIO", "SiStrip/h", self.load("h"))
+        self.assertEqual(self.loads, ["h"])
+        # every caller gets a copy of its own
+        self.assertFalse(first is second)
+        self.assertEqual(second.name, "h")
+
+    def testNextRunStartsEmpty(self):
+        cache = RunHistoCache()
+        cache.get("server", 1, "/A/B/DQMIO", "h", self.load("h"))
+        cache.get("server", 2, "/A/B/DQMIO", "h", self.load("h"))
+        cache.get("server", 2, "/A/C/DQMIO", "h", self.load("h"))
+        self.assertEqual(len(self.loads), 3)
+
+    def testNumpyHistoKeptApart(self):
+        cache = RunHistoCache()
+        cache.get("server", 1, "/A/B/DQMIO", "h", self.load("h"))
+        cache.get("server", 1, "/A/B/DQMIO", "h", self.load("h"), numpyHisto=True)
+        self.assertEqual(len(self.loads), 2)
+
+    def testMissingRemembered(self):
+        cache = RunHistoCache()
+        self.assertEqual(cache.get("server", 1, "/A/B/DQMIO", "h", self.load("missing")), None)
+        self.assertEqual(cache.get("server", 1, "/A/B/DQMIO", "h", self.load("missing")), None)
+        self.assertEqual(self.loads, ["missing"])
+
+    def testSizeBound(self):
+        # room for a single histogram, the last one is kept
+        cache = RunHistoCache(0)
+        cache.get("server", 1, "/A/B/DQMIO", "h1", self.load("h1"))
+        cache.get("server", 1, "/A/B/DQMIO", "h2", self.load("h2"))
+        cache.get("server", 1, "/A/B/DQMIO", "h2", self.load("h2"))
+        cache.get("server", 1, "/A/B/DQMIO", "h1", self.load("h1"))
+        self.assertEqual(self.loads, ["h1", "h2", "h1"])
+
+    def testOpenFromConfig(self):
+        cache = openRunHistoCache(FakeConfig({("output", "runHistoCacheSize"): "0"}))
+        cache.get("server", 1, "/A/B/DQMIO", "h1", self.load("h1"))
+        cache.get("server", 1, "/A/B/DQMIO", "h2", self.load("h2"))
+        cache.get("server", 1, "/A/B/DQMIO", "h1", self.load("h1"))
+        self.assertEqual(len(self.loads), 3)
+        self.assertTrue(isinstance(openRunHistoCache(FakeConfig({})), RunHistoCache))
+
+if __name__ == '__main__':
+    unittest.main()
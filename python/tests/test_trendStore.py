@@ -0,0 +1,58 @@
+"""jobs sharing a JSON directory keep each other's trends in its TrendStore"""
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def columns(runs, offset=0.):
+    return {"run": runs, "x": range(len(runs)), "y": [run+offset for run in runs], "yErrLow": [0.5]*len(runs)}
+
+@unittest.skipIf(numpy == None, "needs numpy")
+class TrendStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def testJobsMerged(self):
+        from src.trendStore import TrendStore
+        first = TrendStore(self.directory)
+        second = TrendStore(self.directory)
+        first.put("A", columns([1, 2, 3]), yTitle="a")
+        second.put("B", columns([4, 5]), yTitle="b")
+        # what is put is there before the close, in this store only
+        self.assertEqual(list(second.get("B")["y"]), [4., 5.])
+        self.assertEqual(first.titles(), ["A"])
+        first.close()
+        second.close()
+        store = TrendStore(self.directory)
+        self.assertEqual(store.titles(), ["A", "B"])
+        self.assertEqual(list(store.get("A")["y"]), [1., 2., 3.])
+        self.assertEqual(store.getInfo("B"), {"yTitle": "b"})
+        self.assertEqual(list(store.get("B", firstRun=5)["run"]), [5.])
+
+    def testCompactionKeepsOtherJobs(self):
+        from src.trendStore import TrendStore
+        other = TrendStore(self.directory)
+        other.put("B", columns([7, 8]))
+        store = TrendStore(self.directory)
+        for i in range(5):
+            # every close replaces A, the old blocks are compacted away
+            store.put("A", columns([1, 2, 3], i))
+            store.close()
+        size = os.path.getsize(os.path.join(self.directory, "trends.bin"))
+        self.assertTrue(size <= 2*7*3*8)
+        self.assertEqual(list(store.get("A")["y"]), [5., 6., 7.])
+        other.close()
+        store = TrendStore(self.directory)
+        self.assertEqual(list(store.get("A")["y"]), [5., 6., 7.])
+        self.assertEqual(list(store.get("B")["y"]), [7., 8.])
+
+if __name__ == '__main__':
+    unittest.main()
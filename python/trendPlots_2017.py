@@ -16,12 +16,15 @@ class BetterConfigParser(ConfigParser.ConfigParser):
 
 #import array
 class TrendPlot:
-    def __init__(self, section, config, cache = None):
+    def __init__(self, section, config, cache = None, histoCache = None):
+        from src.runHistoCache import RunHistoCache
         from ROOT import MakeNullPointer, TH1, TFile,TObject
         from array import array
         self.__config = config
         self.__section = section
         self.__cache = cache
+        # without a cache shared by the sections, one of its own that keeps the last histogram
+        self.__histoCache = histoCache if histoCache != None else RunHistoCache(0)
 
         #self.__allReferenceRunNrs = sorted([int(i) for i in self.__config.get("reference","runs").split(",")])
         #self.__reference = None 
@@ -124,7 +127,7 @@ class TrendPlot:
         if self.__config.has_option(self.__section, "saveHistos"):
           try:
              # histo1 = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
-              histo1 = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True)
+              histo1 = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True))
               histosFile = self.__config.get(self.__section, "saveHistos")
               if not os.path.exists(histosFile): os.makedirs(histosFile)
 
@@ -145,15 +148,15 @@ class TrendPlot:
         try:
             if self.__cache == None or cacheLocation not in self.__cache:
 #                histo = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
-                histo = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True)
+                histo = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True))
                 if self.__config.has_option(self.__section,"histo1Path"):
                     h1Path=self.__config.get(self.__section,"histo1Path")
-                    h1=dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h1Path)[0],splitPath(h1Path)[1],rootContent=True)
+                    h1 = self.__histoCache.get(serverUrl, runNr, dataset, h1Path, lambda: dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h1Path)[0],splitPath(h1Path)[1],rootContent=True))
                     self.__metric.setOptionalHisto1(h1)
                     print h1
                 if self.__config.has_option(self.__section,"histo2Path"):
                     h2Path=self.__config.get(self.__section,"histo2Path")
-                    h2=dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h2Path)[0],splitPath(h2Path)[1],rootContent=True)
+                    h2 = self.__histoCache.get(serverUrl, runNr, dataset, h2Path, lambda: dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h2Path)[0],splitPath(h2Path)[1],rootContent=True))
                     self.__metric.setOptionalHisto2(h2)
                     print h2
                 print histo
@@ -598,6 +601,7 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
     return result
 
 def initPlots( config ):
+    from src.runHistoCache import openRunHistoCache
     from os.path import exists as pathExisits
     result = []
     cachePath = config.get("output","cachePath")
@@ -606,9 +610,11 @@ def initPlots( config ):
         cacheFile = open(cachePath,"r")
         cache.update( eval(cacheFile.read()) )
         cacheFile.close()
+    # histograms shared by the sections within a run
+    histoCache = openRunHistoCache(config)
     for section in sorted(config.sections()):
         if section.startswith("plot:"):
-            result.append(TrendPlot(section, config, cache))
+            result.append(TrendPlot(section, config, cache, histoCache=histoCache))
     return result, cache
 
 def initStyle(config):
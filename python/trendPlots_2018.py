@@ -16,12 +16,16 @@ class BetterConfigParser(ConfigParser.ConfigParser):
 
 #import array
 class TrendPlot:
-    def __init__(self, section, config, cache = None):
+    def __init__(self, section, config, cache = None, histoStore = None, histoCache = None, fitStore = None):
+        from src.runHistoCache import RunHistoCache
         from ROOT import MakeNullPointer, TH1, TFile,TObject
         from array import array
         self.__config = config
         self.__section = section
         self.__cache = cache
+        # without a cache shared by the sections, one of its own that keeps the last histogram
+        self.__histoCache = histoCache if histoCache != None else RunHistoCache(0)
+        self.__histoStore = histoStore
 
 	self.__threshold = int(self.__config.get("styleDefaults","histoThreshold"))
         if self.__config.has_option(self.__section,"threshold"):
@@ -31,8 +35,21 @@ class TrendPlot:
         metrics =__import__(".".join(metricString.split("(")[0].split(".")[:-1]))
         self.__metricName="metrics."+self.__config.get(self.__section,"metric")
         self.__metric = eval( metricString)
+        # the cache is keyed on the parameters of the metric, not on how the cfg spells them
+        self.__metricKey = self.__metric.getKey() or self.__config.get(self.__section,"metric")
         self.__metric.setThreshold( self.__threshold )
         self.__metric.setCache( self.__cache )
+        # identical input histograms are fitted once, whatever dataset they come from
+        if fitStore != None:
+            self.__metric.setFitStore(fitStore, self.__metricKey)
+        # fits start from the parameters of the last good fit of the dataset
+        warmStart = False
+        if self.__config.has_option("styleDefaults","warmStart"):
+            warmStart = self.__config.getboolean("styleDefaults","warmStart")
+        if self.__config.has_option(self.__section,"warmStart"):
+            warmStart = self.__config.getboolean(self.__section,"warmStart")
+        if warmStart and hasattr(self.__metric, "setWarmStart"):
+            self.__metric.setWarmStart(True)
         
         self.__title = self.__section.split("plot:")[1]
         if self.__config.has_option(self.__section,"title"):
@@ -52,33 +69,77 @@ class TrendPlot:
         self.__ySysErrLow = array("d")
 
         self.__count = 0
+        self.__failed = 0
         self.__runs = []
         self.__histoSum = MakeNullPointer(TH1)
         self.__FileHisto=MakeNullPointer(TFile)
         self.__labels = []
 
-    def addRun(self, serverUrl, runNr, dataset,tfile):
+    def getHistoPaths(self):
+        paths = [self.__config.get(self.__section, "relativePath")]
+        for option in ("histo1Path", "histo2Path"):
+            if self.__config.has_option(self.__section, option):
+                paths.append(self.__config.get(self.__section, option))
+        return paths
+
+    def hasStoredInputs(self, serverUrl, runNr, dataset, version):
+        "True if the metric can be evaluated from the histogram store alone"
+        if self.__histoStore == None or self.__metric.needsROOT():
+            return False
+        for histoPath in self.getHistoPaths():
+            if(histoPath[0]=='/'):
+                histoPath=histoPath.replace('/','',1)
+            if not self.__histoStore.has(serverUrl, runNr, dataset, histoPath, version):
+                return False
+        return True
+
+    def __loadHisto(self, serverUrl, runNr, dataset, histoPath, tfile, fetcher, numpyHisto=False, version=None):
+        from os.path import split as splitPath
+        from src.dqmjson import dqm_get_json_hist
+        from metrics.histo import NumpyHisto
+        if(histoPath[0]=='/'):
+            histoPath=histoPath.replace('/','',1)
+        # the inputs of the metrics without ROOT are kept, a change of their parameters needs no refetch
+        stored = numpyHisto and self.__histoStore != None
+        if stored:
+            histo = self.__histoStore.get(serverUrl, runNr, dataset, histoPath, version)
+            if histo != None:
+                return histo
+        subdet=histoPath.split('/')[0]
+        if tfile != None :
+            histo = tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
+        elif fetcher != None :
+            histo = fetcher.get(serverUrl, runNr, dataset, histoPath, numpyHisto)
+        else:
+            histo = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True)
+        if stored and histo != None:
+            if not isinstance(histo, NumpyHisto):
+                histo = NumpyHisto.fromROOT(histo)
+            self.__histoStore.put(serverUrl, runNr, dataset, histoPath, version, histo)
+        return histo
+
+    def addRun(self, serverUrl, runNr, dataset,tfile,fetcher=None,version=None,group=None):
+        """adds the result of the run. With a MetricGroup the metric is queued on it and the point is
+        added when the group is evaluated."""
         from math import sqrt
+        from metrics.histo import contentHash
+        from src.metricCache import isCurrent
         from ROOT import TH1,TFile,TObject,TBufferFile, TH1F, TProfile, TProfile2D, TH2F
         import ROOT
         import os, sys, string
         from os.path import split as splitPath
-        from src.dqmjson import dqm_get_json_hist
 
         self.__count = self.__count + 1
+        count = (self.__count, self.__failed)
         histoPath = self.__config.get(self.__section, "relativePath")
                 
-        cacheLocation = (serverUrl, runNr, dataset, histoPath, self.__config.get(self.__section,"metric"))
+        cacheLocation = (serverUrl, runNr, dataset, histoPath, self.__metricKey)
         
         if self.__config.has_option(self.__section, "saveHistos"):
           try:
               if(histoPath[0]=='/'): 
                   histoPath=histoPath.replace('/','',1)
-              subdet=histoPath.split('/')[0]
-              if tfile == None :
-                  histo1 = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True)
-              else :
-                  histo1=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
+              histo1 = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: self.__loadHisto(serverUrl, runNr, dataset, histoPath, tfile, fetcher))
               histosFile = self.__config.get(self.__section, "saveHistos")
               if not os.path.exists(histosFile): os.makedirs(histosFile)
 
@@ -97,63 +158,81 @@ class TrendPlot:
               print "WARNING: something went wrong getting the histogram ", runNr, msg
 
         try:
-            if self.__cache == None or cacheLocation not in self.__cache:
+            cached = self.__cache.get(cacheLocation) if self.__cache != None else None
+            # entries computed from another version of the DQM file are evaluated again
+            if cached == None or not isCurrent(cached[2] if len(cached) > 2 else None, version):
                 if(histoPath[0]=='/'): 
                     histoPath=histoPath.replace('/','',1)
-                subdet=histoPath.split('/')[0]
-                if tfile == None :
-                    histo = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(histoPath)[0],splitPath(histoPath)[1],rootContent=True)
-                else :
-                    histo=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
+                # metrics that do not fit work on a shared NumpyHisto instead of a ROOT copy
+                numpyHisto = not self.__metric.needsROOT()
+                histo = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: self.__loadHisto(serverUrl, runNr, dataset, histoPath, tfile, fetcher, numpyHisto, version), numpyHisto)
+                h1 = h2 = None
                 if self.__config.has_option(self.__section,"histo1Path"):
                     h1Path=self.__config.get(self.__section,"histo1Path")
-                    if(h1Path[0]=='/'):
-                        h1Path=h1Path.replace('/','',1)
-                    subdet=h1Path.split('/')[0]
-                    if tfile == None :
-                        h1 = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h1Path)[0],splitPath(h1Path)[1],rootContent=True)
-                    else :        
-                        h1=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h1Path.replace('%s/'%(subdet),'',1)))
+                    h1 = self.__histoCache.get(serverUrl, runNr, dataset, h1Path, lambda: self.__loadHisto(serverUrl, runNr, dataset, h1Path, tfile, fetcher, numpyHisto, version), numpyHisto)
                     self.__metric.setOptionalHisto1(h1)
                 if self.__config.has_option(self.__section,"histo2Path"):
                     h2Path=self.__config.get(self.__section,"histo2Path")
-                    if(h2Path[0]=='/'):
-                        h2Path=h1Path.replace('/','',1)
-                    subdet=h2Path.split('/')[0]
-                    if tfile == None :
-                        h2 = dqm_get_json_hist( serverUrl, runNr, dataset, splitPath(h2Path)[0],splitPath(h2Path)[1],rootContent=True)
-                    else :
-                        h2=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h2Path.replace('%s/'%(subdet),'',1)))
+                    h2 = self.__histoCache.get(serverUrl, runNr, dataset, h2Path, lambda: self.__loadHisto(serverUrl, runNr, dataset, h2Path, tfile, fetcher, numpyHisto, version), numpyHisto)
                     self.__metric.setOptionalHisto2(h2)
                 self.__metric.setRun(runNr)
+                self.__metric.setDataset(dataset)
                 if(histo!=None):
                     print "-> Got histogram {0} as {1}".format(splitPath(histoPath)[1],histo)
                     if self.__config.has_option(self.__section,"histo1Path"):
                         print "   -> Got auxiliary histogram {0} as {1}".format(splitPath(h1Path)[1],h1)
                     if self.__config.has_option(self.__section,"histo2Path"):
                         print "   -> Got auxiliary histogram {0} as {1}".format(splitPath(h2Path)[1],h2)
+                    inputHash = contentHash(histo, h1, h2)
+                    self.__metric.setSource(version, inputHash)
                     Entr=0
                     Entr=histo.GetEntries()
                     #print "###############    GOT HISTO #################" 
                     y=0
                     yErr    = (0.0,0.0)
-                    if Entr>self.__threshold:
+                    if cached != None and len(cached) > 3 and cached[3] == inputHash:
+                        # reprocessed, but this histogram did not change
+                        print "      -> Histogram unchanged in file version {0}, {1} taken over".format(version,self.__metricName)
+                        self.__cache[cacheLocation] = tuple(cached[:2])+(version, inputHash)
+                        (y, yErr) = self.__metric(None, cacheLocation)
+                    elif Entr>self.__threshold:
                         print "      -> {0} will be evaluated".format(self.__metricName)
+                        if group != None:
+                            group.add((serverUrl, runNr, dataset, histoPath), self.__metric, histo, cacheLocation,
+                                      lambda result: self.__addPoint(runNr, result[0], result[1], count), self.__metricFailed)
+                            return
                         (y, yErr) = self.__metric(histo, cacheLocation)
                     else:
                         print "      -> Histogram entries are {0} while threshold is {1}. Metric will not be evalueted, results set at 0".format(Entr,self.__threshold)
-                        self.__cache[cacheLocation] = ((0.,0.),0.)
+                        self.__cache[cacheLocation] = ((0.,0.),0.,version,inputHash)
                 else:
                     print "WARNING: something went wrong downloading histo=",splitPath(histoPath)[1]
                     return 
-            elif cacheLocation in self.__cache:
+            else:
                 print "-> Got {0} for histogram {1} from cache".format(self.__metricName,splitPath(histoPath)[1])
                 (y, yErr) = self.__metric(None, cacheLocation)
         except StandardError as msg :
-            print "WARNING: something went wrong calculating", self.__metric, msg
-            self.__count = self.__count - 1
+            if group != None:
+                # after the points of the runs still evaluated by the group
+                group.call(lambda msg=msg: self.__metricFailed(msg))
+            else:
+                self.__metricFailed(msg)
             return
+        if group != None:
+            group.call(lambda: self.__addPoint(runNr, y, yErr, count))
+        else:
+            self.__addPoint(runNr, y, yErr, count)
+
+    def __metricFailed(self, msg):
+        print "WARNING: something went wrong calculating", self.__metric, msg
+        self.__count = self.__count - 1
+        self.__failed = self.__failed + 1
 
+    def __addPoint(self, runNr, y, yErr, count):
+        """appends the result of a run, count is (self.__count, self.__failed) when the run was added.
+        Runs before it that failed since then give their number to it, as if added one after the other."""
+        from math import sqrt
+        count = count[0]-(self.__failed-count[1])
         ySysErr = (0.,0.)
         if self.__config.has_option(self.__section, "relSystematic"):
             fraction = self.__config.getfloat(self.__section, "relSystematic")
@@ -188,10 +267,10 @@ class TrendPlot:
             self.__x.append(run - runOffset)
             self.__xTitle = "Run No. - %s"%runOffset
         elif xMode == "counted":
-            self.__x.append(self.__count)
+            self.__x.append(count)
             self.__xTitle = "Nth processed run"
         elif xMode.startswith("runNumberEvery") or xMode.startswith("runNumbers"):
-            self.__x.append(self.__count)
+            self.__x.append(count)
             self.__xTitle = "Run No."
         else:
             raise StandardError, "Unknown xMode: %s in %s"%(xMode, self__section)
@@ -203,29 +282,46 @@ class TrendPlot:
         return self.__config.get(self.__section, "relativePath")
 
     def getMetric(self):
+        "the key of the metric in the cache"
+        return self.__metricKey
+
+    def getMetricString(self):
         return self.__config.get(self.__section,"metric")
 
+    def getFitStats(self):
+        "(warm-started fits, those that converged on the first attempt), None if the metric is no fit"
+        if not hasattr(self.__metric, "getFitStats"):
+            return None
+        return self.__metric.getFitStats()
+
+
+    def __getTitles(self):
+        "yTitle, hTitle, ymin and ymax written with every point"
+        d={}
+        d['yTitle']=self.__yTitle
+        if self.__config.has_option(self.__section,"hTitle") :
+            d['hTitle']=self.__config.get(self.__section,"hTitle")
+        else :
+            d['hTitle']=self.__yTitle
+        if self.__config.has_option(self.__section,"yMin") and self.__config.has_option(self.__section,"yMax") :
+            d['ymin']=float(self.__config.get(self.__section,"yMin"))
+            d['ymax']=float(self.__config.get(self.__section,"yMax"))
+        else:
+            d['ymin']=0
+            d['ymax']=0
+        return d
 
     def dumpJSON(self):
         n = len(self.__x)       
         lst = []
+        titles = self.__getTitles()
         for inc in range (0,n):
             d={}
             d['run']=self.__runs[inc]
             d['x']=self.__x[inc]
             d['y']=self.__y[inc]
             d['yErr']=self.__yErrLow[inc]
-            d['yTitle']=self.__yTitle
-            if self.__config.has_option(self.__section,"hTitle") :
-                d['hTitle']=self.__config.get(self.__section,"hTitle")
-            else :
-                d['hTitle']=self.__yTitle
-            if self.__config.has_option(self.__section,"yMin") and self.__config.has_option(self.__section,"yMax") :
-                d['ymin']=float(self.__config.get(self.__section,"yMin"))
-                d['ymax']=float(self.__config.get(self.__section,"yMax"))
-            else:
-                d['ymin']=0
-                d['ymax']=0
+            d.update(titles)
             lst.append(d)
 
 
@@ -239,6 +335,13 @@ class TrendPlot:
         print  "Dump JSON file : {0}.json".format(self.__title)
         return
 
+    def dumpTrend(self, store):
+        "adds the results to the columnar TrendStore"
+        store.put(self.__title, {"run": self.__runs, "x": self.__x, "y": self.__y,
+                                 "yErrLow": self.__yErrLow, "yErrHigh": self.__yErrHigh,
+                                 "ySysErrLow": self.__ySysErrLow, "ySysErrHigh": self.__ySysErrHigh},
+                  **self.__getTitles())
+
     def getGraph(self):
         from array import array
         from ROOT import TMultiGraph, TLegend, TGraphAsymmErrors
@@ -412,17 +515,44 @@ def getRunsFromDQM(config, dset, epochs, reco, tag, datatier,runMask="all", runl
     return result
 
 def initPlots( config ):
-    from os.path import exists as pathExisits
+    from src.runHistoCache import openRunHistoCache
+    from src.metricCache import openMetricCache
+    from src.histoStore import HistoStore
+    from src.fitResultStore import FitResultStore
     result = []
     cachePath = config.get("output","cachePath")
-    cache = {}
-    if pathExisits(cachePath):
-        cacheFile = open(cachePath,"r")
-        cache.update( eval(cacheFile.read()) )
-        cacheFile.close()
+    cacheBackend = "text"
+    if config.has_option("output","cacheBackend"):
+        cacheBackend = config.get("output","cacheBackend")
+    checkpointRuns = 10
+    if config.has_option("output","checkpointRuns"):
+        checkpointRuns = config.getint("output","checkpointRuns")
+    checkpointSeconds = 300.
+    if config.has_option("output","checkpointSeconds"):
+        checkpointSeconds = config.getfloat("output","checkpointSeconds")
+    cache = openMetricCache(cachePath, cacheBackend, checkpointRuns, checkpointSeconds)
+    histoStore = None
+    if config.has_option("output","histoCache"):
+        histoCacheSize = 2048
+        if config.has_option("output","histoCacheSize"):
+            histoCacheSize = config.getint("output","histoCacheSize")
+        histoStore = HistoStore(config.get("output","histoCache"), histoCacheSize*1024**2)
+    fitStore = None
+    if config.has_option("output","fitCache"):
+        fitCacheSize = 64
+        if config.has_option("output","fitCacheSize"):
+            fitCacheSize = config.getint("output","fitCacheSize")
+        fitStore = FitResultStore(config.get("output","fitCache"), fitCacheSize*1024**2)
+    # histograms shared by the sections within a run
+    histoCache = openRunHistoCache(config)
     for section in sorted(config.sections()):
         if section.startswith("plot:"):
-            result.append(TrendPlot(section, config, cache))
+            result.append(TrendPlot(section, config, cache, histoStore, histoCache, fitStore))
+    # older caches are keyed on the metric string of the cfg
+    renamed = cache.renameMetrics(dict(((plot.getPath(), plot.getMetricString()), plot.getMetric())
+                                       for plot in result if plot.getMetricString() != plot.getMetric()))
+    if renamed:
+        print "Moved {0} cache entries to the metric parameters".format(renamed)
     return result, cache
 
 def initStyle(config):
@@ -446,7 +576,12 @@ def main(argv=None):
     import os
     from optparse import OptionParser
     from ROOT import TCanvas,TFile
-    from src.dqmjson import dqm_get_json,dqm_getTFile,dqm_getTFile_Version2
+    from src.dqmjson import dqm_get_json,dqm_getTFile,dqm_getTFile_Version2,dqm_prefetch_TFile,dqm_set_pool_size,dqm_set_payload_cache,dqm_set_run_complete,dqm_set_listing_ttl
+    from src.fetchPlanner import FetchPlanner
+    from src.runPrefetcher import RunPrefetcher
+    from src.metricCache import isCurrent
+    from metrics.basic import MetricGroup
+    from src.fitExecutor import FitExecutor
 
     if argv == None:
         argv = sys.argv[1:]
@@ -471,11 +606,24 @@ def main(argv=None):
                       help="mask for strip state, options are ALL, PEAK, DECO, or MIXED -- only applicable if dataset is 'Cosmics'")
     parser.add_option("-L", "--list", dest="list", type="string", default=[] , action="store")
     parser.add_option("-J", "--json", dest="json", type="string", default=[] , action="store")
+    parser.add_option("--fetch-workers", dest="fetchWorkers", type="int", default=0,
+                      help="number of threads prefetching ProvInfo and histograms of the upcoming runs (default 0, no prefetching)")
+    parser.add_option("--fit-workers", dest="fitWorkers", type="int", default=0,
+                      help="number of processes running the fits while the next runs are read (default 0, fits run inline)")
     (opts, args) = parser.parse_args(argv)
     if opts.config ==[]:
         opts.config = "trendPlots.ini"
     config = BetterConfigParser()
     config.read(opts.config)
+    if config.has_option("dqmServer","poolSize"):
+        dqm_set_pool_size(config.getint("dqmServer","poolSize"))
+    if config.has_option("dqmServer","payloadCache"):
+        payloadCacheSize = 2048
+        if config.has_option("dqmServer","payloadCacheSize"):
+            payloadCacheSize = config.getint("dqmServer","payloadCacheSize")
+        dqm_set_payload_cache(config.get("dqmServer","payloadCache"), payloadCacheSize*1024**2)
+    if config.has_option("dqmServer","listingTTL"):
+        dqm_set_listing_ttl(config.getfloat("dqmServer","listingTTL"))
  
     initStyle(config)
     print "opts.state = ",opts.state
@@ -489,14 +637,23 @@ def main(argv=None):
 
     print "got %s run between %s and %s"%(len(runs), min(runs.keys()), max(runs.keys()))
     plots, cache = initPlots(config)
+    # a job stopped by an exception still keeps the runs it has finished
+    import atexit
+    atexit.register(cache.checkpoint)
 
-    print "Loading cache........",len(cache.keys())," items"
-    runInCache = []
-    for itest in range(0,len(cache.keys())):
-        runInCache.append(cache.keys()[itest][1])
+    print "Loading cache........",len(cache)," items"
     print "Cache loaded!"
-    for run in sorted(runs.keys()):
-        if cache == None or runs[run][1] not in runInCache:
+    # the metrics of all plots reading the same histogram are evaluated together, the fits on
+    # worker processes if asked for
+    fitExecutor = FitExecutor(opts.fitWorkers) if opts.fitWorkers > 0 else None
+    group = MetricGroup(cache, fitExecutor)
+    # the cache is not thread safe, what it has for each run is read here before the fetch workers start
+    cachedRuns = dict((run, cache.getRunEntries(runs[run][0],runs[run][1],runs[run][2])) for run in runs) if cache != None else {}
+    checkCachedVersions = config.has_option("output","checkCachedVersions") and config.getboolean("output","checkCachedVersions")
+    def prepareRun(run):
+        # network only (ProvInfo, file version, JSON folders, ROOT file): runs on the fetch workers
+        cached = cachedRuns.get(run, {})
+        if not cached:
             print "------------>>> RUN %s NOT IN CACHE"%(runs[run][1])
             rc = dqm_get_json(runs[run][0],runs[run][1],runs[run][2], "Info/ProvInfo")
             print "------------>>> RunIsComplete flag: " , rc['runIsComplete']['value']
@@ -505,39 +662,85 @@ def main(argv=None):
                 isDone = 1
         else:
             isDone = 1
+            # only complete runs end up in the metric cache
+            dqm_set_run_complete(runs[run][0],runs[run][1],runs[run][2])
             print "------------>>> RUN %s IN CACHE"%(runs[run][1])
+        version = None
+        toCompute = []
+        toFetch = []
+        fetcher = FetchPlanner()
+        if isDone == 1 :
+            if cached and not checkCachedVersions and all((plot.getPath(),plot.getMetric()) in cached for plot in plots):
+                # every metric of the run is cached, no listing request. With checkCachedVersions the
+                # version is looked up anyway and a reprocessed run gets its metrics evaluated again
+                version = None
+            else:
+                # the version of a partly cached run comes from the listing already read, no new request per run
+                version=dqm_getTFile_Version2(runs[run][0],runs[run][1],runs[run][2],runs[run][3],opts.datatier,refresh=not cached)
+            toCompute = [plot for plot in plots if (plot.getPath(),plot.getMetric()) not in cached
+                         or not isCurrent(cached[(plot.getPath(),plot.getMetric())], version)]
+            # metrics without ROOT can be evaluated again from the histogram store
+            toFetch = [plot for plot in toCompute if not plot.hasStoredInputs(runs[run][0],runs[run][1],runs[run][2],version)]
+            for plot in toFetch:
+                fetcher.addPaths(runs[run][0],runs[run][1],runs[run][2], plot.getHistoPaths())
+            if toFetch and opts.fetchWorkers > 0:
+                if version == 0:
+                    fetcher.fetch()
+                else:
+                    dqm_prefetch_TFile(runs[run][0],runs[run][1],runs[run][2],version,runs[run][3],opts.datatier)
+        return isDone, version, fetcher, toCompute, toFetch
+
+    for run, (isDone, version, fetcher, toCompute, toFetch) in RunPrefetcher(sorted(runs.keys()), prepareRun, opts.fetchWorkers):
         if isDone == 1 :
             fopen = False
-            fpresent= True
-            incache= False
-            fchecked=False
             tfile= None
+            if toCompute:
+                # some plots are not cached yet. With a shared cache another job may be computing
+                # them right now, wait for it and take its results from the cache
+                cache.lockRun(runs[run][0],runs[run][1],runs[run][2])
+            if toFetch:
+                if (version != 0):
+                    tfile=dqm_getTFile(runs[run][0],runs[run][1],runs[run][2],version,runs[run][3],opts.datatier)
+                    print "### Openning ROOT File Version {0} for Run{1}".format(version,runs[run][1])
+                    fopen=True
+                else:
+                    print "### ROOT file not present for Run{0} -> JSON information will be used".format(runs[run][1])
             for plot in plots:
-                cacheLocation = (runs[run][0],runs[run][1],runs[run][2], plot.getPath(),plot.getMetric())
-                incache=(cacheLocation in cache)
-                if (cache == None and not fchecked) or (not incache and not fchecked):
-                    version=dqm_getTFile_Version2(runs[run][0],runs[run][1],runs[run][2],runs[run][3],opts.datatier)
-                    if (version != 0):
-                        tfile=dqm_getTFile(runs[run][0],runs[run][1],runs[run][2],version,runs[run][3],opts.datatier)
-                        print "### Openning ROOT File Version {0} for Run{1}".format(version,runs[run][1])
-                        fopen=True
-                    else:
-                        fpresent=False
-                        print "### ROOT file not present for Run{0} -> JSON information will be used".format(runs[run][1])
-                    fchecked=True
-                plot.addRun(runs[run][0],runs[run][1],runs[run][2],tfile)
+                plot.addRun(runs[run][0],runs[run][1],runs[run][2],tfile,fetcher,version,group)
+            def runDone(run=run, locked=bool(toCompute)):
+                # checkpoint every checkpointRuns runs or checkpointSeconds, a restarted job skips
+                # everything up to the last checkpoint
+                cache.flush()
+                if locked:
+                    cache.unlockRun(runs[run][0],runs[run][1],runs[run][2])
+            # once the results of the run are in the cache, fits may still be running
+            group.call(runDone)
+            group.evaluate()
             if fopen :
                 tfile.Close()
         else:
             print "############ RUN %s NOT FULLY PROCESSED, SKIP ############"%(runs[run][1])
 
-    cachePath = config.get("output","cachePath")
-    cacheFile = open(cachePath,"w")
-    cacheFile.write(str(cache))
-    cacheFile.close()
-
+    group.finish()
+    if fitExecutor != None:
+        fitExecutor.close()
+    fitStats = [(plot.getName(), plot.getFitStats()) for plot in plots if plot.getFitStats() != None]
+    fitStats = [(name, stats) for (name, stats) in fitStats if stats[0] > 0]
+    for (name, (fits, firstAttempt)) in fitStats:
+        print "Warm-started fits of {0}: {1} of {2} converged on the first attempt".format(name, firstAttempt, fits)
+    if fitStats:
+        fits = sum(stats[0] for (name, stats) in fitStats)
+        firstAttempt = sum(stats[1] for (name, stats) in fitStats)
+        print "Warm-started fits: {0} of {1} converged on the first attempt".format(firstAttempt, fits)
+    cache.close()
+
+    # the columnar copy next to the JSON files, for the tools reading many trends at once
+    from src.trendStore import TrendStore
+    store = TrendStore("./JSON")
     for plot in plots:
         plot.dumpJSON()
+        plot.dumpTrend(store)
+    store.close()
 
     
 
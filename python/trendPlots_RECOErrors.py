@@ -16,12 +16,15 @@ class BetterConfigParser(ConfigParser.ConfigParser):
 
 #import array
 class TrendPlot:
-    def __init__(self, section, config, cache = None):
+    def __init__(self, section, config, cache = None, histoCache = None):
+        from src.runHistoCache import RunHistoCache
         from ROOT import MakeNullPointer, TH1, TFile,TObject
         from array import array
         self.__config = config
         self.__section = section
         self.__cache = cache
+        # without a cache shared by the sections, one of its own that keeps the last histogram
+        self.__histoCache = histoCache if histoCache != None else RunHistoCache(0)
 
         #self.__allReferenceRunNrs = sorted([int(i) for i in self.__config.get("reference","runs").split(",")])
         #self.__reference = None 
@@ -89,7 +92,10 @@ class TrendPlot:
         for label in self.__labels:
             latex.DrawLatex(*label)
     
-    def addRun(self, serverUrl, runNr, dataset):
+    def getHistoPaths(self):
+        return [self.__config.get(self.__section, "relativePath")]
+
+    def addRun(self, serverUrl, runNr, dataset, fetcher=None):
         from math import sqrt
         from ROOT import TH1,TFile,TObject
 #        import ROOT
@@ -121,7 +127,7 @@ class TrendPlot:
         
         if self.__config.has_option(self.__section, "saveHistos"):
           try:
-              histo1 = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
+              histo1 = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: getHistoFromDQM( serverUrl, runNr, dataset, histoPath, fetcher))
               histosFile = self.__config.get(self.__section, "saveHistos")
               if not os.path.exists(histosFile): os.makedirs(histosFile)
 
@@ -141,7 +147,7 @@ class TrendPlot:
 
         try:
             if self.__cache == None or cacheLocation not in self.__cache:
-                histo = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
+                histo = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: getHistoFromDQM( serverUrl, runNr, dataset, histoPath, fetcher))
                 Entr=0
                 Entr=histo.GetEntries()
                 print "###############    GOT HISTO #################" 
@@ -506,7 +512,7 @@ def getRunsFromDQM(config, mask, pd, mode, runMask="all",runlistfile=[],jsonfile
         return
     return result
 
-def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
+def getHistoFromDQM(serverUrl, runNr, dataset, histoPath, fetcher=None):
     print "**************>>>> GETTING HISTO"
     from src.dqmjson import dqm_get_json
     from os.path import split as splitPath
@@ -536,6 +542,11 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
         print "DEBUUUUG2"
         print dataset
         print splitPath(histoPath)[0]
+        if fetcher != None :
+            histo = fetcher.get( serverUrl, runNr, dataset, splitPath(histoPath)[0]+"/"+splitPath(path)[1])
+            if histo != None :
+                result = histo
+            continue
         json = dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0], rootContent=True)
         #jsonT = dqm_get_json( serverUrl, runNr, dataset, splitPath(path)[0], rootContent=True)
 
@@ -565,6 +576,7 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
     return result
 
 def initPlots( config ):
+    from src.runHistoCache import openRunHistoCache
     from os.path import exists as pathExisits
     result = []
     cachePath = config.get("output","cachePath")
@@ -573,9 +585,11 @@ def initPlots( config ):
         cacheFile = open(cachePath,"r")
         cache.update( eval(cacheFile.read()) )
         cacheFile.close()
+    # histograms shared by the sections within a run
+    histoCache = openRunHistoCache(config)
     for section in sorted(config.sections()):
         if section.startswith("plot:"):
-            result.append(TrendPlot(section, config, cache))
+            result.append(TrendPlot(section, config, cache, histoCache=histoCache))
     return result, cache
 
 def initStyle(config):
@@ -621,6 +635,7 @@ def main(argv=None):
     from optparse import OptionParser
     from ROOT import TCanvas,TFile
     from src.dqmjson import dqm_get_json    
+    from src.fetchPlanner import FetchPlanner
 
     if argv == None:
         argv = sys.argv[1:]
@@ -687,8 +702,11 @@ def main(argv=None):
             isDone = 1
             print "............------------>>> RUN %s IN CACHE"%(runs[run][1])
         if isDone == 1 :
+            fetcher = FetchPlanner()
+            for plot in plots:
+                fetcher.addPaths(runs[run][0],runs[run][1],runs[run][2], plot.getHistoPaths())
             for plot in plots:
-                plot.addRun(*(runs[run]))
+                plot.addRun(*(runs[run]), fetcher=fetcher)
         else:
             print "################### RUN %s NOT FULLY PROCESSED, SKIP #############"%(runs[run][1])
 
@@ -16,12 +16,15 @@ class BetterConfigParser(ConfigParser.ConfigParser):
 
 #import array
 class TrendPlot:
-    def __init__(self, section, config, cache = None):
+    def __init__(self, section, config, cache = None, histoCache = None):
+        from src.runHistoCache import RunHistoCache
         from ROOT import MakeNullPointer, TH1, TFile,TObject
         from array import array
         self.__config = config
         self.__section = section
         self.__cache = cache
+        # without a cache shared by the sections, one of its own that keeps the last histogram
+        self.__histoCache = histoCache if histoCache != None else RunHistoCache(0)
 
         #self.__allReferenceRunNrs = sorted([int(i) for i in self.__config.get("reference","runs").split(",")])
         #self.__reference = None 
@@ -89,7 +92,13 @@ class TrendPlot:
         for label in self.__labels:
             latex.DrawLatex(*label)
     
-    def addRun(self, serverUrl, runNr, dataset,tfile):
+    def getHistoPaths(self):
+        "the histograms read from the DQM GUI, the others come from the ROOT file"
+        if self.__config.has_option(self.__section, "saveHistos"):
+            return [self.__config.get(self.__section, "relativePath")]
+        return []
+
+    def addRun(self, serverUrl, runNr, dataset,tfile,fetcher=None):
         from math import sqrt
         #from src.dqmjson import dqm_getTFile
         from ROOT import TH1,TFile,TObject,TBufferFile, TH1F, TProfile, TProfile2D, TH2F
@@ -124,7 +133,7 @@ class TrendPlot:
         
         if self.__config.has_option(self.__section, "saveHistos"):
           try:
-              histo1 = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
+              histo1 = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: getHistoFromDQM( serverUrl, runNr, dataset, histoPath, fetcher))
               histosFile = self.__config.get(self.__section, "saveHistos")
               if not os.path.exists(histosFile): os.makedirs(histosFile)
 
@@ -153,7 +162,7 @@ class TrendPlot:
                     histoPath=histoPath.replace('/','',1)
                 subdet=histoPath.split('/')[0]
                 print (('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
-                histo=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
+                histo = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1))))
 
                 print histo,"V4"
                 if(histo!=-99):
@@ -526,7 +535,7 @@ def getRunsFromDQM(config, mask, pd, mode, datatier,runMask="all", runlistfile=[
         return
     return result
 
-def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
+def getHistoFromDQM(serverUrl, runNr, dataset, histoPath, fetcher=None):
     print "**************>>>> GETTING HISTO"
     from src.dqmjson import dqm_get_json
     from os.path import split as splitPath
@@ -556,6 +565,11 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
         print "DEBUUUUG2"
         print dataset
         print splitPath(histoPath)[0]
+        if fetcher != None :
+            histo = fetcher.get( serverUrl, runNr, dataset, splitPath(histoPath)[0]+"/"+splitPath(path)[1])
+            if histo != None :
+                result = histo
+            continue
         json = dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0], rootContent=True)
 #        print dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0]+"/"+splitPath(histoPath)[1], rootContent=True)
     
@@ -588,6 +602,7 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
     return result
 
 def initPlots( config ):
+    from src.runHistoCache import openRunHistoCache
     from os.path import exists as pathExisits
     result = []
     cachePath = config.get("output","cachePath")
@@ -596,9 +611,11 @@ def initPlots( config ):
         cacheFile = open(cachePath,"r")
         cache.update( eval(cacheFile.read()) )
         cacheFile.close()
+    # histograms shared by the sections within a run
+    histoCache = openRunHistoCache(config)
     for section in sorted(config.sections()):
         if section.startswith("plot:"):
-            result.append(TrendPlot(section, config, cache))
+            result.append(TrendPlot(section, config, cache, histoCache=histoCache))
     return result, cache
 
 def initStyle(config):
@@ -644,6 +661,7 @@ def main(argv=None):
     from optparse import OptionParser
     from ROOT import TCanvas,TFile
     from src.dqmjson import dqm_get_json,dqm_getTFile    
+    from src.fetchPlanner import FetchPlanner
 
     if argv == None:
         argv = sys.argv[1:]
@@ -714,8 +732,11 @@ def main(argv=None):
         if isDone == 1 :
             if(runs[run][2]!=0):
                 tfile=dqm_getTFile(runs[run][0],runs[run][1],runs[run][2],runs[run][3],opts.datatier)
+                fetcher = FetchPlanner()
+                for plot in plots:
+                    fetcher.addPaths(runs[run][0],runs[run][1],runs[run][2], plot.getHistoPaths())
                 for plot in plots:
-                    plot.addRun(runs[run][0],runs[run][1],runs[run][2],tfile)
+                    plot.addRun(runs[run][0],runs[run][1],runs[run][2],tfile,fetcher)
                 tfile.Close()
             else:
                 print "Not File Version found"
@@ -16,12 +16,15 @@ class BetterConfigParser(ConfigParser.ConfigParser):
 
 #import array
 class TrendPlot:
-    def __init__(self, section, config, cache = None):
+    def __init__(self, section, config, cache = None, histoCache = None):
+        from src.runHistoCache import RunHistoCache
         from ROOT import MakeNullPointer, TH1, TFile,TObject
         from array import array
         self.__config = config
         self.__section = section
         self.__cache = cache
+        # without a cache shared by the sections, one of its own that keeps the last histogram
+        self.__histoCache = histoCache if histoCache != None else RunHistoCache(0)
 
         #self.__allReferenceRunNrs = sorted([int(i) for i in self.__config.get("reference","runs").split(",")])
         #self.__reference = None 
@@ -124,7 +127,7 @@ class TrendPlot:
         
         if self.__config.has_option(self.__section, "saveHistos"):
           try:
-              histo1 = getHistoFromDQM( serverUrl, runNr, dataset, histoPath)
+              histo1 = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: getHistoFromDQM( serverUrl, runNr, dataset, histoPath))
               histosFile = self.__config.get(self.__section, "saveHistos")
               if not os.path.exists(histosFile): os.makedirs(histosFile)
 
@@ -153,14 +156,14 @@ class TrendPlot:
                     histoPath=histoPath.replace('/','',1)
                 subdet=histoPath.split('/')[0]
                 print (('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
-                histo=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1)))
+                histo = self.__histoCache.get(serverUrl, runNr, dataset, histoPath, lambda: tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,histoPath.replace('%s/'%(subdet),'',1))))
                 if self.__config.has_option(self.__section,"histo1Path"):
                     h1Path=self.__config.get(self.__section,"histo1Path")
                     if(h1Path[0]=='/'):
                         h1Path=h1Path.replace('/','',1)
                     subdet=h1Path.split('/')[0]
                     print (('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h1Path.replace('%s/'%(subdet),'',1)))
-                    h1=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h1Path.replace('%s/'%(subdet),'',1)))
+                    h1 = self.__histoCache.get(serverUrl, runNr, dataset, h1Path, lambda: tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h1Path.replace('%s/'%(subdet),'',1))))
                     print h1
                     self.__metric.setOptionalHisto1(h1)
                 if self.__config.has_option(self.__section,"histo2Path"):
@@ -169,7 +172,7 @@ class TrendPlot:
                         h2Path=h1Path.replace('/','',1)
                     subdet=h2Path.split('/')[0]
                     print (('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h2Path.replace('%s/'%(subdet),'',1)))
-                    h2=tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h2Path.replace('%s/'%(subdet),'',1)))
+                    h2 = self.__histoCache.get(serverUrl, runNr, dataset, h2Path, lambda: tfile.Get(('DQMData/Run %d/%s/Run summary/%s') % (runNr,subdet,h2Path.replace('%s/'%(subdet),'',1))))
                     print h2
                     self.__metric.setOptionalHisto2(h2)
                 print histo,"V4"
@@ -598,7 +601,7 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
         print "DEBUUUUG2"
         print dataset
         print splitPath(histoPath)[0]
-        json = dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0], rootContent=True)
+        json = dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0], rootContent=True, names=[splitPath(path)[1]])
 #        print dqm_get_json( serverUrl, runNr, dataset, splitPath(histoPath)[0]+"/"+splitPath(histoPath)[1], rootContent=True)
     
         #jsonT = dqm_get_json( serverUrl, runNr, dataset, splitPath(path)[0], rootContent=True)
@@ -630,6 +633,7 @@ def getHistoFromDQM(serverUrl, runNr, dataset, histoPath):
     return result
 
 def initPlots( config ):
+    from src.runHistoCache import openRunHistoCache
     from os.path import exists as pathExisits
     result = []
     cachePath = config.get("output","cachePath")
@@ -638,9 +642,11 @@ def initPlots( config ):
         cacheFile = open(cachePath,"r")
         cache.update( eval(cacheFile.read()) )
         cacheFile.close()
+    # histograms shared by the sections within a run
+    histoCache = openRunHistoCache(config)
     for section in sorted(config.sections()):
         if section.startswith("plot:"):
-            result.append(TrendPlot(section, config, cache))
+            result.append(TrendPlot(section, config, cache, histoCache=histoCache))
     return result, cache
 
 def initStyle(config):
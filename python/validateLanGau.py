@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# compares the langau fits with ROOT (fits.LanGau...) and without (fits.NumpyLanGau...) on reference
+# histograms, before a section is switched to the numpy fit. reference/langau.root is the stored set,
+# reference/langau_validation.txt what this printed for it.
+from optparse import OptionParser
+
+# the reference set: directory, metric of the cfgs, binning, (mpv, Landau width, Gaussian sigma)
+# of the histograms and their entries. Some noise at low values as in the S/N distributions.
+REFERENCE = [
+    ("StoN", "LanGauAroundMax(1,0.6,1.8, 0.5)", (100, 0., 100.),
+     [(19., 1.3, 2.), (24., 1.8, 3.), (29., 2.4, 4.)], [80, 400, 2000, 20000, 100000]),
+    ("StoNRange", "LanGau(1,12.,35., 0.4, (2.,19.,35000.,4.))", (100, 0., 100.),
+     [(17., 1.2, 1.5), (19., 1.5, 2.5), (22., 2., 3.)], [80, 400, 2000, 20000, 100000]),
+    ("Charge", "LanGau(1,60.,180., 5., (30.,150.,35000.,4.))", (100, 0., 500.),
+     [(95., 8., 10.), (110., 10., 15.), (125., 14., 20.)], [80, 400, 2000, 20000, 100000]),
+    ("Gain", "LanGau(1,2400.,4500., 100., (200.,2500.,35000.,100.))", (120, 0., 6000.),
+     [(3000., 150., 200.), (3300., 200., 300.), (3500., 250., 400.)], [80, 400, 2000, 20000, 100000]),
+]
+
+def makeReference(fileName, seed=4357):
+    "writes the reference set, one directory per metric with the metric as a TNamed"
+    import ROOT
+    random = ROOT.TRandom3(seed)
+    tfile = ROOT.TFile.Open(fileName, "RECREATE")
+    for (name, metric, (bins, low, high), shapes, entries) in REFERENCE:
+        directory = tfile.mkdir(name)
+        directory.cd()
+        ROOT.TNamed("metric", metric).Write()
+        for (mpv, width, sigma) in shapes:
+            for count in entries:
+                histo = ROOT.TH1F("%s_mpv%g_%d" % (name, mpv, count), "", bins, low, high)
+                for i in range(count):
+                    if random.Uniform() < 0.05:
+                        histo.Fill(random.Exp(0.2*mpv))
+                    else:
+                        histo.Fill(random.Landau(mpv+0.22278298*width, width)+random.Gaus(0., sigma))
+                histo.Write()
+    tfile.Close()
+
+def _histograms(directory, metric, prefix=""):
+    "(path, metric, TH1) of the 1D histograms in a ROOT file, the TNamed 'metric' of a directory overrides metric"
+    found = directory.Get("metric")
+    if found and found.InheritsFrom("TNamed"):
+        metric = found.GetTitle()
+    for key in directory.GetListOfKeys():
+        item = key.ReadObj()
+        path = prefix+key.GetName()
+        if item.InheritsFrom("TDirectory"):
+            for entry in _histograms(item, metric, path+"/"):
+                yield entry
+        elif item.InheritsFrom("TH1") and item.GetDimension() == 1:
+            yield (path, metric, item)
+
+def _relative(value, reference):
+    return abs(value-reference)/abs(reference) if reference != 0 else abs(value)
+
+def main(argv=None):
+    import sys
+    import time
+    if argv == None:
+        argv = sys.argv[1:]
+    parser = OptionParser(usage="%prog [options] reference.root [reference.root ...]")
+    parser.add_option("-m", "--metric", dest="metric", default="LanGauAroundMax(1,0.6,1.8,0.5)",
+                      help="ROOT langau metric of fits.py as in the cfg, for directories without a 'metric' entry. "
+                           "The numpy one gets the same parameters (default %default)")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float", default=0.01,
+                      help="largest accepted relative difference of the values (default %default)")
+    parser.add_option("-v", "--verbose", dest="verbose", action="store_true", default=False,
+                      help="print every histogram, not only those outside the tolerance")
+    parser.add_option("--make-reference", dest="makeReference", action="store_true", default=False,
+                      help="write the reference set to the file given instead of comparing")
+    (opts, args) = parser.parse_args(argv)
+    if not args:
+        parser.error("no reference file given")
+    # scipy before ROOT: loaded after ROOT has opened a file, the SVD of the bounded fits fails with
+    # some ROOT builds (the 6.40 pip wheel) and the numpy fits return their start values
+    import scipy.optimize
+    import ROOT
+    ROOT.gROOT.SetBatch(True)
+    if opts.makeReference:
+        makeReference(args[0])
+        return 0
+    from metrics import fits
+    from metrics.histo import NumpyHisto
+    metrics = {}
+    compared = 0
+    outside = 0
+    worst = [0., 0.]
+    times = [0., 0.]
+    for fileName in args:
+        tfile = ROOT.TFile.Open(fileName)
+        if not tfile or tfile.IsZombie():
+            parser.error("can not open %s" % fileName)
+        for (path, metric, histo) in _histograms(tfile, opts.metric):
+            if metric not in metrics:
+                metrics[metric] = (eval("fits."+metric), eval("fits.Numpy"+metric))
+            results = []
+            for i, (evaluated, copy) in enumerate(((metrics[metric][0], histo.Clone()), (metrics[metric][1], NumpyHisto.fromROOT(histo)))):
+                evaluated.setDataset(fileName)
+                start = time.time()
+                results.append(evaluated.evaluate(copy)[0])
+                times[i] += time.time()-start
+            ((rootValue, rootError), (numpyValue, numpyError)) = results
+            difference = _relative(numpyValue, rootValue)
+            errorDifference = _relative(numpyError, rootError)
+            worst = [max(worst[0], difference), max(worst[1], errorDifference)]
+            compared += 1
+            if difference > opts.tolerance:
+                outside += 1
+            if opts.verbose or difference > opts.tolerance:
+                print("{0}:{1} ROOT {2:.6g} +- {3:.4g} numpy {4:.6g} +- {5:.4g} relative difference {6:.2g} (error {7:.2g})".format(
+                    fileName, path, rootValue, rootError, numpyValue, numpyError, difference, errorDifference))
+        tfile.Close()
+    print("{0} histograms, {1} outside the tolerance of {2}".format(compared, outside, opts.tolerance))
+    print("largest relative difference of the values {0:.2g}, of the errors {1:.2g}".format(*worst))
+    print("fit time ROOT {0:.1f}s numpy {1:.1f}s".format(*times))
+    return 1 if outside else 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())